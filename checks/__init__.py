@@ -4,6 +4,10 @@ functionality of a site or individual pages.
 """
 
 import logging
+import os
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 
 from checks import certificate
 from checks import charset
@@ -22,17 +26,25 @@ from checks import page_content
 from checks import url_canonicalization
 from checks import url_reachability
 
+from checks import browser_pool
+from checks import http_cache
+from checks import shared_cache
 from checks.config import Config
+from checks.time_budget import TimeBudget
 
 
-def perform_checks(input_url):
+def perform_checks(input_url, time_budget=None):
     """
     Executes all our URL/site checks and returns a big-ass result dict.
+
+    time_budget optionally limits the duration of all checks (seconds).
+    Checks still running when it is used up return partial results.
     """
 
     # The sequence of checks to run. Order is important!
     # Checks which expand the URLs list must come first.
-    # After that, dependencies (encoded in the checks) have to be fulfilled.
+    # Checks are executed as soon as the checks they depend on are done
+    # (see check_prerequisites), so independent checks run in parallel.
     check_modules = [
         ('domain_variations', domain_variations),
         ('http_and_https', http_and_https),
@@ -64,35 +76,113 @@ def perform_checks(input_url):
         screenshot_bucket_name='green-spider-screenshots.sendung.de',
         screenshot_datastore_kind='webscreenshot',
         storage_credentials_path='/secrets/screenshots-uploader.json',
-        datastore_credentials_path='/secrets/datastore-writer.json')
+        datastore_credentials_path='/secrets/datastore-writer.json',
+        shared_cache=shared_cache.from_url(os.environ.get('SHARED_CACHE_URL')),
+        http_cache=http_cache.from_path(os.environ.get('HTTP_CACHE_PATH'),
+                                        int(os.environ.get('HTTP_CACHE_MAX_BYTES', http_cache.DEFAULT_MAX_BYTES))),
+        feed_max_entries=int(os.environ.get('FEED_MAX_ENTRIES', load_feeds.DEFAULT_MAX_ENTRIES)),
+        time_budget=TimeBudget(time_budget))
 
-    # Iterate over all checks.
-    for check_name, check in check_modules:
+    # Launch the browser for load_in_browser while the other checks run
+    browser_pool.get_pool().warm_up()
+
+    try:
+        run_checks(check_modules, config, results)
+    finally:
+        config.close()
+
+    # Return results in the order of check_modules, regardless of
+    # the order in which checks have finished.
+    return {name: results[name] for name, _ in check_modules}
+
+
+def run_checks(check_modules, config, results):
+    """
+    Executes the given checks, each one as soon as the checks it has
+    to wait for are done, and writes their results to results.
+    """
+    prerequisites = check_prerequisites(check_modules)
+    pending = dict(check_modules)
+    running = {}
 
-        # checker is the individual test/assertion handler we instantiate
-        # for each check step.
-        checker = check.Checker(config=config,
-                                previous_results=results)
-
-        # Ensure that dependencies are met for the checker.
-        dependencies = checker.depends_on_results()
-        if dependencies != []:
-            for dep in dependencies:
-                if (dep not in results or results[dep] is None or results[dep] == {} or results[dep] == []):
-                    logging.debug("Skipping check %s as dependency %s is not met" % (check_name, dep))
+    with ThreadPoolExecutor(max_workers=len(check_modules)) as executor:
+        while pending or running:
+
+            # Start all checks whose prerequisites are done.
+            for check_name in list(pending):
+                if not prerequisites[check_name].issubset(results):
+                    continue
+                check = pending.pop(check_name)
+
+                # Ensure that dependencies are met for the checker.
+                unmet = [dep for dep in check.Checker.depends_on_checks
+                         if results[dep] is None or results[dep] == {} or results[dep] == []]
+                if unmet != []:
+                    logging.debug("Skipping check %s as dependency %s is not met" % (check_name, unmet[0]))
+                    results[check_name] = {}
                     continue
 
-        # Execute the checker's main function.
-        result = checker.run()
-        results[check_name] = result
+                future = executor.submit(run_check, check_name, check, config, results)
+                running[future] = check_name
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                check_name = running.pop(future)
+                results[check_name] = future.result()
+
+
+def check_prerequisites(check_modules):
+    """
+    Returns a dict with the set of check names each check has to wait for.
+
+    A check waits for
+    - the checks it depends on,
+    - the latest preceding check that modifies config.urls,
+    - all preceding checks, if it modifies config.urls itself.
+    """
+    prerequisites = {}
+    preceding = []
+    last_modifying = None
+
+    for check_name, check in check_modules:
+        deps = set(check.Checker.depends_on_checks)
+        for dep in deps:
+            if dep not in preceding:
+                raise ValueError("Check %s depends on %s, which does not precede it" % (check_name, dep))
+
+        if check.Checker.modifies_urls:
+            deps.update(preceding)
+        elif last_modifying is not None:
+            deps.add(last_modifying)
+
+        prerequisites[check_name] = deps
+        preceding.append(check_name)
+        if check.Checker.modifies_urls:
+            last_modifying = check_name
+
+    return prerequisites
+
+
+def run_check(check_name, check, config, results):
+    """
+    Instantiates and executes one checker and returns its result.
+    """
+    # checker is the individual test/assertion handler we instantiate
+    # for each check step.
+    checker = check.Checker(config=config,
+                            previous_results=results)
+
+    # Execute the checker's main function.
+    result = checker.run()
+
+    # Execute any cleanup/aftermath function (if given) for the checker.
+    modified_results = checker.post_hook(result)
+    if modified_results is not None:
+        result = modified_results
 
-        # Execute any cleanup/aftermath function (if given) for the checker.
-        modified_results = checker.post_hook(result)
-        if modified_results is not None:
-            results[check_name] = modified_results
+    logging.debug("config after check %s: %r" % (check_name, config))
 
-        # Update config for the next check(s) in the sequence.
-        config = checker.config
-        logging.debug("config after check %s: %r" % (check_name, config))
-    
-    return results
+    return result
@@ -1,11 +1,31 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+
 class AbstractChecker(object):
     """
     Our blueprint for checks
     """
 
+    # Names of the checks whose results this check consumes.
+    depends_on_checks = []
+
+    # Whether this check adds URLs to or removes URLs from config.urls.
+    # Checks that do are run on their own, as all other checks read the
+    # URLs list when they start.
+    modifies_urls = False
+
+    # Maximum number of seconds this check may take, within the
+    # site's time budget. None means it may use all that is left.
+    max_duration = None
+
     def __init__(self, config, previous_results=None):
         self._config = config
 
+        # This check's share of the site's time budget
+        self._budget = config.time_budget.slice(self.max_duration)
+
         # A dictionary of results from previous checkers.
         # Key is the name of the checker that has generated the result.
         self._previous_results = previous_results
@@ -15,12 +35,12 @@ class AbstractChecker(object):
         Should return  the name(s) of checks this one depends on.
         Empty list means this check has no prerequisites.
         """
-        return []
+        return list(self.depends_on_checks)
 
     def run(self):
         """Executes the check routine, returns result dict"""
         raise NotImplementedError()
-    
+
     def post_hook(self, result):
         """
         Optional function to execute after run(). Can be used to post-process
@@ -28,17 +48,49 @@ class AbstractChecker(object):
 
         Params:
           result: Result data from the run() function.
-        
+
         Returns:
           Dict: Modified results data
           None: Means that nothing has been done, so should be ignored.
         """
         return None
-    
+
+    def map_urls(self, func, urls):
+        """
+        Calls func(url) for each of the given URLs concurrently.
+
+        Returns the results as a list in the order of urls. The number of
+        concurrent calls is limited by config.max_workers overall, across
+        all checkers, and by config.max_workers_per_host for each hostname.
+
+        Once the check's time budget is used up, remaining URLs are
+        skipped and get None as their result.
+        """
+        if len(urls) == 0:
+            return []
+
+        def call(url):
+            # the host's slot first, so that waiting for it doesn't
+            # take one of max_workers from other hosts
+            with self.config.host_semaphore(urlparse(url).hostname), self.config.worker_semaphore:
+                if self.budget.expired():
+                    logging.warning("Time budget used up, skipping %s" % url)
+                    return None
+                return func(url)
+
+        max_workers = min(self.config.max_workers, len(urls))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(call, urls))
+
     @property
     def config(self):
         return self._config
-    
+
     @property
     def previous_results(self):
         return self._previous_results
+
+    @property
+    def budget(self):
+        """The TimeBudget of this check"""
+        return self._budget
@@ -0,0 +1,103 @@
+import threading
+import time
+import unittest
+
+from checks.abstract_checker import AbstractChecker
+from checks.config import Config
+from checks.time_budget import TimeBudget
+
+
+class TestMapURLs(unittest.TestCase):
+
+    def test_order_is_preserved(self):
+        urls = ['http://a.example/%d' % i for i in range(6)]
+        checker = AbstractChecker(config=Config(urls=urls, max_workers_per_host=6))
+
+        def func(url):
+            # later URLs finish first
+            time.sleep(0.01 * (6 - int(url[-1])))
+            return url.upper()
+
+        self.assertEqual(checker.map_urls(func, urls), [url.upper() for url in urls])
+
+    def test_per_host_limit(self):
+        urls = (['http://a.example/%d' % i for i in range(4)] +
+                ['http://b.example/%d' % i for i in range(4)])
+        checker = AbstractChecker(config=Config(urls=urls, max_workers=8, max_workers_per_host=2))
+
+        lock = threading.Lock()
+        active = {}
+        max_active = {}
+
+        def func(url):
+            host = url.split('/')[2]
+            with lock:
+                active[host] = active.get(host, 0) + 1
+                max_active[host] = max(max_active.get(host, 0), active[host])
+            time.sleep(0.02)
+            with lock:
+                active[host] -= 1
+
+        checker.map_urls(func, urls)
+
+        self.assertEqual(max_active, {'a.example': 2, 'b.example': 2})
+
+    def test_limit_across_checkers(self):
+        urls = ['http://%s.example/' % host for host in 'abcdef']
+        config = Config(urls=urls, max_workers=3)
+
+        lock = threading.Lock()
+        active = [0]
+        max_active = [0]
+
+        def func(url):
+            with lock:
+                active[0] += 1
+                max_active[0] = max(max_active[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+
+        threads = [threading.Thread(target=AbstractChecker(config=config).map_urls, args=(func, urls))
+                   for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(max_active[0], 3)
+
+    def test_empty(self):
+        checker = AbstractChecker(config=Config(urls=[]))
+        self.assertEqual(checker.map_urls(lambda url: url, []), [])
+
+    def test_time_budget(self):
+        urls = ['http://a.example/%d' % i for i in range(4)]
+        config = Config(urls=urls, max_workers=1, time_budget=TimeBudget(0.05))
+        checker = AbstractChecker(config=config)
+
+        def func(url):
+            time.sleep(0.03)
+            return url
+
+        self.assertEqual(checker.map_urls(func, urls), urls[:2] + [None, None])
+
+
+class TestBudget(unittest.TestCase):
+
+    def test_max_duration(self):
+        class Checker(AbstractChecker):
+            max_duration = 5
+
+        checker = Checker(config=Config(urls=[], time_budget=TimeBudget(60)))
+        self.assertLessEqual(checker.budget.remaining(), 5)
+
+        checker = Checker(config=Config(urls=[], time_budget=TimeBudget(1)))
+        self.assertLessEqual(checker.budget.remaining(), 1)
+
+        checker = AbstractChecker(config=Config(urls=[]))
+        self.assertIsNone(checker.budget.remaining())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,275 @@
+"""
+A pool of long-lived Chromium browsers for load_in_browser.
+
+Starting Chromium takes several seconds, so browsers are kept running
+for the lifetime of the process instead of being launched per site.
+Each use of a browser is a lease with its own browser context (like an
+incognito window), created via the DevTools protocol. A context has its
+own cookie jar and cache, so sites don't see each other's cookies, and
+disposing the context at the end of the lease removes everything the
+site has stored.
+"""
+
+import atexit
+import contextlib
+import logging
+import threading
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.service import Service as ChromeService
+
+
+# Difference between the Windows epoch (1601-01-01), used by Chromium's
+# cookie database, and the Unix epoch, in seconds
+WINDOWS_EPOCH_OFFSET = 11644473600
+
+
+def make_driver():
+    """Launches a headless Chromium and returns its WebDriver"""
+    chrome_options = webdriver.ChromeOptions()
+    chrome_options.binary_location = '/usr/bin/chromium'
+    chrome_options.add_argument('--enable-automation')
+    chrome_options.add_argument('--headless=new')
+    chrome_options.add_argument('--disable-gpu')
+    chrome_options.add_argument('--no-sandbox')
+    chrome_options.add_argument('--dns-prefetch-disable')
+    chrome_options.add_argument('--disable-extensions')
+    chrome_options.add_argument('--disable-component-extensions-with-background-pages')
+    chrome_options.add_argument('--disable-default-apps')
+    chrome_options.add_argument('--hide-scrollbars')
+    chrome_options.add_argument('--disk-cache-size=0')
+    chrome_options.add_argument('--no-default-browser-check')
+    chrome_options.add_argument('--no-first-run')
+    chrome_options.add_argument('--disable-dev-shm-usage')
+    # Suppress the Chrome 127+ EU search-engine-choice modal that would
+    # otherwise block navigation on a fresh profile.
+    chrome_options.add_argument('--disable-search-engine-choice-screen')
+    chrome_options.add_argument('--verbose')
+    chrome_options.page_load_strategy = 'normal'
+
+    # activate performance logging (includes network logging)
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    service = ChromeService(executable_path='/usr/bin/chromedriver')
+    return webdriver.Chrome(service=service, options=chrome_options)
+
+
+def convert_cookie(cookie):
+    """
+    Converts a cookie as returned by the DevTools protocol into the
+    format of Chromium's cookie database, which our results use.
+    """
+    if cookie.get('session', False):
+        expires_utc = 0
+    else:
+        expires_utc = int((cookie['expires'] + WINDOWS_EPOCH_OFFSET) * 1000000)
+
+    return {
+        'creation_utc': None,
+        'host_key': cookie['domain'],
+        'name': cookie['name'],
+        'path': cookie['path'],
+        'expires_utc': expires_utc,
+        'is_secure': int(cookie.get('secure', False)),
+        'is_httponly': int(cookie.get('httpOnly', False)),
+        'has_expires': int(not cookie.get('session', False)),
+        'is_persistent': int(not cookie.get('session', False)),
+    }
+
+
+class BrowserLease(object):
+    """
+    A browser window in a new browser context of a pooled driver.
+    While the lease is held, the driver operates on that window.
+    """
+
+    def __init__(self, driver):
+        self._driver = driver
+        self._default_window = driver.current_window_handle
+        self._context_id = None
+
+        # discard log entries left over from previous leases
+        for log_type in ('browser', 'performance'):
+            try:
+                driver.get_log(log_type)
+            except WebDriverException as e:
+                logging.debug("Could not clear %s log: %s" % (log_type, e))
+
+        try:
+            response = driver.execute_cdp_cmd('Target.createBrowserContext', {})
+            self._context_id = response['browserContextId']
+        except WebDriverException as e:
+            # Fall back to the default context, clearing its cookies
+            logging.warning("Could not create browser context, using default context: %s" % e)
+            driver.execute_cdp_cmd('Network.clearBrowserCookies', {})
+
+        handles = set(driver.window_handles)
+        params = {'url': 'about:blank'}
+        if self._context_id is not None:
+            params['browserContextId'] = self._context_id
+        target_id = driver.execute_cdp_cmd('Target.createTarget', params)['targetId']
+
+        # Window handles are target IDs, but don't rely on it
+        window = target_id
+        if window not in driver.window_handles:
+            window = (set(driver.window_handles) - handles).pop()
+        self._window = window
+        driver.switch_to.window(window)
+
+        self._user_agent = None
+
+    @property
+    def driver(self):
+        return self._driver
+
+    @property
+    def user_agent(self):
+        """The browser engine's user agent string"""
+        if self._user_agent is None:
+            self._user_agent = self._driver.execute_script("return navigator.userAgent;")
+        return self._user_agent
+
+    def get_cookies(self):
+        """Returns all cookies set in this lease's context, including third party cookies"""
+        params = {}
+        if self._context_id is not None:
+            params['browserContextId'] = self._context_id
+        response = self._driver.execute_cdp_cmd('Storage.getCookies', params)
+        return [convert_cookie(cookie) for cookie in response['cookies']]
+
+    def close(self):
+        """Closes the window and disposes of the browser context"""
+        self._driver.switch_to.window(self._default_window)
+        if self._context_id is not None:
+            # closes the context's windows, too
+            self._driver.execute_cdp_cmd('Target.disposeBrowserContext',
+                                         {'browserContextId': self._context_id})
+        else:
+            self._driver.execute_cdp_cmd('Target.closeTarget', {'targetId': self._window})
+
+
+class BrowserPool(object):
+    """
+    Keeps up to max_size browsers running and leases each of them out
+    to one user at a time. A WebDriver session controls one window at a
+    time, so concurrent leases need browsers of their own.
+    """
+
+    def __init__(self, max_size=1, driver_factory=make_driver):
+        self._max_size = max_size
+        self._driver_factory = driver_factory
+        self._idle = []
+        self._size = 0
+        self._condition = threading.Condition()
+
+    @property
+    def max_size(self):
+        return self._max_size
+
+    def grow(self, max_size):
+        """Raises max_size to the given value, if it is lower"""
+        with self._condition:
+            if max_size > self._max_size:
+                self._max_size = max_size
+                self._condition.notify_all()
+
+    def _acquire_driver(self):
+        with self._condition:
+            while not self._idle and self._size >= self._max_size:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._size += 1
+
+        try:
+            return self._driver_factory()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+
+    def _release_driver(self, driver, reusable):
+        with self._condition:
+            if reusable:
+                self._idle.append(driver)
+            else:
+                self._size -= 1
+            self._condition.notify()
+
+        if not reusable:
+            try:
+                driver.quit()
+            except Exception as e:
+                logging.debug("Error when quitting browser: %s" % e)
+
+    @contextlib.contextmanager
+    def lease(self):
+        """
+        Context manager providing a BrowserLease. Waits for a browser if
+        all are in use. Browsers that fail are replaced by new ones.
+        """
+        driver = self._acquire_driver()
+        reusable = False
+        try:
+            browser_lease = BrowserLease(driver)
+            try:
+                yield browser_lease
+            finally:
+                browser_lease.close()
+            reusable = True
+        finally:
+            self._release_driver(driver, reusable)
+
+    def warm_up(self):
+        """Launches a browser in the background, if none is running yet"""
+        with self._condition:
+            if self._size > 0:
+                return
+            self._size += 1
+
+        def launch():
+            try:
+                driver = self._driver_factory()
+            except Exception as e:
+                logging.warning("Could not launch browser: %s" % e)
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                return
+            self._release_driver(driver, True)
+
+        threading.Thread(target=launch, daemon=True).start()
+
+    def close(self):
+        """Quits all idle browsers"""
+        with self._condition:
+            idle = self._idle
+            self._idle = []
+            self._size -= len(idle)
+
+        for driver in idle:
+            try:
+                driver.quit()
+            except Exception as e:
+                logging.debug("Error when quitting browser: %s" % e)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(max_size=1):
+    """
+    Returns the BrowserPool shared by the whole process, making sure
+    it can hold at least max_size browsers.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(max_size=max_size)
+            atexit.register(_pool.close)
+        else:
+            _pool.grow(max_size)
+        return _pool
@@ -0,0 +1,185 @@
+import threading
+import time
+import unittest
+
+from selenium.common.exceptions import WebDriverException
+
+from checks import browser_pool
+
+
+class FakeDriver(object):
+    """Records the DevTools commands a lease sends"""
+
+    def __init__(self, cookies=None):
+        self.commands = []
+        self.cookies = cookies or []
+        self.window_handles = ['default']
+        self.current_window_handle = 'default'
+        self.contexts = 0
+        self.quit_called = False
+
+    def execute_cdp_cmd(self, cmd, params):
+        self.commands.append((cmd, params))
+        if cmd == 'Target.createBrowserContext':
+            self.contexts += 1
+            return {'browserContextId': 'context-%d' % self.contexts}
+        if cmd == 'Target.createTarget':
+            target_id = 'target-%d' % len(self.window_handles)
+            self.window_handles.append(target_id)
+            return {'targetId': target_id}
+        if cmd == 'Storage.getCookies':
+            return {'cookies': self.cookies}
+        return {}
+
+    def execute_script(self, script):
+        return 'FakeBrowser/1.0'
+
+    def get_log(self, log_type):
+        return []
+
+    @property
+    def switch_to(self):
+        driver = self
+
+        class SwitchTo(object):
+            def window(self, handle):
+                driver.current_window_handle = handle
+
+        return SwitchTo()
+
+    def quit(self):
+        self.quit_called = True
+
+
+class TestBrowserPool(unittest.TestCase):
+
+    def test_driver_is_reused(self):
+        drivers = []
+
+        def factory():
+            drivers.append(FakeDriver())
+            return drivers[-1]
+
+        pool = browser_pool.BrowserPool(driver_factory=factory)
+        for _ in range(2):
+            with pool.lease() as lease:
+                self.assertTrue(lease.driver.current_window_handle.startswith('target-'))
+
+        self.assertEqual(len(drivers), 1)
+        commands = [cmd for cmd, _ in drivers[0].commands]
+        self.assertEqual(commands, ['Target.createBrowserContext', 'Target.createTarget',
+                                    'Target.disposeBrowserContext'] * 2)
+        self.assertEqual(drivers[0].current_window_handle, 'default')
+        self.assertFalse(drivers[0].quit_called)
+
+    def test_context_per_lease(self):
+        driver = FakeDriver()
+        pool = browser_pool.BrowserPool(driver_factory=lambda: driver)
+        with pool.lease():
+            pass
+        with pool.lease():
+            pass
+
+        created = [params for cmd, params in driver.commands if cmd == 'Target.createTarget']
+        disposed = [params for cmd, params in driver.commands if cmd == 'Target.disposeBrowserContext']
+        self.assertEqual([p['browserContextId'] for p in created], ['context-1', 'context-2'])
+        self.assertEqual([p['browserContextId'] for p in disposed], ['context-1', 'context-2'])
+
+    def test_failed_driver_is_replaced(self):
+        drivers = []
+
+        def factory():
+            drivers.append(FakeDriver())
+            return drivers[-1]
+
+        pool = browser_pool.BrowserPool(driver_factory=factory)
+        with self.assertRaises(WebDriverException):
+            with pool.lease():
+                raise WebDriverException("browser crashed")
+
+        with pool.lease():
+            pass
+
+        self.assertEqual(len(drivers), 2)
+        self.assertTrue(drivers[0].quit_called)
+
+    def test_max_size(self):
+        pool = browser_pool.BrowserPool(max_size=1, driver_factory=FakeDriver)
+        events = []
+
+        def use(name):
+            with pool.lease():
+                events.append('start ' + name)
+                time.sleep(0.02)
+                events.append('end ' + name)
+
+        threads = [threading.Thread(target=use, args=(name,)) for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([e.split()[0] for e in events], ['start', 'end', 'start', 'end'])
+
+    def test_grow(self):
+        pool = browser_pool.BrowserPool(max_size=1, driver_factory=FakeDriver)
+        pool.grow(2)
+        self.assertEqual(pool.max_size, 2)
+        pool.grow(1)
+        self.assertEqual(pool.max_size, 2)
+
+        barrier = threading.Barrier(2, timeout=1)
+
+        def use():
+            with pool.lease():
+                # both leases are held at the same time
+                barrier.wait()
+
+        threads = [threading.Thread(target=use) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(barrier.broken)
+
+    def test_cookies(self):
+        driver = FakeDriver(cookies=[
+            {'name': 'session', 'value': 'x', 'domain': 'www.example.com', 'path': '/',
+             'expires': -1, 'httpOnly': True, 'secure': False, 'session': True},
+            {'name': 'tracker', 'value': 'y', 'domain': '.tracker.example', 'path': '/',
+             'expires': 1700000000, 'httpOnly': False, 'secure': True, 'session': False},
+        ])
+        pool = browser_pool.BrowserPool(driver_factory=lambda: driver)
+        with pool.lease() as lease:
+            cookies = lease.get_cookies()
+
+        self.assertEqual(cookies, [
+            {
+                'creation_utc': None,
+                'host_key': 'www.example.com',
+                'name': 'session',
+                'path': '/',
+                'expires_utc': 0,
+                'is_secure': 0,
+                'is_httponly': 1,
+                'has_expires': 0,
+                'is_persistent': 0,
+            },
+            {
+                'creation_utc': None,
+                'host_key': '.tracker.example',
+                'name': 'tracker',
+                'path': '/',
+                'expires_utc': 13344473600000000,
+                'is_secure': 1,
+                'is_httponly': 0,
+                'has_expires': 1,
+                'is_persistent': 1,
+            },
+        ])
+        self.assertIn(('Storage.getCookies', {'browserContextId': 'context-1'}), driver.commands)
+
+
+if __name__ == '__main__':
+    unittest.main()
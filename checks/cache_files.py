@@ -0,0 +1,61 @@
+"""
+Helpers for caches keeping their entries as JSON files in a local
+folder, which may be shared by several processes (see
+shared_cache.FileCache and http_cache.DiskCache).
+
+Besides the entries, such a folder may hold marker files, recording
+state like the time of the last cleanup for all processes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+
+def entry_filename(path, key):
+    """Returns the name of the file for the entry with key in path"""
+    return os.path.join(path, hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json')
+
+
+def write_json(filename, data, mtime=None):
+    """
+    Writes data as JSON to filename and returns the file size. The file
+    is written under a temporary name first, so that readers never see
+    partially written files. mtime optionally sets the modification
+    time of the file.
+
+    Raises OSError, TypeError or ValueError if writing fails.
+    """
+    fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            json.dump(data, out)
+        size = os.path.getsize(tmp_filename)
+        if mtime is not None:
+            os.utime(tmp_filename, (mtime, mtime))
+        os.replace(tmp_filename, filename)
+    except (OSError, TypeError, ValueError):
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
+        raise
+    return size
+
+
+def read_marker(filename):
+    """
+    Returns the modification time and the data of a marker file written
+    with write_json(), or (None, None) if there is no valid one.
+    """
+    try:
+        mtime = os.stat(filename).st_mtime
+        with open(filename, 'r', encoding='utf-8') as marker:
+            return mtime, json.load(marker)
+    except FileNotFoundError:
+        return None, None
+    except (OSError, ValueError) as e:
+        logging.warning("Could not read cache marker %s: %s" % (filename, e))
+        return None, None
@@ -0,0 +1,38 @@
+import os
+import tempfile
+import unittest
+
+from checks import cache_files
+
+
+class TestCacheFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_write_json(self):
+        filename = cache_files.entry_filename(self.tmpdir.name, 'key')
+        size = cache_files.write_json(filename, {'a': 1}, mtime=1000)
+
+        self.assertEqual(size, os.path.getsize(filename))
+        self.assertEqual(cache_files.read_marker(filename), (1000, {'a': 1}))
+        self.assertEqual(os.listdir(self.tmpdir.name), [os.path.basename(filename)])
+
+    def test_write_error(self):
+        filename = cache_files.entry_filename(self.tmpdir.name, 'key')
+        with self.assertRaises(TypeError):
+            cache_files.write_json(filename, {'a': object()})
+
+        # no temporary files are left behind
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_no_marker(self):
+        filename = os.path.join(self.tmpdir.name, '.marker')
+        self.assertEqual(cache_files.read_marker(filename), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,13 @@
 """
 Gathers information on the TLS/SSL certificate used by a server
+
+Successfully retrieved certificate information is kept in the shared
+cache (see Config.shared_cache) per hostname and port, as many sites
+are served by the same hosts.
+
+Where previous checks (like url_reachability) already connected to the
+server, the certificate captured by the HTTP session is used (see
+Config.peer_certificate). A new connection is only opened otherwise.
 """
 
 from urllib.parse import urlparse
@@ -14,15 +22,27 @@ from OpenSSL import crypto
 from checks.abstract_checker import AbstractChecker
 
 class Checker(AbstractChecker):
+
+    # maximum duration of the check (seconds)
+    max_duration = 60
+
+    # seconds to keep certificate information in the shared cache
+    cache_ttl = 6 * 60 * 60
+
+    # timeout for connecting to servers and for the TLS handshake (seconds)
+    CONNECT_TIMEOUT = 10
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
     
     def run(self):
         results = {}
 
-        for url in self.config.urls:
-            if url.startswith('https://'):
-                results[url] = self.get_certificate(url)
+        urls = [url for url in self.config.urls if url.startswith('https://')]
+
+        for url, result in zip(urls, self.map_urls(self.get_certificate, urls)):
+            if result is not None:
+                results[url] = result
 
         return results
     
@@ -41,16 +61,16 @@ class Checker(AbstractChecker):
         if parsed.port is not None:
             port = parsed.port
 
-        try:
-            #cert = ssl.get_server_certificate((parsed.hostname, port))
-
-            context = ssl.create_default_context()
+        cache_key = 'certificate:%s:%s' % (parsed.hostname, port)
+        cached = self.config.shared_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-            # get certificate with SNI
-            with socket.create_connection((parsed.hostname, port)) as sock:
-                with context.wrap_socket(sock, server_hostname=parsed.hostname) as sslsock:
-                    der_cert = sslsock.getpeercert(True)
-                    cert = ssl.DER_cert_to_PEM_cert(der_cert)
+        try:
+            der_cert = self.config.peer_certificate(parsed.hostname, port)
+            if der_cert is None:
+                der_cert = self.fetch_certificate(parsed.hostname, port)
+            cert = ssl.DER_cert_to_PEM_cert(der_cert)
 
             try:
                 x509 = crypto.load_certificate(crypto.FILETYPE_PEM, cert)
@@ -79,4 +99,23 @@ class Checker(AbstractChecker):
             }
             logging.warning("Error when getting certificate for %s: %r" % (url, e))
 
+        if result['exception'] is None:
+            # don't serve the certificate from the cache once it's expired
+            expires_in = (datetime.fromisoformat(result['not_after']) - datetime.now(timezone.utc)).total_seconds()
+            ttl = min(self.cache_ttl, expires_in)
+            if ttl > 0:
+                self.config.shared_cache.set(cache_key, result, ttl)
+
         return result
+
+    def fetch_certificate(self, hostname, port):
+        """
+        Connects to hostname:port and returns the DER encoded certificate
+        presented by the server
+        """
+        context = ssl.create_default_context()
+
+        # get certificate with SNI
+        with socket.create_connection((hostname, port), timeout=self.budget.timeout(self.CONNECT_TIMEOUT)) as sock:
+            with context.wrap_socket(sock, server_hostname=hostname) as sslsock:
+                return sslsock.getpeercert(True)
@@ -1,9 +1,54 @@
 from checks import certificate
 from checks.config import Config
+from checks.shared_cache import FileCache
 
+import datetime
+import http.server
+import os
+import ssl
+import tempfile
+import threading
 import unittest
 from pprint import pprint
 
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+
+def make_certificate(hostname):
+    """Returns a self-signed certificate for hostname and its key, PEM encoded"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(1234)
+            .not_valid_before(now - datetime.timedelta(days=1))
+            .not_valid_after(now + datetime.timedelta(days=1))
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName(hostname)]), critical=False)
+            .sign(key, hashes.SHA256()))
+    key_pem = key.private_bytes(serialization.Encoding.PEM,
+                                serialization.PrivateFormat.PKCS8,
+                                serialization.NoEncryption())
+    return cert.public_bytes(serialization.Encoding.PEM), key_pem
+
+
+class HeadHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
 class TestCertificateChecker(unittest.TestCase):
 
     def test_google(self):
@@ -36,6 +81,82 @@ class TestCertificateChecker(unittest.TestCase):
         self.assertIsNone(result[url]['exception'])
         self.assertEqual(result[url]['subject']['CN'], '*.badssl.com')
 
+    def test_shared_cache(self):
+        """Takes certificate information from the shared cache"""
+        cached = {
+            'exception': None,
+            'serial_number': '1',
+            'subject': {'CN': 'example.invalid'},
+            'issuer': {'O': 'Example CA'},
+            'not_before': '2024-01-01T00:00:00+00:00',
+            'not_after': '2034-01-01T00:00:00+00:00',
+        }
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = FileCache(tmpdir)
+            cache.set('certificate:example.invalid:443', cached, 60)
+
+            url = 'https://example.invalid/'
+            config = Config(urls=[url], shared_cache=cache)
+            checker = certificate.Checker(config=config, previous_results={})
+            result = checker.run()
+
+        self.assertEqual(result[url], cached)
+
+    def test_peer_certificate(self):
+        """Uses the certificate seen by the HTTP session"""
+        cert_pem, _ = make_certificate('example.invalid')
+
+        url = 'https://example.invalid/'
+        config = Config(urls=[url])
+        config.add_peer_certificate('example.invalid', 443,
+                                    ssl.PEM_cert_to_DER_cert(cert_pem.decode('ascii')))
+        checker = certificate.Checker(config=config, previous_results={})
+        result = checker.run()
+
+        self.assertIsNone(result[url]['exception'])
+        self.assertEqual(result[url]['serial_number'], '1234')
+        self.assertEqual(result[url]['subject']['CN'], 'example.invalid')
+
+
+class TestPeerCertificateCapture(unittest.TestCase):
+
+    def setUp(self):
+        cert_pem, key_pem = make_certificate('localhost')
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cert_path = os.path.join(self.tmpdir.name, 'cert.pem')
+        key_path = os.path.join(self.tmpdir.name, 'key.pem')
+        with open(self.cert_path, 'wb') as f:
+            f.write(cert_pem)
+        with open(key_path, 'wb') as f:
+            f.write(key_pem)
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.cert_path, key_path)
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), HeadHandler)
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmpdir.cleanup()
+
+    def test_capture(self):
+        """The HTTP session keeps the certificate of HTTPS connections"""
+        port = self.server.server_address[1]
+        url = 'https://localhost:%s/' % port
+        config = Config(urls=[url])
+        config.http_session.head(url, verify=self.cert_path)
+
+        der_cert = config.peer_certificate('localhost', port)
+        self.assertIsNotNone(der_cert)
+
+        checker = certificate.Checker(config=config, previous_results={})
+        result = checker.run()
+        self.assertIsNone(result[url]['exception'])
+        self.assertEqual(result[url]['subject']['CN'], 'localhost')
+        config.close()
+
 
 
 if __name__ == '__main__':
@@ -5,13 +5,14 @@ TODO: Check for http-equiv meta tags like
       <meta http-equiv="content-type" content="text/html; charset=iso-8859-1" />
 """
 
+import codecs
 import logging
 
-from bs4 import BeautifulSoup
-
 from checks.abstract_checker import AbstractChecker
 
 class Checker(AbstractChecker):
+    depends_on_checks = ['page_content']
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
     
@@ -46,7 +47,7 @@ class Checker(AbstractChecker):
             'exception': None,
         }
 
-        soup = BeautifulSoup(page_content['content'], 'html.parser')
+        document = self.config.documents.get(url)
 
         # get response header charset
         if ('content-type' in page_content['response_headers']
@@ -56,22 +57,38 @@ class Checker(AbstractChecker):
             result['charset'] = parts[1].lower()
 
         # get meta tag charset
-        metatags = soup.find_all('meta')
+        metatags = document.iter('meta') if document is not None else []
         for tag in metatags:
-            if 'charset' in tag.attrs:
-                result['meta_charset_tag'] = tag['charset'].lower()
+            if 'charset' in tag.attrib:
+                result['meta_charset_tag'] = tag.get('charset').lower()
                 # meta tag overrules any previous value
-                result['charset'] = tag['charset'].lower()
+                result['charset'] = tag.get('charset').lower()
         
-        # check for charset plausibility (only for most common ones)
-        if result['charset'] in ('iso-8859-1', 'utf-8'):
-            try:
-                _ = page_content['content'].encode(result['charset'])
-            except UnicodeEncodeError as e:
-                result['valid'] = False
-                result['exception'] = str(e)
-            else:
-                result['valid'] = True
+        # check for charset plausibility (only for most common ones).
+        # Pages cut at page_content's size limit are left out, as they
+        # may be cut in the middle of a character.
+        if result['charset'] in ('iso-8859-1', 'utf-8') and not page_content.get('content_truncated'):
+            result['valid'], result['exception'] = self.validate(url, page_content['content'], result['charset'])
 
 
         return result
+
+    def validate(self, url, content, charset):
+        """
+        Returns whether the page is valid in charset, and the error
+        message if not. Uses the raw bytes of the page if available.
+
+        Any bytes decode as a single-byte charset like ISO-8859-1, so the
+        page's text must also be representable in charset.
+        """
+        raw, encoding = self.config.documents.get_source(url)
+        try:
+            if raw is not None and (encoding is None or
+                                    codecs.lookup(encoding).name != codecs.lookup(charset).name):
+                # page_content hasn't decoded the page with this charset
+                _ = raw.decode(charset)
+            _ = content.encode(charset)
+        except UnicodeError as e:
+            return False, str(e)
+
+        return True, None
@@ -45,5 +45,59 @@ class TestCharsetChecker(unittest.TestCase):
             'exception': None,
         })
 
+    def test_invalid_utf8(self):
+        url = 'http://www.example.com/'
+        httpretty.register_uri(httpretty.GET, url,
+            body='<html><head><meta charset="utf-8"></head><body>Grün</body></html>'.encode('latin-1'),
+            adding_headers={
+                "Content-Type": "text/html; charset=ISO-8859-1",
+            })
+
+        results = {}
+        config = Config(urls=[url])
+        results['page_content'] = page_content.Checker(config=config, previous_results={}).run()
+        result = charset.Checker(config=config, previous_results=results).run()
+
+        self.assertEqual(result[url]['charset'], 'utf-8')
+        self.assertFalse(result[url]['valid'])
+        self.assertIn("can't decode byte 0xfc", result[url]['exception'])
+
+    def test_invalid_iso_8859_1(self):
+        url = 'http://www.example.com/'
+        httpretty.register_uri(httpretty.GET, url,
+            body='<html><head><meta charset="iso-8859-1"></head><body>5 €</body></html>'.encode('utf-8'),
+            adding_headers={
+                "Content-Type": "text/html; charset=utf-8",
+            })
+
+        results = {}
+        config = Config(urls=[url])
+        results['page_content'] = page_content.Checker(config=config, previous_results={}).run()
+        result = charset.Checker(config=config, previous_results=results).run()
+
+        self.assertEqual(result[url]['charset'], 'iso-8859-1')
+        self.assertFalse(result[url]['valid'])
+        self.assertIn("can't encode character '\\u20ac'", result[url]['exception'])
+    def test_truncated(self):
+        url = 'http://www.example.com/'
+        httpretty.register_uri(httpretty.GET, url,
+            body='<html><head><meta charset="utf-8"></head><body>%s</body></html>' % ('ü' * 100),
+            adding_headers={
+                "Content-Type": "text/html; charset=utf-8",
+            })
+
+        results = {}
+        config = Config(urls=[url])
+        checker = page_content.Checker(config=config, previous_results={})
+        checker.MAX_CONTENT_BYTES = 100
+        results['page_content'] = checker.run()
+        result = charset.Checker(config=config, previous_results=results).run()
+
+        # not validated, as the page may end in a partial character
+        self.assertEqual(result[url]['charset'], 'utf-8')
+        self.assertIsNone(result[url]['valid'])
+        self.assertIsNone(result[url]['exception'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,3 +1,17 @@
+import logging
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from checks.document_cache import DocumentCache
+from checks.http_cache import HTTPCache
+from checks.screenshot_storage import CloudStorage
+from checks.shared_cache import SharedCache
+from checks.time_budget import TimeBudget
+
+
 class Config(object):
     """
     Our configuration to be passed to checks
@@ -9,13 +23,97 @@ class Config(object):
                  screenshot_datastore_kind='',
                  storage_credentials_path='',
                  datastore_credentials_path='',
-                 user_agent='green-spider/1.0'):
+                 user_agent='green-spider/1.0',
+                 max_workers=8,
+                 max_workers_per_host=2,
+                 http_pool_connections=10,
+                 http_pool_maxsize=10,
+                 dns_nameservers=None,
+                 dns_port=53,
+                 shared_cache=None,
+                 http_cache=None,
+                 time_budget=None,
+                 browser_concurrency=2,
+                 screenshot_storage=None,
+                 screenshot_format='png',
+                 screenshot_quality=80,
+                 reachability_method='GET',
+                 feed_max_entries=None):
         self._urls = set(urls)
         self._user_agent = user_agent
         self._screenshot_bucket_name = screenshot_bucket_name
         self._screenshot_datastore_kind = screenshot_datastore_kind
         self._storage_credentials_path = storage_credentials_path
         self._datastore_credentials_path = datastore_credentials_path
+        self._max_workers = max_workers
+        self._max_workers_per_host = max_workers_per_host
+
+        # Semaphore shared by all checkers, to limit the number of
+        # URLs processed concurrently during the whole run.
+        self._worker_semaphore = threading.BoundedSemaphore(max_workers)
+
+        # One semaphore per hostname, shared by all checkers, to limit
+        # the number of concurrent requests to a single host.
+        self._host_semaphores = {}
+        self._host_semaphores_lock = threading.Lock()
+
+        # Keep-alive HTTP session shared by all checkers, created on first use.
+        self._http_pool_connections = http_pool_connections
+        self._http_pool_maxsize = http_pool_maxsize
+        self._http_session = None
+        self._http_session_lock = threading.Lock()
+
+        # DER encoded TLS certificates seen by the HTTP session,
+        # as a dict of (hostname, port) -> bytes
+        self._peer_certificates = {}
+        self._peer_certificates_lock = threading.Lock()
+
+        # Name servers to use instead of the system's resolver configuration
+        self._dns_nameservers = dns_nameservers
+        self._dns_port = dns_port
+
+        # Cache shared with other site runs
+        self._shared_cache = shared_cache or SharedCache()
+
+        # Cache of HTTP responses from previous runs
+        self._http_cache = http_cache or HTTPCache()
+
+        # Where load_in_browser stores screenshots. Defaults to the
+        # bucket and datastore kind given above.
+        self._screenshot_storage = screenshot_storage
+
+        # Image format of screenshots, 'png' or 'webp', and the quality
+        # (0-100) of lossy formats
+        if screenshot_format not in ('png', 'webp'):
+            raise ValueError("Unsupported screenshot format %r" % screenshot_format)
+        self._screenshot_format = screenshot_format
+        self._screenshot_quality = screenshot_quality
+
+        # Number of pages to load in browsers at the same time
+        self._browser_concurrency = browser_concurrency
+
+        # Time available for all checks of the site
+        self._time_budget = time_budget or TimeBudget()
+
+        # Parsed HTML documents, filled by page_content
+        self._documents = DocumentCache()
+
+        # Request method of url_reachability. With 'GET', pages are
+        # handed over to page_content, which doesn't request them again.
+        if reachability_method not in ('GET', 'HEAD'):
+            raise ValueError("Unsupported reachability method %r" % reachability_method)
+        self._reachability_method = reachability_method
+
+        # Number of entries load_feeds looks at per feed, None for all
+        if feed_max_entries is not None and feed_max_entries < 1:
+            raise ValueError("Invalid feed_max_entries %r" % feed_max_entries)
+        self._feed_max_entries = feed_max_entries
+
+        # Pages fetched by url_reachability, by URL, and the URLs
+        # whose pages are being or have been fetched
+        self._prefetched_pages = {}
+        self._claimed_prefetches = set()
+        self._prefetched_pages_lock = threading.Lock()
     
     def __repr__(self):
       return "Config(urls=%r)" % self._urls
@@ -53,3 +151,179 @@ class Config(object):
     @property
     def screenshot_datastore_kind(self):
         return self._screenshot_datastore_kind
+
+    @property
+    def screenshot_storage(self):
+        """The ScreenshotStorage for screenshots taken by load_in_browser"""
+        if self._screenshot_storage is None:
+            self._screenshot_storage = CloudStorage(self._screenshot_bucket_name,
+                                                    self._screenshot_datastore_kind,
+                                                    self._storage_credentials_path,
+                                                    self._datastore_credentials_path)
+        return self._screenshot_storage
+
+    @property
+    def screenshot_format(self):
+        """Image format of screenshots, 'png' or 'webp'"""
+        return self._screenshot_format
+
+    @property
+    def screenshot_quality(self):
+        """Quality of screenshots in lossy formats, from 0 to 100"""
+        return self._screenshot_quality
+
+    @property
+    def max_workers(self):
+        """Maximum number of URLs processed concurrently by all checkers"""
+        return self._max_workers
+
+    @property
+    def worker_semaphore(self):
+        """The semaphore limiting concurrent work to max_workers"""
+        return self._worker_semaphore
+
+    @property
+    def max_workers_per_host(self):
+        """Maximum number of concurrent requests to the same host"""
+        return self._max_workers_per_host
+
+    def host_semaphore(self, hostname):
+        """Returns the semaphore limiting concurrent work on hostname"""
+        with self._host_semaphores_lock:
+            if hostname not in self._host_semaphores:
+                self._host_semaphores[hostname] = threading.BoundedSemaphore(self._max_workers_per_host)
+            return self._host_semaphores[hostname]
+
+    @property
+    def dns_nameservers(self):
+        """List of name server IP addresses, or None to use the system's"""
+        return self._dns_nameservers
+
+    @property
+    def dns_port(self):
+        return self._dns_port
+
+    @property
+    def shared_cache(self):
+        """The SharedCache for results that are reusable across sites"""
+        return self._shared_cache
+
+    @property
+    def http_cache(self):
+        """The HTTPCache for conditional requests of pages"""
+        return self._http_cache
+
+    @property
+    def browser_concurrency(self):
+        """Maximum number of browsers loading pages at the same time"""
+        return self._browser_concurrency
+
+    @property
+    def time_budget(self):
+        """The TimeBudget for all checks of the site"""
+        return self._time_budget
+
+    @property
+    def documents(self):
+        """The DocumentCache holding parsed pages of this run"""
+        return self._documents
+
+    @property
+    def reachability_method(self):
+        """HTTP method url_reachability uses, 'GET' or 'HEAD'"""
+        return self._reachability_method
+
+    @property
+    def feed_max_entries(self):
+        """Number of entries load_feeds looks at per feed, or None for all"""
+        return self._feed_max_entries
+
+    def claim_prefetch(self, url):
+        """
+        Returns True if the page for url is yet to be prefetched, and
+        marks it as claimed by the caller. Returns False if it is
+        being or has been prefetched already.
+        """
+        with self._prefetched_pages_lock:
+            if url in self._claimed_prefetches:
+                return False
+            self._claimed_prefetches.add(url)
+            return True
+
+    def add_prefetched_page(self, url, page):
+        """Keeps a page (as returned by page_content.fetch_page) for page_content"""
+        with self._prefetched_pages_lock:
+            self._prefetched_pages[url] = page
+
+    def pop_prefetched_page(self, url):
+        """Returns and forgets the page prefetched for url, or None"""
+        with self._prefetched_pages_lock:
+            return self._prefetched_pages.pop(url, None)
+
+    def clear_prefetched_pages(self):
+        """Forgets all prefetched pages"""
+        with self._prefetched_pages_lock:
+            self._prefetched_pages.clear()
+
+    @property
+    def http_session(self):
+        """
+        Returns the pooled requests.Session to be used for all HTTP requests.
+
+        http_pool_connections is the number of hosts to keep connections for,
+        http_pool_maxsize the number of connections kept per host.
+        """
+        with self._http_session_lock:
+            if self._http_session is None:
+                adapter = HTTPAdapter(pool_connections=self._http_pool_connections,
+                                      pool_maxsize=self._http_pool_maxsize)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = self._user_agent
+                session.hooks['response'].append(self._capture_peer_certificate)
+                self._http_session = session
+            return self._http_session
+
+    def _capture_peer_certificate(self, response, **kwargs):
+        """
+        Response hook of the HTTP session, keeping the server certificate
+        of HTTPS connections while they are still attached to the response.
+        Connections already closed by the server are skipped.
+        """
+        parsed = urlparse(response.url)
+        if parsed.scheme != 'https':
+            return
+
+        port = parsed.port or 443
+        if self.peer_certificate(parsed.hostname, port) is not None:
+            return
+
+        try:
+            der_cert = response.raw.connection.sock.getpeercert(True)
+        except Exception as e:
+            logging.debug("Could not get peer certificate for %s: %r" % (response.url, e))
+            return
+
+        if der_cert:
+            self.add_peer_certificate(parsed.hostname, port, der_cert)
+
+    def add_peer_certificate(self, hostname, port, der_cert):
+        """Stores the DER encoded certificate presented by hostname:port"""
+        with self._peer_certificates_lock:
+            self._peer_certificates[(hostname, port)] = der_cert
+
+    def peer_certificate(self, hostname, port):
+        """
+        Returns the DER encoded certificate presented by hostname:port to
+        the HTTP session, or None if there was no such connection.
+        """
+        with self._peer_certificates_lock:
+            return self._peer_certificates.get((hostname, port))
+
+    def close(self):
+        """Releases the resources held by the config, like HTTP connections"""
+        with self._http_session_lock:
+            if self._http_session is not None:
+                self._http_session.close()
+                self._http_session = None
@@ -2,31 +2,51 @@
 This check attempts to resolve all hostnames/domains in the input URLs.
 
 URLs which are not resolvable are removed from the config.
+
+Each distinct hostname is resolved only once, with the A and AAAA
+queries for all hostnames running concurrently. Answers are kept in
+an in-process cache and in the shared cache (see Config.shared_cache)
+for as long as their TTL allows.
 """
 
+import asyncio
+import copy
 import logging
+import threading
+import time
 from urllib.parse import urlparse
-from urllib.parse import urlunparse
 
-import dns.resolver
+import dns.asyncresolver
 
 from checks.abstract_checker import AbstractChecker
 
 
+# Cached answers as a dict of (hostname, record type) -> (expiry, addresses),
+# where expiry is a time.monotonic() value.
+_cache = {}
+_cache_lock = threading.Lock()
+
+
 class Checker(AbstractChecker):
+    modifies_urls = True
+
+    # maximum duration of the check (seconds)
+    max_duration = 30
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
 
     def run(self):
         """Executes the check routine, returns result dict"""
-        
+
         results = {}
 
         urls = list(self.config.urls)
+        hostnames = list(dict.fromkeys(urlparse(url).hostname for url in urls))
+        resolved = asyncio.run(self.resolve_hostnames(hostnames))
+
         for url in urls:
-            parsed = urlparse(url)
-            
-            results[url] = self.resolve_hostname(parsed.hostname)
+            results[url] = copy.deepcopy(resolved[urlparse(url).hostname])
 
             # remove URL if IPv4 non-resolvable
             if not results[url]['resolvable_ipv4']:
@@ -34,9 +54,31 @@ class Checker(AbstractChecker):
 
         return results
 
-    def resolve_hostname(self, hostname):
+    def make_resolver(self):
+        """Creates the resolver, using the configured name servers if given"""
+        if self.config.dns_nameservers is None:
+            resolver = dns.asyncresolver.Resolver()
+        else:
+            resolver = dns.asyncresolver.Resolver(configure=False)
+            resolver.nameservers = list(self.config.dns_nameservers)
+            resolver.port = self.config.dns_port
+
+        resolver.lifetime = self.budget.timeout(resolver.lifetime)
+        return resolver
+
+    async def resolve_hostnames(self, hostnames):
         """
-        Resolve one to IPv4 address(es)
+        Resolves all hostnames concurrently. Returns a dict of
+        hostname -> result.
+        """
+        resolver = self.make_resolver()
+        resolved = await asyncio.gather(*[self.resolve_hostname(resolver, hostname)
+                                          for hostname in hostnames])
+        return dict(zip(hostnames, resolved))
+
+    async def resolve_hostname(self, resolver, hostname):
+        """
+        Resolve one hostname to IPv4 and IPv6 address(es)
         """
         result = {
             'hostname': hostname,
@@ -47,22 +89,54 @@ class Checker(AbstractChecker):
             'ipv6_addresses': [],
         }
 
-        # IPv4
-        try:
-            answers = dns.resolver.resolve(hostname, "A")
+        ipv4, ipv6 = await asyncio.gather(self.resolve(resolver, hostname, "A"),
+                                          self.resolve(resolver, hostname, "AAAA"))
+
+        if ipv4 is not None:
             result['resolvable_ipv4'] = True
-            for rdata in answers:
-                result['ipv4_addresses'].append(rdata.address)
-        except Exception as e:
-            logging.debug("Hostname %s not resolvable via IPv4. Exception: %r" % (hostname, e))
+            result['ipv4_addresses'] = ipv4
 
-        # IPv6
-        try:
-            answers = dns.resolver.resolve(hostname, "AAAA")
+        if ipv6 is not None:
             result['resolvable_ipv6'] = True
-            for rdata in answers:
-                result['ipv6_addresses'].append(rdata.address)
-        except Exception as e:
-            logging.debug("Hostname %s not resolvable via IPv6. Exception: %r" % (hostname, e))
-        
+            result['ipv6_addresses'] = ipv6
+
         return result
+
+    async def resolve(self, resolver, hostname, rdtype):
+        """
+        Returns the list of addresses for hostname and record type rdtype,
+        or None if the name can't be resolved.
+        """
+        key = (hostname, rdtype)
+        with _cache_lock:
+            if key in _cache and _cache[key][0] > time.monotonic():
+                return list(_cache[key][1])
+
+        # The shared cache does file or network I/O, which must not
+        # block the other lookups running in the event loop.
+        loop = asyncio.get_running_loop()
+        shared_cache_key = 'dns:%s:%s' % (hostname, rdtype)
+        cached = await loop.run_in_executor(None, self.config.shared_cache.get, shared_cache_key)
+        if isinstance(cached, dict):
+            ttl = cached['expires'] - time.time()
+            if ttl > 0:
+                with _cache_lock:
+                    _cache[key] = (time.monotonic() + ttl, cached['addresses'])
+                return list(cached['addresses'])
+
+        try:
+            answers = await resolver.resolve(hostname, rdtype)
+        except Exception as e:
+            logging.debug("Hostname %s not resolvable via %s. Exception: %r" % (hostname, rdtype, e))
+            return None
+
+        addresses = [rdata.address for rdata in answers]
+        ttl = answers.rrset.ttl
+        with _cache_lock:
+            _cache[key] = (time.monotonic() + ttl, addresses)
+        await loop.run_in_executor(None, self.config.shared_cache.set, shared_cache_key, {
+            'expires': time.time() + ttl,
+            'addresses': addresses,
+        }, ttl)
+
+        return list(addresses)
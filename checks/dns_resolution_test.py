@@ -1,10 +1,139 @@
 import unittest
 import logging
+import socket
 import sys
+import tempfile
+import threading
 from pprint import pprint
 
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
 from checks import dns_resolution
 from checks.config import Config
+from checks.shared_cache import FileCache
+
+
+class StubDNSServer(threading.Thread):
+    """
+    Minimal DNS server on a random local UDP port, answering
+    queries from a dict of (name, record type) -> addresses.
+    """
+
+    def __init__(self, records):
+        super().__init__(daemon=True)
+        self.records = records
+        self.queries = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.port = self.sock.getsockname()[1]
+
+    def run(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            query = dns.message.from_wire(data)
+            question = query.question[0]
+            name = question.name.to_text()
+            rdtype = dns.rdatatype.to_text(question.rdtype)
+            self.queries.append((name, rdtype))
+
+            response = dns.message.make_response(query)
+            if (name, rdtype) in self.records:
+                response.answer.append(dns.rrset.from_text_list(
+                    question.name, 300, 'IN', rdtype, self.records[(name, rdtype)]))
+            elif not any(key[0] == name for key in self.records):
+                response.set_rcode(dns.rcode.NXDOMAIN)
+            self.sock.sendto(response.to_wire(), addr)
+
+    def stop(self):
+        self.sock.close()
+
+
+class TestDNSResolutionStub(unittest.TestCase):
+
+    def setUp(self):
+        dns_resolution._cache.clear()
+        self.server = StubDNSServer({
+            ('example.com.', 'A'): ['192.0.2.1', '192.0.2.2'],
+            ('example.com.', 'AAAA'): ['2001:db8::1'],
+            ('www.example.com.', 'A'): ['192.0.2.3'],
+        })
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+        dns_resolution._cache.clear()
+
+    def make_config(self, urls):
+        return Config(urls=urls, dns_nameservers=['127.0.0.1'], dns_port=self.server.port)
+
+    def test_resolve(self):
+        urls = ['http://example.com/', 'https://example.com/',
+                'http://www.example.com/', 'http://nonexistent.example.com/']
+        config = self.make_config(urls)
+        checker = dns_resolution.Checker(config=config, previous_results={})
+        result = checker.run()
+
+        # the order of addresses in an answer is arbitrary
+        for url in result:
+            result[url]['ipv4_addresses'].sort()
+        self.assertEqual(result['http://example.com/'], {
+            'hostname': 'example.com',
+            'resolvable_ipv4': True,
+            'resolvable_ipv6': True,
+            'aliases': [],
+            'ipv4_addresses': ['192.0.2.1', '192.0.2.2'],
+            'ipv6_addresses': ['2001:db8::1'],
+        })
+        self.assertEqual(result['https://example.com/'], result['http://example.com/'])
+        self.assertTrue(result['http://www.example.com/']['resolvable_ipv4'])
+        self.assertFalse(result['http://www.example.com/']['resolvable_ipv6'])
+        self.assertFalse(result['http://nonexistent.example.com/']['resolvable_ipv4'])
+
+        self.assertEqual(config.urls, ['http://example.com/', 'http://www.example.com/',
+                                       'https://example.com/'])
+
+        # each hostname and record type is queried once only
+        self.assertEqual(sorted(self.server.queries), [
+            ('example.com.', 'A'),
+            ('example.com.', 'AAAA'),
+            ('nonexistent.example.com.', 'A'),
+            ('nonexistent.example.com.', 'AAAA'),
+            ('www.example.com.', 'A'),
+            ('www.example.com.', 'AAAA'),
+        ])
+
+    def test_cache(self):
+        for _ in range(2):
+            config = self.make_config(['https://example.com/'])
+            checker = dns_resolution.Checker(config=config, previous_results={})
+            result = checker.run()
+            self.assertTrue(result['https://example.com/']['resolvable_ipv4'])
+
+        self.assertEqual(len(self.server.queries), 2)
+
+    def test_shared_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for _ in range(2):
+                dns_resolution._cache.clear()
+                config = Config(urls=['https://example.com/'],
+                                dns_nameservers=['127.0.0.1'],
+                                dns_port=self.server.port,
+                                shared_cache=FileCache(tmpdir))
+                checker = dns_resolution.Checker(config=config, previous_results={})
+                result = checker.run()
+                self.assertTrue(result['https://example.com/']['resolvable_ipv4'])
+
+            # answers from the shared cache are kept in the process, too
+            self.assertIn(('example.com', 'A'), dns_resolution._cache)
+
+        self.assertEqual(len(self.server.queries), 2)
+
 
 class TestDNSResolution(unittest.TestCase):
 
@@ -0,0 +1,81 @@
+"""
+Keeps the parsed HTML documents of a site run, so that checkers
+working on the page DOM don't each have to parse the pages again.
+
+Documents are registered by page_content and parsed (using lxml)
+on first access. All further accesses return the same tree, which
+must therefore be treated as read-only.
+
+Along with the text, page_content registers the raw bytes it has been
+decoded from, so that checkers needn't encode the text again.
+"""
+
+import logging
+import threading
+
+import lxml.etree
+import lxml.html
+
+
+class DocumentCache(object):
+
+    def __init__(self):
+        # content registered per URL
+        self._content = {}
+
+        # (raw bytes, encoding) tuples per URL
+        self._sources = {}
+
+        # parsed documents per URL
+        self._documents = {}
+
+        # one lock per URL, so that each document is parsed only once
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def add(self, url, content, raw=None, encoding=None):
+        """
+        Registers the HTML content for url. raw optionally gives the bytes
+        content was decoded from, and encoding the name of the encoding
+        that decodes raw without errors, if known.
+        """
+        with self._lock:
+            self._content[url] = content
+            self._sources[url] = (raw, encoding)
+            self._documents.pop(url, None)
+            self._locks.setdefault(url, threading.Lock())
+
+    def get_source(self, url):
+        """
+        Returns the raw bytes and encoding registered for url, as a tuple.
+        Both are None if unknown.
+        """
+        with self._lock:
+            return self._sources.get(url, (None, None))
+
+    def get(self, url):
+        """
+        Returns the root element of the parsed document for url.
+
+        Returns None if no content has been registered for url or
+        if it can't be parsed.
+        """
+        with self._lock:
+            if url not in self._content:
+                return None
+            lock = self._locks[url]
+
+        with lock:
+            if url not in self._documents:
+                self._documents[url] = self.parse(url, self._content[url])
+            return self._documents[url]
+
+    def parse(self, url, content):
+        # Parse from bytes, as lxml rejects strings that carry an
+        # XML encoding declaration.
+        parser = lxml.html.HTMLParser(encoding='utf-8')
+        try:
+            return lxml.html.document_fromstring(content.encode('utf-8'), parser=parser)
+        except (lxml.etree.ParserError, ValueError) as e:
+            logging.debug("Could not parse document for URL %s: %s" % (url, e))
+            return None
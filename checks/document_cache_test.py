@@ -0,0 +1,35 @@
+import unittest
+
+from checks.document_cache import DocumentCache
+
+
+class TestDocumentCache(unittest.TestCase):
+
+    def test_parsed_once(self):
+        cache = DocumentCache()
+        cache.add('http://example.com/', '<html><body><p>Hello</p></body></html>')
+
+        document = cache.get('http://example.com/')
+        self.assertEqual(document.find('.//p').text, 'Hello')
+        self.assertIs(cache.get('http://example.com/'), document)
+
+    def test_unknown_url(self):
+        cache = DocumentCache()
+        self.assertIsNone(cache.get('http://example.com/'))
+
+    def test_empty_document(self):
+        cache = DocumentCache()
+        cache.add('http://example.com/', '')
+        self.assertIsNone(cache.get('http://example.com/'))
+
+    def test_encoding_declaration(self):
+        cache = DocumentCache()
+        cache.add('http://example.com/', '<?xml version="1.0" encoding="iso-8859-1"?>'
+                                         '<html><body><p>Grün</p></body></html>')
+
+        document = cache.get('http://example.com/')
+        self.assertEqual(document.find('.//p').text, 'Grün')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -11,6 +11,8 @@ from checks.abstract_checker import AbstractChecker
 
 
 class Checker(AbstractChecker):
+    modifies_urls = True
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
 
@@ -1,49 +1,127 @@
 """
 This checker looks at the similarity between previously downloaded pages
 and removes duplicates from the config URLs
+
+Each page is fingerprinted once: its tag sequence, its set of CSS classes
+and a MinHash signature over shingles of the tag sequence. The expensive
+exact structural comparison is only done for page pairs whose fingerprints
+indicate a high similarity. For all other pairs the estimated similarity
+is reported, and the pair's 'estimated' flag is set.
+
+Pages with the same content hash (see page_content) are identical, so
+pairs of them get a similarity of 1.0 without any comparison, and only
+one of them gets parsed and fingerprinted.
 """
 
+import collections
 import difflib
+import hashlib
+import heapq
+import itertools
 import logging
-from io import StringIO
 
 import lxml.html
 
 from checks.abstract_checker import AbstractChecker
 
 
-def _get_tags(doc):
+def _parse(document):
+    """Returns the root element of document, parsing it if it's a string"""
+    if isinstance(document, str):
+        return lxml.html.document_fromstring(document)
+    return document
+
+
+def _get_tags_and_classes(document):
+    """Returns the tag sequence and the set of classes in one pass"""
     tags = []
-    for el in doc.getroot().iter():
+    classes = set()
+    for el in _parse(document).iter():
         if isinstance(el, lxml.html.HtmlElement):
             tags.append(el.tag)
+            cls = el.get('class')
+            if cls:
+                classes.update(cls.split())
         elif isinstance(el, lxml.html.HtmlComment):
             tags.append('comment')
         else:
             raise ValueError("Don't know what to do with element: {}".format(el))
-    return tags
-
-
-def _structural_similarity(document_1, document_2):
-    document_1 = lxml.html.parse(StringIO(document_1))
-    document_2 = lxml.html.parse(StringIO(document_2))
-    tags1 = _get_tags(document_1)
-    tags2 = _get_tags(document_2)
+    return tags, classes
+
+
+# Number of consecutive tags forming one shingle
+_SHINGLE_SIZE = 4
+
+# Size of the (bottom-k) MinHash signatures
+_MINHASH_SIZE = 128
+
+
+def _shingle_hash(shingle, count):
+    """Returns a 64 bit hash of the count'th occurrence of a shingle"""
+    data = '\x00'.join(shingle + (str(count),)).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+def _minhash(tags):
+    """
+    Returns the bottom-k MinHash signature of the multiset of tag shingles,
+    i.e. the smallest hash values of all shingles. Repeated shingles are
+    numbered, so that repetitive pages of different length can be told apart.
+
+    The hash function is stable across processes (unlike hash()), so
+    signatures don't depend on the process computing them.
+    """
+    if len(tags) < _SHINGLE_SIZE:
+        shingles = [tuple(tags)]
+    else:
+        shingles = zip(*(tags[i:] for i in range(_SHINGLE_SIZE)))
+
+    counts = collections.Counter()
+    hashes = set()
+    for shingle in shingles:
+        counts[shingle] += 1
+        hashes.add(_shingle_hash(shingle, counts[shingle]))
+
+    return frozenset(heapq.nsmallest(_MINHASH_SIZE, hashes))
+
+
+def _fingerprint(document):
+    """
+    Returns the fingerprint of a document as a dict with the keys
+    'tags', 'classes' and 'minhash'.
+    """
+    tags, classes = _get_tags_and_classes(document)
+    return {
+        'tags': tags,
+        'classes': classes,
+        'minhash': _minhash(tags),
+    }
+
+
+def _estimated_similarity(fingerprint_1, fingerprint_2, k=0.5):
+    """
+    Cheap estimate of _fingerprint_similarity(). Uses the MinHash estimate of the shingle Jaccard similarity for structure.
+    """
+    signature_1 = fingerprint_1['minhash']
+    signature_2 = fingerprint_2['minhash']
+    union = heapq.nsmallest(_MINHASH_SIZE, signature_1 | signature_2)
+    both = signature_1 & signature_2
+    structural = sum(1 for h in union if h in both) / len(union)
+    style = _jaccard_similarity(fingerprint_1['classes'], fingerprint_2['classes'])
+    return k * structural + (1 - k) * style
+
+
+def _fingerprint_similarity(fingerprint_1, fingerprint_2, k=0.5):
+    """
+    Returns the similarity of two documents, given their fingerprints:
+    the weighted sum of the similarity of their tag sequences (with
+    weight k) and the Jaccard similarity of their CSS classes.
+    """
     diff = difflib.SequenceMatcher()
-    diff.set_seq1(tags1)
-    diff.set_seq2(tags2)
-    return diff.ratio()
-
-
-def _get_classes(html):
-    doc = lxml.html.fromstring(html)
-    classes = set()
-    for el in doc.iter():
-        cls = el.get('class') if hasattr(el, 'get') else None
-        if cls:
-            for c in cls.split():
-                classes.add(c)
-    return classes
+    diff.set_seq1(fingerprint_1['tags'])
+    diff.set_seq2(fingerprint_2['tags'])
+    style = _jaccard_similarity(fingerprint_1['classes'], fingerprint_2['classes'])
+    return k * diff.ratio() + (1 - k) * style
 
 
 def _jaccard_similarity(set1, set2):
@@ -56,20 +134,17 @@ def _jaccard_similarity(set1, set2):
     return intersection / max(denominator, 0.000001)
 
 
-def _style_similarity(page1, page2):
-    return _jaccard_similarity(_get_classes(page1), _get_classes(page2))
-
-
-def _similarity(document_1, document_2, k=0.5):
-    return (k * _structural_similarity(document_1, document_2)
-            + (1 - k) * _style_similarity(page1=document_1, page2=document_2))
-
-
 class Checker(AbstractChecker):
 
+    depends_on_checks = ['page_content']
+    modifies_urls = True
+
     # value above which we consider a page pair a duplicate
     similarity_threshold = 0.99999
 
+    # estimated similarity above which we calculate the exact similarity
+    candidate_threshold = 0.9
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
 
@@ -82,8 +157,10 @@ class Checker(AbstractChecker):
         
         urls = list(self.config.urls)
 
-        # get content
+        # get parsed documents, one per distinct content
         content = {}
+        content_hashes = {}
+        documents_by_hash = {}
 
         assert 'page_content' in self.previous_results
 
@@ -93,9 +170,16 @@ class Checker(AbstractChecker):
             if page_content['content'] is None:
                 logging.warning("Content for URL %s is None" % url)
 
-            content[url] = page_content['content']
+            content_hashes[url] = page_content.get('content_hash')
+            if content_hashes[url] is not None and content_hashes[url] in documents_by_hash:
+                content[url] = documents_by_hash[content_hashes[url]]
+                continue
+
+            content[url] = self.config.documents.get(url)
+            if content_hashes[url] is not None:
+                documents_by_hash[content_hashes[url]] = content[url]
         
-        pairs = self.compare_pairwise(content)
+        pairs = self.compare_pairwise(content, content_hashes)
 
         # remove duplicates
         for key in pairs:
@@ -111,35 +195,72 @@ class Checker(AbstractChecker):
         return pairs
 
 
-    def compare_pairwise(self, content):
-        # compair pairwise
-        pairs = {}
+    def compare_pairwise(self, content, content_hashes=None):
+        """
+        Compares the documents in content (a dict of URL -> document) pairwise.
+        content_hashes optionally gives the content hash for each URL.
 
-        for url1 in content:
-            for url2 in content:
-                
-                if url1 == url2:
-                    continue
-                
-                # avoid checking pairs twice
-                pair_key = " ".join(sorted([url1, url2]))
-                if pair_key in pairs:
-                    continue
+        Returns a dict of "url1 url2" -> {'similarity', 'estimated',
+        'exception'}. 'estimated' is True if the similarity is only the
+        cheap estimate, as the pages are unlikely to be duplicates.
+        """
+        if content_hashes is None:
+            content_hashes = {}
 
+        # fingerprint each distinct page once, on demand
+        fingerprints = {}
+        exceptions = {}
+
+        def fingerprint(url):
+            key = content_hashes.get(url) or url
+            if key not in fingerprints and key not in exceptions:
                 try:
-                    s = _similarity(content[url1], content[url2])
-                    logging.debug("Comparing pages for URLs %s and %s: similarity=%s", url1, url2, s)
-                    pairs[pair_key] = {
-                        'similarity': s,
-                        'exception': None,
-                    }
+                    fingerprints[key] = _fingerprint(content[url])
                 except (AttributeError, ValueError) as e:
-                    logging.error("html_similarity.similarity thre exception for URL pair %s and %s: %s", url1, url2, e)
-                    pairs[pair_key] = {
-                        'similarity': None,
-                        'exception': str(e),
-                    }
-        
+                    logging.error("Could not fingerprint page for URL %s: %s", url, e)
+                    exceptions[key] = e
+            if key in exceptions:
+                raise exceptions[key]
+            return fingerprints[key]
+
+        # compare pairwise
+        pairs = {}
+
+        for url1, url2 in itertools.combinations(sorted(content), 2):
+            pair_key = " ".join([url1, url2])
+
+            if content_hashes.get(url1) is not None and content_hashes.get(url1) == content_hashes.get(url2):
+                logging.debug("Pages for URLs %s and %s have identical content", url1, url2)
+                pairs[pair_key] = {
+                    'similarity': 1.0,
+                    'estimated': False,
+                    'exception': None,
+                }
+                continue
+
+            try:
+                fingerprint1 = fingerprint(url1)
+                fingerprint2 = fingerprint(url2)
+            except (AttributeError, ValueError) as e:
+                pairs[pair_key] = {
+                    'similarity': None,
+                    'estimated': False,
+                    'exception': str(e),
+                }
+                continue
+
+            s = _estimated_similarity(fingerprint1, fingerprint2)
+            estimated = s < self.candidate_threshold
+            if not estimated:
+                s = _fingerprint_similarity(fingerprint1, fingerprint2)
+            logging.debug("Comparing pages for URLs %s and %s: similarity=%s (estimated: %s)",
+                          url1, url2, s, estimated)
+            pairs[pair_key] = {
+                'similarity': s,
+                'estimated': estimated,
+                'exception': None,
+            }
+
         return pairs
 
 
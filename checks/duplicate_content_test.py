@@ -7,51 +7,54 @@ from checks import page_content
 from checks.config import Config
 
 
+def similarity(html1, html2, k=0.5):
+    return duplicate_content._fingerprint_similarity(
+        duplicate_content._fingerprint(html1), duplicate_content._fingerprint(html2), k=k)
+
+
 class TestSimilarity(unittest.TestCase):
 
     def test_identical_documents(self):
         html = "<html><body><h1 class='a b'>x</h1><p class='c'>y</p></body></html>"
-        self.assertEqual(duplicate_content._similarity(html, html), 1.0)
+        self.assertEqual(similarity(html, html), 1.0)
 
     def test_identical_structure_different_classes(self):
         html1 = "<html><body><h1 class='a'>x</h1><p class='b'>y</p></body></html>"
         html2 = "<html><body><h1 class='c'>x</h1><p class='d'>y</p></body></html>"
-        self.assertEqual(duplicate_content._structural_similarity(html1, html2), 1.0)
-        self.assertEqual(duplicate_content._style_similarity(html1, html2), 0.0)
-        self.assertEqual(duplicate_content._similarity(html1, html2), 0.5)
+        self.assertEqual(similarity(html1, html2, k=1.0), 1.0)
+        self.assertEqual(similarity(html1, html2, k=0.0), 0.0)
+        self.assertEqual(similarity(html1, html2), 0.5)
 
     def test_identical_classes_different_structure(self):
         html1 = "<html><body><h1 class='a'>x</h1></body></html>"
         html2 = "<html><body><div class='a'><span class='a'>x</span></div></body></html>"
-        self.assertEqual(duplicate_content._style_similarity(html1, html2), 1.0)
-        self.assertLess(duplicate_content._structural_similarity(html1, html2), 1.0)
+        self.assertEqual(similarity(html1, html2, k=0.0), 1.0)
+        self.assertLess(similarity(html1, html2, k=1.0), 1.0)
 
     def test_completely_different(self):
         html1 = "<html><body><h1 class='a'>x</h1></body></html>"
         html2 = "<html><body><div class='b'><span class='c'>y</span><p class='d'>z</p></div></body></html>"
-        self.assertLess(duplicate_content._similarity(html1, html2), 0.7)
+        self.assertLess(similarity(html1, html2), 0.7)
 
     def test_k_parameter_weights(self):
         # structural=1.0, style=0.0 → similarity == k
         html1 = "<html><body><h1 class='a'>x</h1><p class='b'>y</p></body></html>"
         html2 = "<html><body><h1 class='c'>x</h1><p class='d'>y</p></body></html>"
-        self.assertAlmostEqual(duplicate_content._similarity(html1, html2, k=0.0), 0.0)
-        self.assertAlmostEqual(duplicate_content._similarity(html1, html2, k=1.0), 1.0)
-        self.assertAlmostEqual(duplicate_content._similarity(html1, html2, k=0.25), 0.25)
+        self.assertAlmostEqual(similarity(html1, html2, k=0.25), 0.25)
 
     def test_multiple_classes_per_element_are_split(self):
         html = "<html><body><div class='foo bar baz'>x</div></body></html>"
-        self.assertEqual(duplicate_content._get_classes(html), {'foo', 'bar', 'baz'})
+        self.assertEqual(duplicate_content._fingerprint(html)['classes'], {'foo', 'bar', 'baz'})
 
     def test_no_classes_returns_empty_set(self):
         html = "<html><body><div>x</div></body></html>"
-        self.assertEqual(duplicate_content._get_classes(html), set())
+        self.assertEqual(duplicate_content._fingerprint(html)['classes'], set())
 
     def test_style_similarity_both_empty_is_one(self):
         # Jaccard of two empty sets is defined as 1.0 (both pages share "no classes")
         html1 = "<html><body><h1>x</h1></body></html>"
         html2 = "<html><body><p>y</p></body></html>"
-        self.assertEqual(duplicate_content._style_similarity(html1, html2), 1.0)
+        self.assertEqual(similarity(html1, html2, k=0.0), 1.0)
 
     def test_jaccard_similarity_disjoint(self):
         self.assertEqual(duplicate_content._jaccard_similarity({'a'}, {'b'}), 0.0)
@@ -70,7 +73,53 @@ class TestSimilarity(unittest.TestCase):
         # Comments should be counted as a 'comment' tag, not raise
         html1 = "<html><body><!-- a comment --><p>x</p></body></html>"
         html2 = "<html><body><!-- a comment --><p>x</p></body></html>"
-        self.assertEqual(duplicate_content._structural_similarity(html1, html2), 1.0)
+        self.assertEqual(duplicate_content._fingerprint(html1)['tags'],
+                         ['html', 'body', 'comment', 'p'])
+        self.assertEqual(similarity(html1, html2, k=1.0), 1.0)
+
+    def test_estimated_similarity_identical(self):
+        html = "<html><body>" + "<div class='x'><p>y</p></div>" * 100 + "</body></html>"
+        fingerprint = duplicate_content._fingerprint(html)
+        self.assertEqual(duplicate_content._estimated_similarity(fingerprint, fingerprint), 1.0)
+
+    def test_minhash_is_stable(self):
+        # same values in every process, regardless of PYTHONHASHSEED
+        self.assertEqual(duplicate_content._minhash(['html', 'head', 'body', 'div', 'p']),
+                         {7807209826656744710, 7357477267887027312})
+
+    def test_compare_pairwise_skips_exact_comparison_for_different_pages(self):
+        html1 = "<html><body>" + "<div class='a'><p>y</p></div>" * 100 + "</body></html>"
+        html2 = "<html><body>" + "<ul class='b'><li>y</li></ul>" * 100 + "</body></html>"
+        checker = duplicate_content.Checker(config=Config(urls=[]))
+        pairs = checker.compare_pairwise({'http://a/': html1, 'http://b/': html2})
+        self.assertEqual(list(pairs.keys()), ['http://a/ http://b/'])
+        self.assertLess(pairs['http://a/ http://b/']['similarity'], checker.candidate_threshold)
+        self.assertTrue(pairs['http://a/ http://b/']['estimated'])
+        self.assertIsNone(pairs['http://a/ http://b/']['exception'])
+
+    def test_compare_pairwise_exact_for_similar_pages(self):
+        html1 = "<html><body>" + "<div class='a'><p>y</p></div>" * 100 + "</body></html>"
+        html2 = "<html><body>" + "<div class='a'><p>y</p></div>" * 99 + "</body></html>"
+        checker = duplicate_content.Checker(config=Config(urls=[]))
+        pairs = checker.compare_pairwise({'http://a/': html1, 'http://b/': html2})
+        self.assertEqual(pairs['http://a/ http://b/']['similarity'], similarity(html1, html2))
+        self.assertFalse(pairs['http://a/ http://b/']['estimated'])
+
+    def test_compare_pairwise_missing_document(self):
+        html = "<html><body><p>x</p></body></html>"
+        checker = duplicate_content.Checker(config=Config(urls=[]))
+        pairs = checker.compare_pairwise({'http://a/': html, 'http://b/': None})
+        self.assertIsNone(pairs['http://a/ http://b/']['similarity'])
+        self.assertIsNotNone(pairs['http://a/ http://b/']['exception'])
+
+    def test_compare_pairwise_identical_hashes(self):
+        # identical pages are not even looked at
+        checker = duplicate_content.Checker(config=Config(urls=[]))
+        pairs = checker.compare_pairwise({'http://a/': None, 'http://b/': None},
+                                         {'http://a/': 'abc', 'http://b/': 'abc'})
+        self.assertEqual(pairs, {
+            'http://a/ http://b/': {'similarity': 1.0, 'estimated': False, 'exception': None},
+        })
 
 
 @httprettified
@@ -113,7 +162,8 @@ class TestDuplicateContent(unittest.TestCase):
         self.assertEqual(result, {
             'http://example.com/ http://www.example.com/': {
                 'exception': None,
-                'similarity': 1.0
+                'similarity': 1.0,
+                'estimated': False,
             }
         })
         self.assertEqual(urls_after, ['http://example.com/'])
@@ -4,17 +4,14 @@ Collects information on usage of the frameset tag
 
 import logging
 
-from bs4 import BeautifulSoup
-
 from checks.abstract_checker import AbstractChecker
 
 class Checker(AbstractChecker):
+    depends_on_checks = ['page_content']
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
 
-    def depends_on_results(self):
-        return ['page_content']
-
     def run(self):
         assert 'page_content' in self.previous_results
         
@@ -39,13 +36,9 @@ class Checker(AbstractChecker):
             'frameset': None,
         }
 
-        soup = BeautifulSoup(page_content['content'], 'html.parser')
-
-        count = 0
-        for _ in soup.find_all("frameset"):
-            count += 1
+        document = self.config.documents.get(url)
 
-        if count > 0:
+        if document is not None and document.find('.//frameset') is not None:
             result['frameset'] = True
         else:
             result['frameset'] = False
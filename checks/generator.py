@@ -1,20 +1,117 @@
 """
 Checks the 'generator' meta tag and page content properties
 to detect well-known content management systems, themes etc.
+
+Detection is driven by two tables:
+
+- META_GENERATORS maps the 'generator' meta tag to a CMS name
+- FINGERPRINTS lists markers (page content substrings, response
+  headers, hosting IP addresses) identifying CMS flavours
+
+All content markers are searched for in a single pass over the page.
+New flavours can be added to the tables without touching the code.
 """
 
+from dataclasses import dataclass
+import re
+
 from checks.abstract_checker import AbstractChecker
 
+
+# CMS names to use if they appear in the generator meta tag, in order of
+# precedence. Other generator values are used as they are (lowercased).
+META_GENERATORS = ('typo3', 'wordpress', 'drupal', 'joomla')
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """
+    Markers identifying a CMS flavour. The fingerprint matches if any
+    of its markers is found.
+
+    If ``refines`` is set, the fingerprint only applies to pages whose
+    meta tag generator is that CMS. Pages with a generator that has such
+    refinements are only checked against them, all other pages only
+    against the fingerprints without ``refines``.
+    """
+    generator: str
+    refines: str | None = None
+    # case sensitive substrings of the page content
+    content: tuple = ()
+    # (header name in lowercase, substring of the value) tuples
+    headers: tuple = ()
+    # IPv4 addresses of the site's hosting servers
+    ips: frozenset = frozenset()
+
+
+# Fingerprints in order of precedence. The first one matching wins.
+FINGERPRINTS = (
+    # typo3-gruene and verdigado GCMS
+    Fingerprint('typo3-gcms', refines='typo3',
+                content=('Developed by die-netzmacher.de and verdigado eG.',)),
+    # Typo3-Gruene advertises in the page content
+    Fingerprint('typo3-gruene', refines='typo3', content=('typo3-gruene.de',)),
+    # main verdigado eG GCMS server
+    Fingerprint('typo3-gcms', refines='typo3', ips=frozenset(['168.119.31.10'])),
+
+    Fingerprint('wordpress-blumomatic', content=('blum-o-matic',)),
+    Fingerprint('wordpress-gruenes-internet', content=('gruenes-internet.de',)),
+    Fingerprint('wordpress-urwahl', content=('Urwahl3000', '/themes/urwahl3000')),
+    Fingerprint('wordpress-sunflower', content=('/themes/sunflower',)),
+    Fingerprint('wordpress-gruenesinternet', content=('/themes/gruenesinternet',)),
+    Fingerprint('wordpress-josephknowsbest', content=('josephknowsbest', 'Joseph-knows-best')),
+    Fingerprint('wordpress', content=('wordpress',)),
+    Fingerprint('jimdo', content=('jimdo',)),
+)
+
+
+class ContentMatcher(object):
+    """
+    Finds which of a set of substrings occur in a text, in one pass,
+    using a single regular expression.
+    """
+
+    def __init__(self, markers):
+        # longest first, so the alternation prefers the longest marker
+        # starting at a position. Markers that are prefixes of it are
+        # found at the same position, too.
+        markers = sorted(set(markers), key=len, reverse=True)
+        self._regex = re.compile('|'.join(re.escape(marker) for marker in markers)) if markers else None
+        self._prefixes = {marker: [other for other in markers if marker.startswith(other)]
+                          for marker in markers}
+
+    def find(self, text):
+        """Returns the set of markers occurring in text"""
+        found = set()
+        if self._regex is None:
+            return found
+
+        pos = 0
+        while True:
+            match = self._regex.search(text, pos)
+            if match is None:
+                break
+            found.update(self._prefixes[match.group()])
+            # continue right after the start, to find overlapping markers
+            pos = match.start() + 1
+
+        return found
+
+
 class Checker(AbstractChecker):
 
-    # IP address of the main verdigado eG GCMS server
-    gcms_ip = "168.119.31.10"
+    depends_on_checks = ['page_content', 'html_head', 'dns_resolution']
+
+    meta_generators = META_GENERATORS
+    fingerprints = FINGERPRINTS
 
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
 
-    def depends_on_results(self):
-        return ['page_content', 'html_head', 'dns_resolution']
+        markers = [marker for fingerprint in self.fingerprints for marker in fingerprint.content]
+        self._matcher = ContentMatcher(markers)
+        self._refined = set(fingerprint.refines for fingerprint in self.fingerprints
+                            if fingerprint.refines is not None)
 
     def run(self):
         assert 'page_content' in self.previous_results
@@ -33,6 +130,9 @@ class Checker(AbstractChecker):
         page_content = self.previous_results['page_content'][url]
         assert 'content' in page_content
 
+        if page_content['content'] is None:
+            return None
+
         dns_resolution = self.previous_results['dns_resolution']
 
         head = self.previous_results['html_head'][url]
@@ -41,55 +141,25 @@ class Checker(AbstractChecker):
 
         if 'generator' in head and head['generator'] is not None:
             generator = head['generator'].lower()
-            if 'typo3' in generator:
-                generator = 'typo3'
-            if 'wordpress' in generator:
-                generator = 'wordpress'
-            if 'drupal' in generator:
-                generator = 'drupal'
-            if 'joomla' in generator:
-                generator = 'joomla'
-            if 'drupal' in generator:
-                generator = 'drupal'
+            for name in self.meta_generators:
+                if name in generator:
+                    generator = name
+                    break
 
         # Qualify certain CMS flavours in more detail
-        if generator == "typo3":
-            # typo3-gruene and verdigado GCMS
-            if 'Developed by die-netzmacher.de and verdigado eG.' in page_content['content']:
-                generator = "typo3-gcms"
-            # Typo3-Gruene advertises in the page content
-            elif 'typo3-gruene.de' in page_content['content']:
-                generator = "typo3-gruene"
-            # check if one of the IPs matches the well-known GCMS Server IP
-            elif url in dns_resolution:
-                for addr in dns_resolution[url]['ipv4_addresses']:
-                    if addr == self.gcms_ip:
-                        generator = 'typo3-gcms'
-
-        elif 'blum-o-matic' in page_content['content']:
-            generator = 'wordpress-blumomatic'
-
-        elif 'gruenes-internet.de' in page_content['content']:
-            generator = 'wordpress-gruenes-internet'
-
-        elif ('Urwahl3000' in page_content['content'] or
-            '/themes/urwahl3000' in page_content['content']):
-            generator = 'wordpress-urwahl'
-        
-        elif ('/themes/sunflower' in page_content['content']):
-            generator = 'wordpress-sunflower'
-
-        elif ('/themes/gruenesinternet' in page_content['content']):
-            generator = 'wordpress-gruenesinternet'
-
-        elif ('josephknowsbest' in page_content['content'] or
-            'Joseph-knows-best' in page_content['content']):
-            generator = 'wordpress-josephknowsbest'
-
-        elif 'wordpress' in page_content['content']:
-            generator = 'wordpress'
-
-        elif 'jimdo' in page_content['content']:
-            generator = 'jimdo'
+        refines = generator if generator in self._refined else None
+        found = self._matcher.find(page_content['content'])
+        headers = page_content.get('response_headers') or {}
+        ips = set()
+        if url in dns_resolution:
+            ips = set(dns_resolution[url]['ipv4_addresses'])
+
+        for fingerprint in self.fingerprints:
+            if fingerprint.refines != refines:
+                continue
+            if (found.intersection(fingerprint.content) or
+                fingerprint.ips & ips or
+                any(value in headers.get(name, '') for name, value in fingerprint.headers)):
+                return fingerprint.generator
 
         return generator
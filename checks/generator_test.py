@@ -0,0 +1,82 @@
+import unittest
+
+from checks import generator
+from checks.config import Config
+
+
+class TestGenerator(unittest.TestCase):
+
+    url = 'https://www.example.com/'
+
+    def get_generator(self, content, meta_generator=None, ips=(), headers=None, checker_class=generator.Checker):
+        results = {
+            'page_content': {
+                self.url: {
+                    'content': content,
+                    'response_headers': headers or {},
+                },
+            },
+            'html_head': {
+                self.url: {
+                    'generator': meta_generator,
+                },
+            },
+            'dns_resolution': {
+                self.url: {
+                    'ipv4_addresses': list(ips),
+                },
+            },
+        }
+        config = Config(urls=[self.url])
+        return checker_class(config=config, previous_results=results).run()[self.url]
+
+    def test_meta_generator(self):
+        self.assertEqual(self.get_generator('<html></html>', 'Drupal 10'), 'drupal')
+        self.assertEqual(self.get_generator('<html></html>', 'TYPO3 CMS, WordPress'), 'typo3')
+        self.assertEqual(self.get_generator('<html></html>', 'Hugo 0.120'), 'hugo 0.120')
+        self.assertIsNone(self.get_generator('<html></html>'))
+
+    def test_typo3_flavours(self):
+        self.assertEqual(self.get_generator('<a href="https://typo3-gruene.de/">x</a>', 'TYPO3 CMS'),
+                         'typo3-gruene')
+        self.assertEqual(self.get_generator('typo3-gruene.de Developed by die-netzmacher.de and verdigado eG.',
+                                            'TYPO3 CMS'), 'typo3-gcms')
+        self.assertEqual(self.get_generator('<html></html>', 'TYPO3 CMS', ips=['168.119.31.10']), 'typo3-gcms')
+        self.assertEqual(self.get_generator('<html></html>', 'TYPO3 CMS', ips=['10.0.0.1']), 'typo3')
+
+        # typo3 pages aren't checked for other flavours
+        self.assertEqual(self.get_generator('/themes/sunflower', 'TYPO3 CMS'), 'typo3')
+
+    def test_content_markers(self):
+        self.assertEqual(self.get_generator('wp-content/themes/sunflower/style.css wordpress', 'WordPress 6.5'),
+                         'wordpress-sunflower')
+        self.assertEqual(self.get_generator('wordpress and Joseph-knows-best'), 'wordpress-josephknowsbest')
+        self.assertEqual(self.get_generator('made with jimdo', 'Drupal 10'), 'jimdo')
+        # the blum-o-matic marker comes first, even when found last
+        self.assertEqual(self.get_generator('/themes/urwahl3000 ... blum-o-matic'), 'wordpress-blumomatic')
+
+    def test_headers(self):
+        class Checker(generator.Checker):
+            fingerprints = generator.FINGERPRINTS + (
+                generator.Fingerprint('drupal', headers=(('x-generator', 'Drupal'),)),
+            )
+
+        self.assertEqual(self.get_generator('<html></html>', headers={'x-generator': 'Drupal 10'},
+                                            checker_class=Checker), 'drupal')
+        self.assertEqual(self.get_generator('<html>wordpress</html>', headers={'x-generator': 'Drupal 10'},
+                                            checker_class=Checker), 'wordpress')
+
+
+class TestContentMatcher(unittest.TestCase):
+
+    def test_overlapping_markers(self):
+        matcher = generator.ContentMatcher(['gruenes-internet.de', 'internet', 'net.de', 'inter', 'absent'])
+        self.assertEqual(matcher.find('www.gruenes-internet.de'),
+                         {'gruenes-internet.de', 'internet', 'net.de', 'inter'})
+
+    def test_no_markers(self):
+        self.assertEqual(generator.ContentMatcher([]).find('text'), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,18 +1,141 @@
 """
 Extracts information from the html <head>, like existence and value
 of certain meta tags, link tags, title, etc.
+
+The head is read with a streaming parser (HeadParser), which stops at
+the end of the head, so the rest of the page is never parsed here.
+Checks depending on this one (like load_feeds and generator) therefore
+don't have to wait for the full parse of the page.
 """
 
-import logging
-import re
+from html.parser import HTMLParser
 from urllib.parse import urljoin
 from urllib.parse import urlparse
 
-from bs4 import BeautifulSoup
-
 from checks.abstract_checker import AbstractChecker
 
+
+class HeadParser(HTMLParser):
+    """
+    Collects the tags of interest from the head of an HTML page, in one
+    pass. Parsing is done once the head ends, explicitly or implicitly
+    by the start of the body or any element that can't be in the head.
+
+    The content of noscript and template elements is skipped, so e.g.
+    a tracking pixel image inside noscript doesn't end the head.
+    """
+
+    # Elements that can be in the head. Others start the body.
+    HEAD_TAGS = {'html', 'head', 'title', 'meta', 'link', 'style', 'script',
+                 'noscript', 'base', 'template'}
+
+    # Elements in the head whose content is ignored
+    CONTAINER_TAGS = {'noscript', 'template'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.done = False
+
+        # whether a head (explicit or implied) has been found
+        self.has_head = False
+
+        self.title = None
+        self.link_canonical = None
+        self.rss_links = []
+        self.atom_links = []
+        self.link_icon = None
+        self.generator = None
+        self.opengraph = set()
+        self.viewport = None
+
+        self._in_title = False
+        self._title_parts = []
+
+        # nesting depth of CONTAINER_TAGS elements
+        self._container_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self._in_title:
+            # The title's content is text, even if it looks like markup
+            self._title_parts.append(self.get_starttag_text())
+            return
+        if tag in self.CONTAINER_TAGS:
+            self._container_depth += 1
+            self.has_head = True
+            return
+        if self._container_depth > 0:
+            return
+        if tag not in self.HEAD_TAGS:
+            self.done = True
+            return
+        if tag != 'html':
+            self.has_head = True
+
+        attrs = dict(attrs)
+
+        if tag == 'title' and self.title is None:
+            self._in_title = True
+        elif tag == 'link':
+            self.handle_link(attrs)
+
+        if attrs.get('name') == 'generator' and self.generator is None:
+            self.generator = attrs.get('content')
+        if attrs.get('name') == 'viewport' and self.viewport is None:
+            self.viewport = attrs.get('content')
+        for key in ('property', 'itemprop'):
+            if (attrs.get(key) or '').startswith('og:'):
+                self.opengraph.add(attrs[key])
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in self.CONTAINER_TAGS and not self._in_title:
+            # an empty container, like <noscript/>
+            return
+        self.handle_starttag(tag, attrs)
+
+    def handle_link(self, attrs):
+        href = attrs.get('href')
+        if href is None:
+            return
+
+        rel = attrs.get('rel') or ''
+        if 'canonical' in rel.split() and self.link_canonical is None:
+            self.link_canonical = href
+        # matches rel="icon" as well as rel="shortcut icon", case-insensitive
+        if 'icon' in rel.lower().split() and self.link_icon is None:
+            self.link_icon = href
+
+        if attrs.get('type') == 'application/rss+xml':
+            self.rss_links.append(href)
+        elif attrs.get('type') == 'application/atom+xml':
+            self.atom_links.append(href)
+
+    def handle_endtag(self, tag):
+        if self._in_title and tag != 'title':
+            self._title_parts.append('</%s>' % tag)
+        elif tag in self.CONTAINER_TAGS:
+            if self._container_depth > 0:
+                self._container_depth -= 1
+        elif self._container_depth > 0:
+            return
+        elif tag == 'title' and self._in_title:
+            self._in_title = False
+            self.title = ''.join(self._title_parts)
+        elif tag == 'head':
+            self.done = True
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+
+
 class Checker(AbstractChecker):
+    depends_on_checks = ['page_content']
+
+    # Number of characters fed to the parser at a time
+    chunk_size = 8192
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
     
@@ -37,34 +160,41 @@ class Checker(AbstractChecker):
         if page_content['content'] is None:
             return
 
-        soup = BeautifulSoup(page_content['content'], 'html.parser')
-        head = soup.find('head')
+        parser = self.parse_head(page_content['content'])
+        if not parser.has_head:
+            parser = None
 
         result = {
-            'title': self.get_title(head),
-            'link_canonical': self.get_link_canonical(head, url),
-            'link_rss_atom': self.get_link_rss_atom(head, url),
-            'link_icon': self.get_link_icon(head, url),
-            'generator': self.get_generator(head),
-            'opengraph': self.get_opengraph(head),
-            'viewport': self.get_viewport(head),
+            'title': self.get_title(parser),
+            'link_canonical': self.get_link_canonical(parser, url),
+            'link_rss_atom': self.get_link_rss_atom(parser, url),
+            'link_icon': self.get_link_icon(parser, url),
+            'generator': self.get_generator(parser),
+            'opengraph': self.get_opengraph(parser),
+            'viewport': self.get_viewport(parser),
         }
 
         return result
 
 
+    def parse_head(self, content):
+        """Returns a HeadParser having read the head of content"""
+        parser = HeadParser()
+        for start in range(0, len(content), self.chunk_size):
+            parser.feed(content[start:start + self.chunk_size])
+            if parser.done:
+                break
+        else:
+            parser.close()
+        return parser
+
+
     def get_title(self, head):
         """Extract and clean up page title"""
-        if head is None:
+        if head is None or head.title is None:
             return
         
-        title = None
-
-        tag = head.find('title')
-        if tag is None:
-            return
-        
-        title = tag.get_text()
+        title = head.title
         
         # clean up
         title = title.replace(u'\u00a0', ' ')
@@ -77,24 +207,14 @@ class Checker(AbstractChecker):
     def get_link_canonical(self, head, url):
         if head is None:
             return
-        link = head.find('link', rel='canonical')
-        if link:
-            return urljoin(url, link.get('href'))
+        if head.link_canonical is not None:
+            return urljoin(url, head.link_canonical)
     
 
     def get_link_rss_atom(self, head, url):
         if head is None:
             return
-        hrefs = []
-        rss_links = head.find_all('link', type='application/rss+xml')
-        atom_links = head.find_all('link', type='application/atom+xml')
-
-        if rss_links:
-            for link in rss_links:
-                hrefs.append(link.get('href'))
-        if atom_links:
-            for link in rss_links:
-                hrefs.append(link.get('href'))
+        hrefs = head.rss_links + head.atom_links
         
         # make URLs absolute
         for i in range(len(hrefs)):
@@ -108,38 +228,21 @@ class Checker(AbstractChecker):
     def get_link_icon(self, head, url):
         if head is None:
             return
-
-        tag = head.find('link', rel=lambda x: x and x.lower() == 'icon')
-        if tag:
-            return urljoin(url, tag.get('href'))
-        tag = head.find('link', rel=lambda x: x and x.lower() == 'shortcut icon')
-        if tag:
-            return urljoin(url, tag.get('href'))
+        if head.link_icon is not None:
+            return urljoin(url, head.link_icon)
 
 
     def get_generator(self, head):
         if head is None:
             return
-
-        tags = head.select('[name=generator]')
-        if tags:
-            return tags[0].get('content')
+        return head.generator
 
 
     def get_opengraph(self, head):
         if head is None:
             return
 
-        # we find tags by matching this property/itemprop value regex
-        property_re = re.compile('^og:')
-
-        opengraph = set()
-        for tag in head.find_all(property=property_re):
-            opengraph.add(tag.get('property'))
-        for tag in head.find_all(itemprop=property_re):
-            opengraph.add(tag.get('itemprop'))
-        
-        opengraph = sorted(list(opengraph))
+        opengraph = sorted(list(head.opengraph))
         if opengraph != []:
             return opengraph
     
@@ -147,6 +250,4 @@ class Checker(AbstractChecker):
     def get_viewport(self, head):
         if head is None:
             return
-        tags = head.select('[name=viewport]')
-        if tags:
-            return tags[0].get('content')
+        return head.viewport
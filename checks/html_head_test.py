@@ -0,0 +1,130 @@
+import unittest
+
+from checks import html_head
+from checks.config import Config
+
+
+class TestHTMLHead(unittest.TestCase):
+
+    url = 'https://www.example.com/page/'
+
+    def get_content(self, content):
+        results = {
+            'page_content': {
+                self.url: {
+                    'content': content,
+                    'response_headers': {'content-type': 'text/html'},
+                },
+            },
+        }
+        config = Config(urls=[self.url])
+        return html_head.Checker(config=config, previous_results=results).run()[self.url]
+
+    def test_head(self):
+        result = self.get_content("""<!DOCTYPE html>
+            <html>
+            <head>
+                <meta charset="utf-8">
+                <title>  Grüne&nbsp;Ortsgruppe &amp; Freunde </title>
+                <meta name="generator" content="WordPress 6.5">
+                <meta name="viewport" content="width=device-width, initial-scale=1">
+                <meta property="og:title" content="Grüne">
+                <meta property="og:image" content="/image.png">
+                <meta itemprop="og:title" content="Grüne">
+                <link rel="canonical" href="/">
+                <link rel="Shortcut Icon" href="/favicon.ico">
+                <link rel="alternate" type="application/rss+xml" href="/feed/">
+                <link rel="alternate" type="application/atom+xml" href="https://feeds.example.com/atom.xml">
+                <script>document.write("<link rel='icon' href='/wrong.ico'>");</script>
+            </head>
+            <body>
+                <link rel="alternate" type="application/rss+xml" href="/body-feed/">
+            </body>
+            </html>
+        """)
+
+        self.assertEqual(result, {
+            'title': 'Grüne Ortsgruppe & Freunde',
+            'link_canonical': 'https://www.example.com/',
+            'link_rss_atom': ['https://www.example.com/feed/', 'https://feeds.example.com/atom.xml'],
+            'link_icon': 'https://www.example.com/favicon.ico',
+            'generator': 'WordPress 6.5',
+            'opengraph': ['og:image', 'og:title'],
+            'viewport': 'width=device-width, initial-scale=1',
+        })
+
+    def test_markup_in_title(self):
+        result = self.get_content("""<html>
+            <head>
+                <title>Foo <b>bar</b><br/></title>
+                <meta name="generator" content="WordPress 6.5">
+                <meta name="viewport" content="width=device-width">
+            </head>
+            <body></body>
+            </html>
+        """)
+
+        self.assertEqual(result['title'], 'Foo <b>bar</b><br/>')
+        self.assertEqual(result['generator'], 'WordPress 6.5')
+        self.assertEqual(result['viewport'], 'width=device-width')
+
+    def test_noscript_in_head(self):
+        result = self.get_content("""<html>
+            <head>
+                <title>Hello</title>
+                <noscript><img height="1" width="1" style="display:none"
+                    src="https://www.facebook.com/tr?id=1&ev=PageView&noscript=1"></noscript>
+                <template><div><link rel="icon" href="/template.ico"></div></template>
+                <link rel="canonical" href="/">
+                <link rel="alternate" type="application/rss+xml" href="/feed/">
+                <meta name="generator" content="WordPress 6.5">
+                <meta property="og:title" content="Hello">
+                <meta name="viewport" content="width=device-width">
+            </head>
+            <body><div><link rel="icon" href="/body.ico"></div></body>
+            </html>
+        """)
+
+        self.assertEqual(result, {
+            'title': 'Hello',
+            'link_canonical': 'https://www.example.com/',
+            'link_rss_atom': ['https://www.example.com/feed/'],
+            'link_icon': None,
+            'generator': 'WordPress 6.5',
+            'opengraph': ['og:title'],
+            'viewport': 'width=device-width',
+        })
+
+    def test_implicit_end_of_head(self):
+        result = self.get_content('<title>Hello</title><div><link rel="icon" href="/a.ico"></div>')
+        self.assertEqual(result['title'], 'Hello')
+        self.assertIsNone(result['link_icon'])
+        self.assertEqual(result['link_rss_atom'], [])
+
+    def test_no_head(self):
+        result = self.get_content('<html><body><p>Hello</p></body></html>')
+        self.assertEqual(set(result.values()), {None})
+
+    def test_no_content(self):
+        results = {
+            'page_content': {
+                self.url: {
+                    'content': None,
+                    'response_headers': {'content-type': 'application/pdf'},
+                },
+            },
+        }
+        config = Config(urls=[self.url])
+        self.assertIsNone(html_head.Checker(config=config, previous_results=results).run()[self.url])
+
+    def test_stops_at_end_of_head(self):
+        parser = html_head.Checker(Config(urls=[])).parse_head(
+            '<head><title>a</title></head><body>' + '<p>x</p>' * 10000)
+        self.assertTrue(parser.done)
+        self.assertEqual(parser.title, 'a')
+        # nothing beyond the first chunk was fed
+        self.assertLess(len(parser.rawdata), html_head.Checker.chunk_size)
+
+
+if __name__ == '__main__':
+    unittest.main()
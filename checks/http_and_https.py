@@ -9,6 +9,8 @@ URLs to test by other checks.
 from checks.abstract_checker import AbstractChecker
 
 class Checker(AbstractChecker):
+    modifies_urls = True
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
     
@@ -0,0 +1,226 @@
+"""
+A cache of HTTP responses kept across crawl runs, used by page_content
+for conditional requests.
+
+Responses with an ETag or Last-Modified header are stored along with
+their body. On the next run, the request is sent with If-None-Match or
+If-Modified-Since, and if the server answers 304 Not Modified, the
+body is taken from the cache instead of being downloaded again.
+
+Use from_path() to create a cache:
+
+- None or '' gives a cache that doesn't store anything
+- '/some/path' gives a cache in a local folder, limited in size
+"""
+
+import base64
+import json
+import logging
+import os
+import threading
+import time
+
+from checks import cache_files
+
+
+# Default size limit of a DiskCache (bytes)
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+def from_path(path, max_bytes=DEFAULT_MAX_BYTES):
+    """Creates a cache from a path, as described in the module docstring"""
+    if not path:
+        return HTTPCache()
+    return DiskCache(path, max_bytes=max_bytes)
+
+
+def make_entry(response, content, encoding):
+    """
+    Returns the cache entry for a requests.Response with the given body
+    (bytes) and encoding, or None if the response can't be revalidated
+    and isn't worth caching.
+    """
+    if response.status_code != 200:
+        return None
+
+    headers = {key.lower(): value for key, value in response.headers.items()}
+    if 'etag' not in headers and 'last-modified' not in headers:
+        return None
+    if 'no-store' in headers.get('cache-control', '').lower():
+        return None
+
+    return {
+        'url': response.url,
+        'status_code': response.status_code,
+        'headers': headers,
+        # the encoding from the response headers, None if unknown
+        'encoding': encoding,
+        'content': base64.b64encode(content).decode('ascii'),
+    }
+
+
+def conditional_headers(entry):
+    """Returns the request headers to revalidate entry, which may be None"""
+    if entry is None:
+        return {}
+
+    headers = {}
+    if 'etag' in entry['headers']:
+        headers['If-None-Match'] = entry['headers']['etag']
+    if 'last-modified' in entry['headers']:
+        headers['If-Modified-Since'] = entry['headers']['last-modified']
+    return headers
+
+
+def entry_content(entry):
+    """Returns the body of a cache entry as bytes"""
+    return base64.b64decode(entry['content'])
+
+
+class HTTPCache(object):
+    """
+    Base class for HTTP caches. Doesn't store anything by itself.
+    """
+
+    def get(self, url):
+        """Returns the entry for url, or None if there is none"""
+        return None
+
+    def put(self, url, entry):
+        """Stores entry (as returned by make_entry) for url"""
+        pass
+
+
+class DiskCache(HTTPCache):
+    """
+    Stores each entry as a JSON file in a local folder. When the files
+    take up more than max_bytes, the least recently used ones are
+    removed. Several processes may share the folder.
+
+    The size of the cache, as determined by the last scan of the folder,
+    is kept in a marker file, so that processes don't have to scan the
+    folder again. As each process only adds its own entries to that
+    size, the folder is scanned again once the size is older than
+    SCAN_INTERVAL, and the cache may exceed max_bytes until then.
+    """
+
+    # Eviction removes entries until the cache is this much of max_bytes,
+    # so that it doesn't happen again right with the next entry.
+    EVICTION_TARGET = 0.9
+
+    # Seconds after which the size of the cache is determined again
+    SCAN_INTERVAL = 10 * 60
+
+    # Marker file holding the size of the cache found by the last scan
+    SIZE_MARKER = '.size'
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self._path = path
+        self._max_bytes = max_bytes
+        os.makedirs(path, exist_ok=True)
+
+        # Size of the cache as known to this process, determined
+        # when the first entry is stored, and the time of the scan
+        # it is based on
+        self._size = None
+        self._size_time = None
+        self._lock = threading.Lock()
+
+    def _filename(self, url):
+        return cache_files.entry_filename(self._path, url)
+
+    def get(self, url):
+        filename = self._filename(url)
+        try:
+            with open(filename, 'r', encoding='utf-8') as cache_file:
+                entry = json.load(cache_file)
+            # mark as recently used
+            os.utime(filename)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning("Could not read HTTP cache entry %s: %s" % (filename, e))
+            return None
+
+        return entry
+
+    def put(self, url, entry):
+        if entry is None:
+            return
+
+        try:
+            size = cache_files.write_json(self._filename(url), entry)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning("Could not write HTTP cache entry for %s: %s" % (url, e))
+            return
+
+        with self._lock:
+            now = time.time()
+            if self._size is None or now >= self._size_time + self.SCAN_INTERVAL:
+                if not self._load_size(now):
+                    self._size += size
+            else:
+                self._size += size
+
+            if self._size > self._max_bytes:
+                self._evict()
+
+    def _load_size(self, now):
+        """
+        Takes the size of the cache from the marker file, or scans the
+        folder if the size there is outdated. Returns True if scanned.
+        Call with the lock held.
+        """
+        mtime, state = cache_files.read_marker(os.path.join(self._path, self.SIZE_MARKER))
+        if mtime is not None and now < mtime + self.SCAN_INTERVAL and isinstance(state, dict):
+            self._size = state.get('size', 0)
+            self._size_time = mtime
+            return False
+
+        self._size = self._scan()[0]
+        self._save_size(now)
+        return True
+
+    def _save_size(self, now):
+        """Records the size of the cache in the marker file"""
+        self._size_time = now
+        try:
+            cache_files.write_json(os.path.join(self._path, self.SIZE_MARKER), {'size': self._size}, mtime=now)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning("Could not write HTTP cache marker: %s" % e)
+
+    def _scan(self):
+        """Returns the total size and a list of (mtime, size, path) of all entries"""
+        total = 0
+        files = []
+        with os.scandir(self._path) as entries:
+            for dir_entry in entries:
+                if not dir_entry.name.endswith('.json'):
+                    continue
+                try:
+                    stat = dir_entry.stat()
+                except OSError:
+                    continue
+                total += stat.st_size
+                files.append((stat.st_mtime, stat.st_size, dir_entry.path))
+        return total, files
+
+    def _evict(self):
+        """Removes the least recently used entries. Call with the lock held."""
+        total, files = self._scan()
+        target = self._max_bytes * self.EVICTION_TARGET
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.warning("Could not remove HTTP cache entry %s: %s" % (path, e))
+                continue
+            total -= size
+
+        logging.debug("Evicted HTTP cache entries, %s bytes left" % total)
+        self._size = total
+        self._save_size(time.time())
@@ -0,0 +1,107 @@
+import os
+import tempfile
+import unittest
+
+import httpretty
+from httpretty import httprettified
+import requests
+
+from checks import http_cache
+
+
+@httprettified
+class TestEntries(unittest.TestCase):
+
+    def test_make_entry(self):
+        url = 'http://example.com/'
+        httpretty.register_uri(httpretty.GET, url, body='<p>Grüße</p>'.encode('latin-1'),
+                               adding_headers={'ETag': '"abc"',
+                                               'Content-Type': 'text/html; charset=iso-8859-1'})
+
+        response = requests.get(url)
+        entry = http_cache.make_entry(response, response.content, response.encoding)
+        self.assertEqual(entry['headers']['etag'], '"abc"')
+        self.assertEqual(entry['encoding'], 'iso-8859-1')
+        self.assertEqual(http_cache.entry_content(entry), '<p>Grüße</p>'.encode('latin-1'))
+        self.assertEqual(http_cache.conditional_headers(entry), {'If-None-Match': '"abc"'})
+
+    def test_not_cacheable(self):
+        url = 'http://example.com/'
+        httpretty.register_uri(httpretty.GET, url, body='<p>Hello</p>')
+        self.assertIsNone(http_cache.make_entry(requests.get(url), b'<p>Hello</p>', None))
+
+        httpretty.register_uri(httpretty.GET, url, body='<p>Hello</p>',
+                               adding_headers={'ETag': '"abc"', 'Cache-Control': 'no-store'})
+        self.assertIsNone(http_cache.make_entry(requests.get(url), b'<p>Hello</p>', None))
+
+    def test_no_entry(self):
+        self.assertEqual(http_cache.conditional_headers(None), {})
+
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def entry(self, size):
+        return {
+            'url': 'http://example.com/',
+            'status_code': 200,
+            'headers': {'last-modified': 'Mon, 01 Jan 2024 00:00:00 GMT'},
+            'encoding': 'utf-8',
+            'content': 'x' * size,
+        }
+
+    def test_get_put(self):
+        cache = http_cache.DiskCache(self.tmpdir.name)
+        self.assertIsNone(cache.get('http://example.com/'))
+
+        cache.put('http://example.com/', self.entry(10))
+        cache.put('http://example.com/other', None)
+
+        self.assertEqual(cache.get('http://example.com/'), self.entry(10))
+        self.assertIsNone(cache.get('http://example.com/other'))
+
+    def test_eviction(self):
+        cache = http_cache.DiskCache(self.tmpdir.name, max_bytes=4000)
+        for i in range(3):
+            cache.put('http://example.com/%s' % i, self.entry(1000))
+            # make sure entries have distinct modification times
+            os.utime(cache._filename('http://example.com/%s' % i), (i, i))
+
+        # using the first entry makes the second the least recently used
+        self.assertIsNotNone(cache.get('http://example.com/0'))
+        cache.put('http://example.com/3', self.entry(1000))
+
+        self.assertIsNone(cache.get('http://example.com/1'))
+        for i in (0, 2, 3):
+            self.assertIsNotNone(cache.get('http://example.com/%s' % i))
+
+    def test_size_shared_between_processes(self):
+        cache = http_cache.DiskCache(self.tmpdir.name, max_bytes=4000)
+        cache.put('http://example.com/0', self.entry(1000))
+
+        # another process takes the size from the marker file
+        other = http_cache.DiskCache(self.tmpdir.name, max_bytes=4000)
+        other._scan = lambda: self.fail("scanned again")
+        other.put('http://example.com/1', self.entry(1000))
+        self.assertEqual(other._size, 2 * os.path.getsize(other._filename('http://example.com/1')))
+
+        # and scans once the size is outdated
+        marker = os.path.join(self.tmpdir.name, http_cache.DiskCache.SIZE_MARKER)
+        os.utime(marker, (0, 0))
+        other = http_cache.DiskCache(self.tmpdir.name, max_bytes=4000)
+        other.put('http://example.com/2', self.entry(1000))
+        self.assertEqual(other._size, 3 * os.path.getsize(other._filename('http://example.com/2')))
+        self.assertGreater(os.path.getmtime(marker), 0)
+
+    def test_from_path(self):
+        self.assertIsNone(http_cache.from_path(None).get('http://example.com/'))
+        self.assertIsInstance(http_cache.from_path(self.tmpdir.name), http_cache.DiskCache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,45 @@
 """
 Collects information on hyperlinks on the page.
+
+Links are not kept one by one. Instead, their deduplicated absolute
+hrefs are classified while the page is read:
+
+- internal: links to the page's own hostname
+- external: links to other hostnames
+- social: links to social media profiles (not listed as external)
+- contact: links labelled "Kontakt"
+
+Fragments are removed from hrefs, and malformed hrefs are skipped.
+Only http and https links are classified as internal, external or
+social. Contact links may have any scheme, e.g. mailto.
 """
 
 import logging
-
-from bs4 import BeautifulSoup
+import sys
+from urllib.parse import urldefrag
+from urllib.parse import urljoin
+from urllib.parse import urlparse
 
 from checks.abstract_checker import AbstractChecker
 
+
+# Hostname parts identifying social media sites
+SOCIAL_MEDIA_HOSTS = ('facebook.com', 'twitter.com', 'instagram.com', 'gruene.social')
+
+# Link texts identifying a contact page (lowercase)
+CONTACT_LINK_TEXTS = ('kontakt',)
+
+
 class Checker(AbstractChecker):
+    depends_on_checks = ['page_content']
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
 
-    def depends_on_results(self):
-        return ['page_content']
+        # class of each hostname seen ('social' or 'external'), shared
+        # by all pages. Hostnames are interned, as the same ones turn up
+        # again and again.
+        self._host_classes = {}
 
     def run(self):
         assert 'page_content' in self.previous_results
@@ -36,16 +62,71 @@ class Checker(AbstractChecker):
             return
 
         result = {
-            'links': [],
+            'num_links': 0,
+            'internal': [],
+            'external': [],
+            'social': [],
+            'contact': [],
             'exception': None,
         }
 
-        soup = BeautifulSoup(page_content['content'], 'html.parser')
+        document = self.config.documents.get(url)
+        if document is None:
+            return result
+
+        page_hostname = urlparse(url).hostname
+
+        # dicts as ordered sets
+        links = {
+            'internal': {},
+            'external': {},
+            'social': {},
+            'contact': {},
+        }
+
+        for link in document.iter('a'):
+            result['num_links'] += 1
+            href = link.get('href')
+            try:
+                self.classify_link(url, page_hostname, link, href, links)
+            except ValueError as e:
+                # malformed href, like an invalid IPv6 address
+                logging.debug("Skipping link %r on %s: %s" % (href, url, e))
 
-        for link in soup.find_all("a"):
-            result['links'].append({
-                'href': link.get('href'),
-                'text': link.text.strip(),
-            })
+        for key in links:
+            result[key] = list(links[key])
 
         return result
+
+    def classify_link(self, url, page_hostname, link, href, links):
+        """
+        Adds the absolute href of link, without fragment, to the
+        matching classes in links
+        """
+        absolute = urldefrag(urljoin(url, href.strip()) if href is not None else url).url
+
+        if link.text_content().strip().lower() in CONTACT_LINK_TEXTS:
+            links['contact'][absolute] = True
+
+        if href is None:
+            return
+        parsed = urlparse(absolute)
+        if parsed.scheme not in ('http', 'https') or parsed.hostname is None:
+            return
+
+        if parsed.hostname == page_hostname:
+            links['internal'][absolute] = True
+        else:
+            links[self.classify_host(parsed.hostname)][absolute] = True
+
+    def classify_host(self, hostname):
+        """Returns 'social' or 'external' for a hostname other than the page's"""
+        hostname = sys.intern(hostname)
+        host_class = self._host_classes.get(hostname)
+        if host_class is None:
+            if any(part in hostname for part in SOCIAL_MEDIA_HOSTS):
+                host_class = 'social'
+            else:
+                host_class = 'external'
+            self._host_classes[hostname] = host_class
+        return host_class
@@ -42,19 +42,54 @@ class TestHyperlinks(unittest.TestCase):
 
         self.assertEqual(result, {
             'http://example.com/': {
-                'links': [
-                    {'href': '/', 'text': 'Home'},
-                    {'href': '/sub/', 'text': 'Sub page'},
-                    {'href': '/', 'text': 'Spaces'},
-                    {'href': 'https://www.google.com/', 'text': 'External'},
-                    {'href': '/', 'text': 'Hidden'},
-                    {'href': '/', 'text': 'Hidden'},
-                ],
+                'num_links': 6,
+                'internal': ['http://example.com/', 'http://example.com/sub/'],
+                'external': ['https://www.google.com/'],
+                'social': [],
+                'contact': [],
                 'exception': None,
             }
         })
         self.assertEqual(urls_after, ['http://example.com/'])
 
 
+    def test_classification(self):
+        page_body = """
+            <html>
+                <body>
+                    <a href="/kontakt/"> Kontakt </a>
+                    <a href="mailto:info@example.com"><b>KONTAKT</b></a>
+                    <a href="https://www.facebook.com/gruene">Facebook</a>
+                    <a href="//www.instagram.com/gruene">Instagram</a>
+                    <a href="https://www.facebook.com/gruene">Facebook again</a>
+                    <a href="https://gruene.de/">Bundesverband</a>
+                    <a href="javascript:void(0)">Menu</a>
+                    <a href="#top">Top</a>
+                    <a href="/#top">Top again</a>
+                    <a href="/kontakt/#form">Contact form</a>
+                    <a href="http://[broken/">Broken</a>
+                    <a>No href</a>
+                </body>
+            </html>
+        """
+
+        url = 'https://example.com/'
+        httpretty.register_uri(httpretty.GET, url, body=page_body)
+
+        results = {}
+        config = Config(urls=[url])
+        results['page_content'] = page_content.Checker(config=config, previous_results={}).run()
+        result = hyperlinks.Checker(config=config, previous_results=results).run()
+
+        self.assertEqual(result[url], {
+            'num_links': 12,
+            'internal': ['https://example.com/kontakt/', 'https://example.com/'],
+            'external': ['https://gruene.de/'],
+            'social': ['https://www.facebook.com/gruene', 'https://www.instagram.com/gruene'],
+            'contact': ['https://example.com/kontakt/', 'mailto:info@example.com'],
+            'exception': None,
+        })
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -7,29 +7,47 @@ from time import mktime
 from datetime import datetime
 from urllib.parse import urlparse
 
-import requests
-
 from checks.abstract_checker import AbstractChecker
 
 class Checker(AbstractChecker):
+
+    # maximum duration of the check (seconds)
+    max_duration = 60
+
+    # connection timeout (seconds)
+    CONNECT_TIMEOUT = 10
+
+    # response timeout (seconds)
+    READ_TIMEOUT = 20
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
         self.favicons = {}
 
     def run(self):
-        for url in self.config.urls:
-            self.load_favicon(url)
+        urls = self.config.urls
+
+        for url, favicon in zip(urls, self.map_urls(self.load_favicon, urls)):
+            if favicon is not None:
+                self.favicons[url] = favicon
 
         return self.favicons
     
     def load_favicon(self, url):
         """
-        This loads /favicon.ico for the site's URL
+        This loads /favicon.ico for the site's URL.
+        Returns None if there is none.
         """
         parsed = urlparse(url)
         ico_url = parsed.scheme + "://" + parsed.hostname + "/favicon.ico"
-        r = requests.head(ico_url)
+        try:
+            r = self.config.http_session.head(ico_url,
+                                              timeout=self.budget.timeout((self.CONNECT_TIMEOUT, self.READ_TIMEOUT)))
+        except Exception as e:
+            logging.debug("Could not load %s: %s" % (ico_url, e))
+            return None
+
         if r.status_code == 200:
-            self.favicons[url] = {
+            return {
                 'url': ico_url,
             }
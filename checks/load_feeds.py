@@ -1,32 +1,137 @@
 """
 Loads feeds linked from pages and collects information on the contained content
+
+Feeds are loaded concurrently. Results are kept in config.shared_cache
+along with the feed's ETag and Last-Modified headers, so on the next
+run, feeds are requested conditionally and not parsed again if they
+haven't changed.
+
+Entry statistics are collected in a single pass (see FeedStats). If
+config.feed_max_entries is set, feeds are parsed while they are being
+downloaded, and only that many entries are looked at.
 """
 
 import calendar
+import email.utils
 import logging
 from datetime import datetime
 from datetime import timezone
 
 import feedparser
+from lxml import etree
+import requests
+import urllib3
 
 from checks.abstract_checker import AbstractChecker
 
+
+# Number of entries to look at per feed in production runs, see
+# perform_checks(). Enough for the statistics, while huge feeds
+# aren't downloaded completely.
+DEFAULT_MAX_ENTRIES = 100
+
+
+def parse_timestamp(text):
+    """
+    Returns the timestamp of a date in RFC 822 (RSS) or ISO 8601 (Atom)
+    format, or None if it can't be parsed. Dates without time zone are
+    taken as UTC.
+    """
+    if not text:
+        return None
+    text = text.strip()
+    try:
+        date = email.utils.parsedate_to_datetime(text)
+    except (TypeError, ValueError):
+        try:
+            date = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+class FeedStats(object):
+    """
+    Collects the number of entries of a feed and their publication
+    dates in a single pass. Entries without a date are counted, but
+    don't affect the dates.
+    """
+
+    def __init__(self):
+        self.num_entries = 0
+        self.num_dated_entries = 0
+        self.first = None
+        self.latest = None
+
+    def add(self, timestamp):
+        """Adds an entry published at timestamp (seconds), which may be None"""
+        self.num_entries += 1
+        if timestamp is None:
+            return
+
+        self.num_dated_entries += 1
+        if self.first is None or timestamp < self.first:
+            self.first = timestamp
+        if self.latest is None or timestamp > self.latest:
+            self.latest = timestamp
+
+    def to_dict(self):
+        """Returns the statistics in the format of our results"""
+        result = {
+            'num_entries': self.num_entries,
+            'latest_entry': None,
+            'first_entry': None,
+            'average_interval': None,
+        }
+        if self.num_dated_entries == 0:
+            return result
+
+        result['latest_entry'] = datetime.fromtimestamp(self.latest, tz=timezone.utc)
+        result['first_entry'] = datetime.fromtimestamp(self.first, tz=timezone.utc)
+        if self.num_dated_entries > 1 and self.first < self.latest:
+            result['average_interval'] = round((self.latest - self.first) / (self.num_dated_entries - 1))
+        return result
+
+
 class Checker(AbstractChecker):
+    depends_on_checks = ['html_head']
+
+    # maximum duration of the check (seconds)
+    max_duration = 120
+
+    # connection timeout (seconds)
+    CONNECT_TIMEOUT = 10
+
+    # response timeout (seconds)
+    READ_TIMEOUT = 20
+
+    # How long results of unchanged feeds are reused (seconds)
+    cache_ttl = 7 * 24 * 60 * 60
+
+    # Elements holding entries, and their publication dates
+    ENTRY_TAGS = ('item', 'entry')
+    DATE_TAGS = ('pubDate', 'published', 'date')
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
         self.feeds = {}
 
-    def depends_on_results(self):
-        return ['html_head']
-
     def run(self):
         assert 'html_head' in self.previous_results
 
         for url in self.config.urls:
             self.collect_feeds(url)
 
-        for feed_url in self.feeds:
-            self.feeds[feed_url] = self.analyse_feed(feed_url)
+        feed_urls = list(self.feeds)
+        for feed_url, result in zip(feed_urls, self.map_urls(self.analyse_feed, feed_urls)):
+            if result is None:
+                # skipped, as the time budget is used up
+                del self.feeds[feed_url]
+                continue
+            self.feeds[feed_url] = result
 
         return self.feeds
     
@@ -64,58 +169,134 @@ class Checker(AbstractChecker):
             'num_entries': None,
         }
 
+        cache_key = 'feed:%s' % feed_url
+        cached = self.config.shared_cache.get(cache_key)
+        request_headers = {}
+        if cached is not None:
+            if cached['etag'] is not None:
+                request_headers['If-None-Match'] = cached['etag']
+            if cached['last_modified'] is not None:
+                request_headers['If-Modified-Since'] = cached['last_modified']
+
         logging.debug("Loading feed %s" % feed_url)
-        data = feedparser.parse(feed_url)
+        try:
+            r = self.config.http_session.get(feed_url,
+                                             headers=request_headers,
+                                             stream=self.config.feed_max_entries is not None,
+                                             timeout=self.budget.timeout((self.CONNECT_TIMEOUT, self.READ_TIMEOUT)))
+        except Exception as e:
+            result['exception'] = str(e)
+            return result
+
+        if r.status_code == 304 and cached is not None:
+            logging.debug("Feed %s not modified, using cached result" % feed_url)
+            return self.decode_result(cached['result'])
+
+        if self.config.feed_max_entries is None:
+            complete = self.parse_feed(r, result)
+        else:
+            complete = self.parse_feed_stream(r, result)
+
+        if r.status_code not in (200, 301, 302):
+            result['exception'] = 'Server responded with status %s' % r.status_code
+
+        etag = r.headers.get('etag')
+        last_modified = r.headers.get('last-modified')
+        if complete and r.status_code == 200 and (etag is not None or last_modified is not None):
+            self.config.shared_cache.set(cache_key, {
+                'etag': etag,
+                'last_modified': last_modified,
+                'result': self.encode_result(result),
+            }, self.cache_ttl)
+
+        return result
+
+    def parse_feed(self, response, result):
+        """
+        Parses the whole feed using feedparser, adding to result.
+        Returns True, as the feed has been downloaded completely.
+        """
+        # Pass response headers to feedparser for encoding detection
+        # and resolution of relative URLs.
+        headers = {key.lower(): value for key, value in response.headers.items()}
+        headers['content-location'] = response.url
+        data = feedparser.parse(response.content, response_headers=headers)
 
         if 'bozo_exception' in data:
             result['exception'] = str(data['bozo_exception'])
 
-        if 'headers' not in data:
-            return result
-
-        if data['headers'].get('status') not in ('200', '301', '302'):
-            result['exception'] = 'Server responded with status %s' % data['headers'].get('status')
-        
         if 'feed' in data:
             result['title'] = data['feed'].get('title')
         if 'entries' in data:
-            result['num_entries'] = len(data['entries'])
-            result['latest_entry'] = self.find_latest_entry(data['entries'])
-            result['first_entry'] = self.find_first_entry(data['entries'])
-            if (result['num_entries'] > 1 and 
-                result['first_entry'] is not None and
-                result['latest_entry'] is not None and
-                result['first_entry'] < result['latest_entry']):
-                result['average_interval'] = round((result['latest_entry'] - result['first_entry']).total_seconds() / (result['num_entries'] - 1))
-        
-        return result
+            stats = FeedStats()
+            for entry in data['entries']:
+                published_parsed = entry.get('published_parsed')
+                stats.add(calendar.timegm(published_parsed) if published_parsed is not None else None)
+            result.update(stats.to_dict())
+
+        return True
+
+    def parse_feed_stream(self, response, result):
+        """
+        Parses the feed while it is being downloaded, up to
+        config.feed_max_entries entries, adding to result.
+        Returns False if the download failed, True otherwise.
+        """
+        max_entries = self.config.feed_max_entries
+        complete = True
+        stats = FeedStats()
+        response.raw.decode_content = True
+        try:
+            for _, element in etree.iterparse(response.raw, events=('end',),
+                                              resolve_entities=False, no_network=True):
+                name = etree.QName(element).localname
+                parent = element.getparent()
 
+                if name == 'title' and result['title'] is None and parent is not None:
+                    if etree.QName(parent).localname in ('channel', 'feed'):
+                        result['title'] = element.text
 
-    def find_latest_entry(self, entries):
-        max_date = None
+                elif name in self.ENTRY_TAGS:
+                    timestamp = None
+                    for child in element:
+                        if isinstance(child.tag, str) and etree.QName(child).localname in self.DATE_TAGS:
+                            timestamp = parse_timestamp(child.text)
+                            break
+                    stats.add(timestamp)
 
-        for entry in entries:
-            published_parsed = entry.get('published_parsed')
-            if published_parsed is None:
-                return
-            timestamp = calendar.timegm(published_parsed)
-            if max_date is None or timestamp > max_date:
-                max_date = timestamp
+                    # free the memory of entries done with
+                    element.clear()
+                    while element.getprevious() is not None:
+                        del parent[0]
 
-        if max_date is not None:
-            return datetime.fromtimestamp(max_date, tz=timezone.utc)
+                    if stats.num_entries >= max_entries:
+                        break
+        except etree.XMLSyntaxError as e:
+            result['exception'] = str(e)
+        except (urllib3.exceptions.HTTPError, requests.RequestException, OSError) as e:
+            # e.g. the connection timed out or broke off while reading
+            logging.info("Error when reading feed %s: %s" % (response.url, e))
+            result['exception'] = str(e)
+            complete = False
+        finally:
+            response.close()
 
+        result.update(stats.to_dict())
+        return complete
 
-    def find_first_entry(self, entries):
-        min_date = None
+    def encode_result(self, result):
+        """Makes a result JSON serializable for the cache"""
+        encoded = dict(result)
+        for key in ('latest_entry', 'first_entry'):
+            if encoded[key] is not None:
+                encoded[key] = encoded[key].isoformat()
+        return encoded
 
-        for entry in entries:
-            published_parsed = entry.get('published_parsed')
-            if published_parsed is None:
-                return
-            timestamp = calendar.timegm(published_parsed)
-            if min_date is None or timestamp < min_date:
-                min_date = timestamp
+    def decode_result(self, encoded):
+        """Reverses encode_result()"""
+        result = dict(encoded)
+        for key in ('latest_entry', 'first_entry'):
+            if result[key] is not None:
+                result[key] = datetime.fromisoformat(result[key])
+        return result
 
-        if min_date is not None:
-            return datetime.fromtimestamp(min_date, tz=timezone.utc)
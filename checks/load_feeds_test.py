@@ -5,10 +5,13 @@ import unittest
 from checks import html_head, page_content
 from checks import load_feeds
 from checks.config import Config
+from checks.shared_cache import FileCache
 from datetime import datetime
 from datetime import timezone
 
 from pprint import pprint
+import tempfile
+import urllib3
 
 @httprettified
 class TestFeed(unittest.TestCase):
@@ -177,5 +180,192 @@ class TestFeed(unittest.TestCase):
 
 
 
+    def test_conditional_requests(self):
+        """
+        Unchanged feeds are taken from the cache
+        """
+
+        feed = """<?xml version="1.0"?>
+            <rss version="2.0">
+                <channel>
+                    <title>News %s</title>
+                    <item>
+                        <title>Star City</title>
+                        <pubDate>Tue, 03 Jun 2003 09:39:21 GMT</pubDate>
+                    </item>
+                </channel>
+            </rss>
+        """
+
+        def respond(request, uri, response_headers):
+            response_headers['ETag'] = '"v1"'
+            if request.headers.get('If-None-Match') == '"v1"':
+                return [304, response_headers, '']
+            return [200, response_headers, feed % uri.rsplit('/', 1)[1]]
+
+        feed_urls = ['http://example.com/feed/%s' % i for i in range(3)]
+        for feed_url in feed_urls:
+            httpretty.register_uri(httpretty.GET, feed_url, body=respond)
+
+        results = {
+            'html_head': {
+                'http://example.com/': {
+                    'link_rss_atom': feed_urls,
+                }
+            }
+        }
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            runs = []
+            for _ in range(2):
+                config = Config(urls=['http://example.com/'], shared_cache=FileCache(tmpdir))
+                checker = load_feeds.Checker(config=config, previous_results=results)
+                runs.append(checker.run())
+
+        self.assertEqual(httpretty.last_request().headers['If-None-Match'], '"v1"')
+        self.assertEqual(runs[0], runs[1])
+        self.assertEqual(runs[1]['http://example.com/feed/2']['title'], 'News 2')
+        self.assertEqual(runs[1]['http://example.com/feed/2']['latest_entry'],
+                         datetime(2003, 6, 3, 9, 39, 21, tzinfo=timezone.utc))
+
+
+    def test_feed_with_missing_dates(self):
+        """
+        Entries without a date don't hide the dates of the others
+        """
+
+        feed = """<?xml version="1.0"?>
+            <rss version="2.0">
+                <channel>
+                    <title>Partly dated</title>
+                    <item><title>A</title><pubDate>Tue, 03 Jun 2003 09:39:21 GMT</pubDate></item>
+                    <item><title>B</title></item>
+                    <item><title>C</title><pubDate>Tue, 27 May 2003 09:39:21 GMT</pubDate></item>
+                </channel>
+            </rss>
+        """
+
+        feed_url = 'http://example.com/feed.xml'
+        httpretty.register_uri(httpretty.GET, feed_url, body=feed,
+                               adding_headers={"Content-type": "application/rss+xml"})
+
+        results = {
+            'html_head': {
+                'http://example.com/': {
+                    'link_rss_atom': [feed_url]
+                }
+            }
+        }
+        config = Config(urls=['http://example.com/'])
+        result = load_feeds.Checker(config=config, previous_results=results).run()
+
+        self.assertEqual(result[feed_url]['num_entries'], 3)
+        self.assertEqual(result[feed_url]['latest_entry'], datetime(2003, 6, 3, 9, 39, 21, tzinfo=timezone.utc))
+        self.assertEqual(result[feed_url]['first_entry'], datetime(2003, 5, 27, 9, 39, 21, tzinfo=timezone.utc))
+        self.assertEqual(result[feed_url]['average_interval'], 7 * 24 * 60 * 60)
+
+    def test_max_entries(self):
+        """
+        Only the first entries are parsed in streaming mode
+        """
+
+        entries = "".join("""
+            <entry>
+                <title>Entry %s</title>
+                <updated>2003-06-%02dT12:00:00Z</updated>
+                <published>2003-06-%02dT12:00:00Z</published>
+            </entry>""" % (i, 20 - i, 20 - i) for i in range(10))
+        feed = """<?xml version="1.0" encoding="utf-8"?>
+            <feed xmlns="http://www.w3.org/2005/Atom">
+                <title>Atom News</title>%s
+            </feed>
+        """ % entries
+
+        feed_url = 'http://example.com/atom.xml'
+        httpretty.register_uri(httpretty.GET, feed_url, body=feed,
+                               adding_headers={"Content-type": "application/atom+xml"})
+
+        results = {
+            'html_head': {
+                'http://example.com/': {
+                    'link_rss_atom': [feed_url]
+                }
+            }
+        }
+        config = Config(urls=['http://example.com/'], feed_max_entries=3)
+        result = load_feeds.Checker(config=config, previous_results=results).run()
+
+        self.assertEqual(result[feed_url], {
+            'exception': None,
+            'title': 'Atom News',
+            'latest_entry': datetime(2003, 6, 20, 12, 0, tzinfo=timezone.utc),
+            'first_entry': datetime(2003, 6, 18, 12, 0, tzinfo=timezone.utc),
+            'average_interval': 24 * 60 * 60,
+            'num_entries': 3,
+        })
+
+    def test_read_error(self):
+        """
+        Errors while reading a streamed feed are recorded
+        """
+
+        class BrokenStream(object):
+            decode_content = False
+            chunks = [b'<?xml version="1.0"?><rss><channel><title>News</title><item><pubDate>Tue, 03 Jun 2003 09:39:21 GMT</pubDate></item>']
+
+            def read(self, size=-1):
+                if self.chunks:
+                    return self.chunks.pop(0)
+                raise urllib3.exceptions.ReadTimeoutError(None, None, "Read timed out.")
+
+        class Response(object):
+            url = 'http://example.com/feed.xml'
+            raw = BrokenStream()
+            closed = False
+
+            def close(self):
+                self.closed = True
+
+        config = Config(urls=[], feed_max_entries=10)
+        checker = load_feeds.Checker(config=config, previous_results={})
+        response = Response()
+        result = {'title': None, 'exception': None}
+
+        self.assertFalse(checker.parse_feed_stream(response, result))
+        self.assertTrue(response.closed)
+        self.assertIn('Read timed out', result['exception'])
+        self.assertEqual(result['title'], 'News')
+        self.assertEqual(result['num_entries'], 1)
+
+
+class TestFeedStats(unittest.TestCase):
+
+    def test_stats(self):
+        stats = load_feeds.FeedStats()
+        for timestamp in (300, None, 100, 200):
+            stats.add(timestamp)
+
+        self.assertEqual(stats.to_dict(), {
+            'num_entries': 4,
+            'latest_entry': datetime.fromtimestamp(300, tz=timezone.utc),
+            'first_entry': datetime.fromtimestamp(100, tz=timezone.utc),
+            'average_interval': 100,
+        })
+
+    def test_no_dates(self):
+        stats = load_feeds.FeedStats()
+        stats.add(None)
+        self.assertEqual(stats.to_dict()['num_entries'], 1)
+        self.assertIsNone(stats.to_dict()['latest_entry'])
+        self.assertIsNone(stats.to_dict()['average_interval'])
+
+    def test_parse_timestamp(self):
+        self.assertEqual(load_feeds.parse_timestamp('Tue, 03 Jun 2003 09:39:21 GMT'),
+                         load_feeds.parse_timestamp('2003-06-03T11:39:21+02:00'))
+        self.assertEqual(load_feeds.parse_timestamp('1970-01-01T00:01:00'), 60)
+        self.assertIsNone(load_feeds.parse_timestamp('yesterday'))
+        self.assertIsNone(load_feeds.parse_timestamp(None))
+
+
 if __name__ == '__main__':
     unittest.main()
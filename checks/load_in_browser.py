@@ -7,30 +7,38 @@ Information includes:
 - whether javascript errors or errors from missing resources occur
 - what CSS font-family properties are in use
 - what cookies are set during loading the page
+- how many network requests the page causes, and how much data they
+  transfer (see checks/network_stats.py)
+
+Screenshots are taken as PNG (recompressed before upload) or WebP,
+depending on config.screenshot_format. Each one gets a perceptual hash,
+computed from a tiny extra capture, so that screenshots which look the
+same as the stored ones are not uploaded again.
+
+Browsers come from the process-wide pool in checks/browser_pool.py.
+Each site is loaded in a new browser context, so cookies from other
+sites don't show up.
 """
 
+import base64
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, UTC
 import hashlib
 import logging
 import math
-import os
-import shutil
 import time
-import sqlite3
-import json
 
-from selenium import webdriver
-from selenium.common.exceptions import StaleElementReferenceException
+from selenium.common.exceptions import JavascriptException
 from selenium.common.exceptions import TimeoutException
-from selenium.webdriver.chrome.service import Service as ChromeService
-from selenium.webdriver.common.by import By
+from selenium.common.exceptions import WebDriverException
 import tenacity
 
-from google.cloud import storage
-from google.cloud import datastore
-
+from checks import browser_pool
+from checks import png_image
 from checks.abstract_checker import AbstractChecker
+from checks.network_stats import NetworkStats
+from checks.screenshot_storage import UploadQueue
 
 
 # Mobile user agent strings used for device emulation. Kept up-to-date
@@ -45,6 +53,86 @@ ANDROID_USER_AGENT = (
 )
 
 
+# Asynchronous script resolving as soon as the size of the document has
+# been the same for a number of animation frames (after web fonts have
+# loaded), or after a maximum wait time. Optionally scrolls first.
+# Returns the document width.
+#
+# Arguments: maximum wait time (ms), number of frames, pixels to scroll
+WAIT_FOR_STABLE_LAYOUT_SCRIPT = """
+var done = arguments[arguments.length - 1];
+var maxWait = arguments[0];
+var requiredFrames = arguments[1];
+var start = performance.now();
+var finished = false;
+var lastSize = null;
+var stableFrames = 0;
+
+function finish() {
+    if (!finished) {
+        finished = true;
+        done(document.body ? document.body.scrollWidth : 0);
+    }
+}
+
+function documentSize() {
+    var body = document.body;
+    if (!body) {
+        return null;
+    }
+    return body.scrollWidth + 'x' + body.scrollHeight;
+}
+
+function checkFrame() {
+    if (finished) {
+        return;
+    }
+    var size = documentSize();
+    if (size !== null && size === lastSize) {
+        stableFrames++;
+    } else {
+        stableFrames = 0;
+        lastSize = size;
+    }
+    if (stableFrames >= requiredFrames) {
+        finish();
+    } else {
+        requestAnimationFrame(checkFrame);
+    }
+}
+
+// animation frames don't fire in background pages
+setTimeout(finish, maxWait);
+
+if (arguments[2]) {
+    window.scrollBy(0, arguments[2]);
+}
+
+var fontsReady = document.fonts ? document.fonts.ready : Promise.resolve();
+fontsReady.then(function() {
+    requestAnimationFrame(checkFrame);
+});
+"""
+
+
+# Script collecting information on the rendered page in one go:
+# the distinct computed font-family values and the number of elements.
+PAGE_INFO_SCRIPT = """
+var elements = document.getElementsByTagName('*');
+var fontFamilies = {};
+for (var i = 0; i < elements.length; i++) {
+    var fontFamily = window.getComputedStyle(elements[i]).getPropertyValue('font-family');
+    if (fontFamily) {
+        fontFamilies[fontFamily.toLowerCase()] = true;
+    }
+}
+return {
+    'font_families': Object.keys(fontFamilies),
+    'dom_size': elements.length
+};
+"""
+
+
 @dataclass(frozen=True)
 class Device:
     """
@@ -63,8 +151,25 @@ class Device:
 
 class Checker(AbstractChecker):
 
+    # maximum duration of the check (seconds)
+    max_duration = 600
+
     page_load_timeout = 120
 
+    # Maximum time to wait for re-render/re-flow after resizing (seconds)
+    reflow_timeout = 1.0
+
+    # Maximum time to wait for lazy-loading content after scrolling (seconds)
+    scroll_timeout = 0.2
+
+    # Number of animation frames without a change in document size
+    # after which we consider the layout stable
+    stable_frames = 3
+
+    # Width (in CSS pixels) of the small capture used for the
+    # perceptual hash of a screenshot
+    hash_capture_width = 32
+
     # Viewports we check. Desktop entries come first so that
     # ``sizes[0]`` keeps its meaning for rating/responsive_layout.py.
     # Mobile entries enable Chromium's device emulation (DPR, mobile UA,
@@ -88,319 +193,314 @@ class Checker(AbstractChecker):
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
 
-        # Our selenium user agent using Chrome headless as an engine
-        chrome_options = webdriver.ChromeOptions()
-        chrome_options.binary_location = '/usr/bin/chromium'
-        chrome_options.add_argument('--enable-automation')
-        chrome_options.add_argument('--headless=new')
-        chrome_options.add_argument('--disable-gpu')
-        chrome_options.add_argument('--no-sandbox')
-        chrome_options.add_argument('--dns-prefetch-disable')
-        chrome_options.add_argument('--disable-extensions')
-        chrome_options.add_argument('--disable-component-extensions-with-background-pages')
-        chrome_options.add_argument('--disable-default-apps')
-        chrome_options.add_argument('--hide-scrollbars')
-        chrome_options.add_argument('--disk-cache-size=0')
-        chrome_options.add_argument('--no-default-browser-check')
-        chrome_options.add_argument('--no-first-run')
-        chrome_options.add_argument('--disable-dev-shm-usage')
-        # Suppress the Chrome 127+ EU search-engine-choice modal that would
-        # otherwise block navigation on a fresh profile.
-        chrome_options.add_argument('--disable-search-engine-choice-screen')
-        chrome_options.add_argument('--verbose')
-        chrome_options.page_load_strategy = 'normal'
-
-        # path where to get cookies from
-        chrome_options.add_argument("--user-data-dir=/opt/chrome-userdir")
-
-        # empty /opt/chrome-userdir
-        shutil.rmtree('/opt/chrome-userdir', ignore_errors=True)
-
-        # activate performance logging (includes network logging)
-        chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
-
-        service = ChromeService(executable_path='/usr/bin/chromedriver')
-        self.driver = webdriver.Chrome(service=service, options=chrome_options)
-        self.driver.set_page_load_timeout(self.page_load_timeout)
-
-        # We capture the browser engine's user agent string
-        # for the record.
-        self.user_agent = self.driver.execute_script("return navigator.userAgent;")
+        # Screenshots get uploaded in the background while pages are
+        # being checked, see post_hook()
+        self.uploads = UploadQueue(config.screenshot_storage)
 
     def run(self):
         """
         Main function of this check.
+
+        URLs are loaded in parallel, each one in a browser of its own,
+        up to config.browser_concurrency at a time. Unlike map_urls(),
+        this doesn't hold the per-host limit of config.host_semaphore
+        while the browser is busy, which would hold up the other checks
+        fetching from the same host.
         """
         results = {}
-        for url in self.config.urls:
+        urls = self.config.urls
+        if len(urls) == 0:
+            return results
 
-            results[url] = {
-                'cookies': None,
-                'sizes': None,
-                'min_document_width': None,
-                'logs': None,
-                'font_families': None,
-                'performance_log': [],
-                'screenshots': [],
-            }
+        pool = browser_pool.get_pool(self.config.browser_concurrency)
 
-            self.driver.get(url)
+        # metadata of the previous screenshots, to tell unchanged ones
+        self.uploads.load_metadata([self.uploads.storage.url(self.screenshot_path(url, device))
+                                    for url in urls for device in self.sizes])
 
-            # Responsive layout check and screenshots.
-            try:
-                check_responsiveness_results = self.check_responsiveness(url)
-                results[url] = {
-                    'sizes': check_responsiveness_results['sizes'],
-                    'min_document_width': min([s['document_width'] for s in check_responsiveness_results['sizes']]),
-                    'dom_size': self.get_dom_size(),
-                    'logs': self.capture_log(),
-                    'performance_log': [],
-                    'screenshots': check_responsiveness_results['screenshots'],
-                }
-            except TimeoutException as e:
-                logging.warning("TimeoutException when checking responsiveness for %s: %s" % (url, e))
-                pass
-            except tenacity.RetryError as re:
-                logging.warning("RetryError when checking responsiveness for %s: %s" % (url, re))
-                pass
-            
-            # Scroll page to bottom, to load all lazy-loading resources.
-            try:
-                self.scroll_to_bottom()
-            except TimeoutException as e:
-                logging.warning("TimeoutException in scroll_to_bottom for %s: %s" % (url, e))
-                pass
-            except tenacity.RetryError as re:
-                logging.warning("RetryError in scroll_to_bottom for %s: %s" % (url, re))
-                pass
+        def call(url):
+            if self.budget.expired():
+                logging.warning("Time budget used up, skipping %s" % url)
+                return None
+            return self.load_url(pool, url)
 
-            # CSS collection
-            font_families = None
-
-            try:
-                elements = self.driver.find_elements(By.XPATH, "//*")
-                font_families = set()
-                for element in elements:
-                    try:
-                        font_family = element.value_of_css_property('font-family')
-                        if font_family is None:
-                            continue
-                        font_families.add(font_family.lower())
-                    except StaleElementReferenceException as e:
-                        logging.warning("StaleElementReferenceException when collecting CSS properties for %s: %s" % (url, e))
-                        continue
-
-                results[url]['font_families'] = sorted(list(font_families))
-            
-            except TimeoutException as e:
-                logging.warning("TimeoutException when collecting CSS elements for %s: %s" % (url, e))
-                pass
-            
-            # Process cookies.
-            try:
-                results[url]['cookies'] = self.get_cookies()
-            except TimeoutException as e:
-                logging.warning("TimeoutException when collecting cookies %s: %s" % (url, e))
-                pass
-            except tenacity.RetryError as re:
-                logging.warning("RetryError when collecting cookies for %s: %s" % (url, re))
-                pass
-        
-            for logentry in self.driver.get_log('performance'):
-                decoded_logentry = json.loads(logentry['message'])
-                results[url]['performance_log'].append(decoded_logentry)
-
-        self.driver.quit()
+        max_workers = min(self.config.browser_concurrency, len(urls))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for url, result in zip(urls, executor.map(call, urls)):
+                if result is not None:
+                    results[url] = result
 
         return results
-    
-    def post_hook(self, result):
+
+    def load_url(self, pool, url):
         """
-        Logic executed after run() is done.
-        Used to upload screenshots and metadata to cloud storage and datastore.
+        Loads url in a browser leased from pool and returns its result.
+        If the page can't be loaded, the result is partial.
         """
-        # Upload screenshots and metadata
+        result = {
+            'cookies': None,
+            'sizes': None,
+            'min_document_width': None,
+            'logs': None,
+            'font_families': None,
+            'network': None,
+            'screenshots': [],
+        }
 
-        logging.debug("load_in_browser post_hook 1 - Creating client")
+        try:
+            with pool.lease() as lease:
+                self.check_page(lease, url, result)
+        except WebDriverException as e:
+            # The pool replaces the browser that failed
+            logging.warning("WebDriverException when loading %s: %s" % (url, e))
 
-        storage_client = storage.Client.from_service_account_json(self.config.storage_credentials_path)
-        bucket = storage_client.get_bucket(self.config.screenshot_bucket_name)
+        return result
 
-        datastore_client = datastore.Client.from_service_account_json(self.config.datastore_credentials_path)
-        exclude_from_indexes = ['size', 'screenshot_url', 'user_agent']
+    def check_page(self, lease, url, result):
+        """Loads url using lease and writes the findings to result"""
+        driver = lease.driver
+        driver.set_page_load_timeout(self.budget.timeout(self.page_load_timeout))
 
-        for url in result.keys():
-            for screenshot in result[url]['screenshots']:
-                # Upload one screenshot
-                try:
-                    local_file = '%s/%s' % (screenshot['folder'], screenshot['filename'])
-
-                    logging.debug("Handling screenshot file %s" % local_file)
-
-                    if not os.path.exists(screenshot['local_path']):
-                        logging.warning("No screenshot created: size=%s, url='%s'" % (screenshot['size'], screenshot['url']))
-                        continue
-
-                    logging.debug("Uploading %s to %s/%s" % (screenshot['local_path'], screenshot['folder'], screenshot['filename']))
-                    with open(screenshot['local_path'], 'rb') as my_file:
-                        # Create new blob in remote bucket
-                        blob = bucket.blob(local_file)
-                        blob.upload_from_file(my_file, content_type="image/png")
-                        blob.make_public()
-                except Exception as e:
-                    logging.warning("Error uploading screenshot for %s: %s" % (screenshot['url'], e))
-                    continue
-
-                try:
-                    os.remove(screenshot['local_path'])
-                except:
-                    pass
-                
-                # Write metadata for one screenshot
-                data = {
-                    'url': screenshot['url'],
-                    'size': screenshot['size'],
-                    'screenshot_url': screenshot['screenshot_url'],
-                    'user_agent': screenshot['user_agent'],
-                    'created': screenshot['created'],
-                }
-                try:
-                    key = datastore_client.key(self.config.screenshot_datastore_kind, screenshot['screenshot_url'])
-                    entity = datastore.Entity(key=key, exclude_from_indexes=exclude_from_indexes)
-                    entity.update(data)
-                    datastore_client.put(entity)
-                    logging.debug("Successfully stored screenshot metadata for %s" % screenshot['screenshot_url'])
-                except Exception as e:
-                    logging.warning("Error in %s: %s" % (screenshot['url'], e))
+        # Network events are taken from the performance log after each
+        # step, so the log doesn't pile up.
+        network = NetworkStats(url)
 
+        try:
+            driver.get(url)
+        except TimeoutException as e:
+            logging.warning("TimeoutException when loading %s: %s" % (url, e))
+            network.add_log_entries(driver.get_log('performance'))
+            result['network'] = network.to_dict()
+            return
+        network.add_log_entries(driver.get_log('performance'))
+
+        # Responsive layout check and screenshots.
+        try:
+            check_responsiveness_results = self.check_responsiveness(lease, url)
+            result.update({
+                'sizes': check_responsiveness_results['sizes'],
+                'min_document_width': min([s['document_width'] for s in check_responsiveness_results['sizes']]),
+                'logs': self.capture_log(driver),
+                'screenshots': check_responsiveness_results['screenshots'],
+            })
+            network.add_log_entries(driver.get_log('performance'))
+        except TimeoutException as e:
+            logging.warning("TimeoutException when checking responsiveness for %s: %s" % (url, e))
+            pass
+        except tenacity.RetryError as re:
+            logging.warning("RetryError when checking responsiveness for %s: %s" % (url, re))
+            pass
+        
+        # Scroll page to bottom, to load all lazy-loading resources.
+        try:
+            self.scroll_to_bottom(driver)
+        except TimeoutException as e:
+            logging.warning("TimeoutException in scroll_to_bottom for %s: %s" % (url, e))
+            pass
+        except tenacity.RetryError as re:
+            logging.warning("RetryError in scroll_to_bottom for %s: %s" % (url, re))
+            pass
+
+        # CSS collection and DOM size
+        try:
+            page_info = driver.execute_script(PAGE_INFO_SCRIPT)
+            result['font_families'] = sorted(page_info['font_families'])
+            result['dom_size'] = int(page_info['dom_size'])
+        except TimeoutException as e:
+            logging.warning("TimeoutException when collecting CSS properties for %s: %s" % (url, e))
+            pass
+        except JavascriptException as e:
+            logging.warning("JavascriptException when collecting CSS properties for %s: %s" % (url, e))
+            pass
+        
+        # Process cookies.
+        try:
+            result['cookies'] = lease.get_cookies()
+        except TimeoutException as e:
+            logging.warning("TimeoutException when collecting cookies %s: %s" % (url, e))
+            pass
+        except tenacity.RetryError as re:
+            logging.warning("RetryError when collecting cookies for %s: %s" % (url, re))
+            pass
+
+        network.add_log_entries(driver.get_log('performance'))
+        result['network'] = network.to_dict()
+    
+    def post_hook(self, result):
+        """
+        Logic executed after run() is done.
+        Waits for the screenshot uploads and stores their metadata.
+        """
+        uploaded = self.uploads.finish()
+        logging.debug("Uploaded %s screenshots, skipped %s unchanged ones" % (uploaded, self.uploads.skipped))
 
-            # Remove screenshots part from results
+        # Remove screenshots part from results
+        for url in result.keys():
             del result[url]['screenshots']
 
         return result
 
-    def get_cookies(self):
-        # read cookie DB to get 3rd party cookies, too
-        cookies = []
-        db = sqlite3.connect('/opt/chrome-userdir/Default/Cookies')
-        db.row_factory = sqlite3.Row
-        c = db.cursor()
-        c.execute("SELECT creation_utc, host_key, name, path, expires_utc, is_secure, is_httponly, has_expires, is_persistent FROM cookies")
-        for row in c.fetchall():
-            cookies.append(dict(row))
-        c.close()
-        db.close()
-        
-        return cookies
-
-    def _apply_emulation(self, device):
+    def _apply_emulation(self, driver, device):
         """Switch the live Chromium session into mobile-device emulation."""
-        self.driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {
+        driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {
             "width": device.width,
             "height": device.height,
             "deviceScaleFactor": device.device_scale_factor,
             "mobile": device.mobile,
         })
-        self.driver.execute_cdp_cmd("Emulation.setTouchEmulationEnabled", {
+        driver.execute_cdp_cmd("Emulation.setTouchEmulationEnabled", {
             "enabled": device.has_touch,
         })
         if device.user_agent_override is not None:
-            self.driver.execute_cdp_cmd("Emulation.setUserAgentOverride", {
+            driver.execute_cdp_cmd("Emulation.setUserAgentOverride", {
                 "userAgent": device.user_agent_override,
             })
 
-    def _clear_emulation(self):
+    def _clear_emulation(self, driver):
         """Undo any emulation overrides so subsequent viewports start clean."""
         try:
-            self.driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
-            self.driver.execute_cdp_cmd("Emulation.setTouchEmulationEnabled", {"enabled": False})
+            driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+            driver.execute_cdp_cmd("Emulation.setTouchEmulationEnabled", {"enabled": False})
             # An empty userAgent removes the override per the CDP spec.
-            self.driver.execute_cdp_cmd("Emulation.setUserAgentOverride", {"userAgent": ""})
+            driver.execute_cdp_cmd("Emulation.setUserAgentOverride", {"userAgent": ""})
         except Exception as e:
             logging.warning("Failed to clear Chromium emulation overrides: %s" % e)
 
     @tenacity.retry(stop=tenacity.stop_after_attempt(3),
                     retry=tenacity.retry_if_exception_type(TimeoutException))
-    def check_responsiveness(self, url):
+    def check_responsiveness(self, lease, url):
+        driver = lease.driver
         result = {
             'sizes': [],
             'screenshots': [],
         }
 
         # set window to the first size initially
-        self.driver.set_window_size(self.sizes[0].width, self.sizes[0].height)
+        driver.set_window_size(self.sizes[0].width, self.sizes[0].height)
 
         for device in self.sizes:
             try:
                 if device.mobile:
-                    self._apply_emulation(device)
+                    self._apply_emulation(driver, device)
                 else:
-                    self.driver.set_window_size(device.width, device.height)
+                    driver.set_window_size(device.width, device.height)
 
                 # wait for re-render/re-flow
-                time.sleep(1.0)
-                doc_width = self.driver.execute_script("return document.body.scrollWidth")
+                doc_width = self.wait_for_stable_layout(driver, self.reflow_timeout)
 
                 result['sizes'].append({
                     'viewport_width': device.width,
                     'document_width': int(doc_width),
                 })
 
-                # Make screenshot
-                urlhash = hashlib.md5(bytearray(url, 'utf-8')).hexdigest()
-                folder = "%sx%s" % (device.width, device.height)
-                abs_folder = "/screenshots/%s" % folder
-                os.makedirs(abs_folder, exist_ok=True)
-                filename = urlhash + '.png'
-                abs_filepath = "%s/%s" % (abs_folder, filename)
+                # Make screenshot and start uploading it, while we go on
+                # with the next viewport
+                image_format = self.config.screenshot_format
+                path = self.screenshot_path(url, device)
+                folder, filename = path.split('/')
                 created = datetime.now(UTC)
 
-                success = self.driver.save_screenshot(abs_filepath)
+                image = self.capture_screenshot(driver)
 
-                if not success:
-                    logging.warning("Failed to create screenshot %s" % abs_filepath)
+                if not image:
+                    logging.warning("Failed to create screenshot %s for %s" % (path, url))
                     continue
 
-                result['screenshots'].append({
-                    'local_path': abs_filepath,
+                screenshot = {
                     'folder': folder,
                     'filename': filename,
                     'url': url,
                     'size': [device.width, device.height],
-                    'screenshot_url': 'http://%s/%s/%s' % (
-                        self.config.screenshot_bucket_name, folder, filename),
-                    'user_agent': device.user_agent_override or self.user_agent,
+                    'screenshot_url': self.uploads.storage.url(path),
+                    'user_agent': device.user_agent_override or lease.user_agent,
                     'created': created,
-                })
+                }
+                self.uploads.submit(path, image, 'image/' + image_format, {
+                    'url': screenshot['url'],
+                    'size': screenshot['size'],
+                    'screenshot_url': screenshot['screenshot_url'],
+                    'user_agent': screenshot['user_agent'],
+                    'created': screenshot['created'],
+                    'phash': self.perceptual_hash(driver, device),
+                }, encode=png_image.optimize_png if image_format == 'png' else None)
+                result['screenshots'].append(screenshot)
             finally:
                 if device.mobile:
-                    self._clear_emulation()
+                    self._clear_emulation(driver)
 
         return result
     
-    def get_dom_size(self):
-        dom_length = self.driver.execute_script("return document.getElementsByTagName('*').length")
-        return int(dom_length)
-    
-    def capture_log(self):
+    def screenshot_path(self, url, device):
+        """Returns the path of the screenshot of url with device"""
+        urlhash = hashlib.md5(bytearray(url, 'utf-8')).hexdigest()
+        return "%sx%s/%s.%s" % (device.width, device.height, urlhash, self.config.screenshot_format)
+
+    def capture_screenshot(self, driver):
+        """Returns a screenshot of the viewport in config.screenshot_format"""
+        if self.config.screenshot_format == 'png':
+            return driver.get_screenshot_as_png()
+
+        response = driver.execute_cdp_cmd('Page.captureScreenshot', {
+            'format': self.config.screenshot_format,
+            'quality': self.config.screenshot_quality,
+        })
+        return base64.b64decode(response['data'])
+
+    def perceptual_hash(self, driver, device):
+        """
+        Returns the perceptual hash of the viewport, computed from a
+        capture scaled down to hash_capture_width, or None on errors.
+        """
+        try:
+            response = driver.execute_cdp_cmd('Page.captureScreenshot', {
+                'format': 'png',
+                'clip': {
+                    'x': 0,
+                    'y': 0,
+                    'width': device.width,
+                    'height': device.height,
+                    'scale': self.hash_capture_width / device.width,
+                },
+            })
+            return png_image.difference_hash(base64.b64decode(response['data']))
+        except Exception as e:
+            logging.warning("Could not compute perceptual hash: %s" % e)
+            return None
+
+    def capture_log(self, driver):
         """
         Returns log elements with level "SEVERE" or "WARNING"
         """
         entries = []
-        for entry in self.driver.get_log('browser'):
+        for entry in driver.get_log('browser'):
             if entry['level'] in ('WARNING', 'SEVERE'):
                 entries.append(entry)
         return entries
     
     @tenacity.retry(stop=tenacity.stop_after_attempt(3),
                     retry=tenacity.retry_if_exception_type(TimeoutException))
-    def scroll_to_bottom(self):
+    def scroll_to_bottom(self, driver):
         """
         Scroll through the entire page once to trigger loading of all resources
         """
-        height = self.driver.execute_script("return document.body.scrollHeight")
+        height = driver.execute_script("return document.body.scrollHeight")
         height = int(height)
         pages = math.floor(height / 1000)
         for _ in range(0, pages):
-            self.driver.execute_script("window.scrollBy(0,1000)")
-            time.sleep(0.2)
+            self.wait_for_stable_layout(driver, self.scroll_timeout, scroll_by=1000)
+
+    def wait_for_stable_layout(self, driver, timeout, scroll_by=0):
+        """
+        Waits until the document size stops changing, for at most timeout
+        seconds. Scrolls down by scroll_by pixels first, if given.
+        Returns the document width.
+        """
+        try:
+            return driver.execute_async_script(WAIT_FOR_STABLE_LAYOUT_SCRIPT,
+                                               int(timeout * 1000), self.stable_frames, scroll_by)
+        except JavascriptException as e:
+            logging.debug("Could not wait for stable layout, sleeping instead: %s" % e)
+            if scroll_by:
+                driver.execute_script("window.scrollBy(0, arguments[0])", scroll_by)
+            time.sleep(timeout)
+            return driver.execute_script("return document.body.scrollWidth")
@@ -0,0 +1,98 @@
+"""
+Aggregates the network activity of a page load in the browser from
+the DevTools protocol's Network events, as found in Chrome's
+performance log, into a few counters.
+
+Only the counters are kept, not the events. Log entries are filtered
+by substring before being decoded, so most of the log (like page and
+rendering events, or Network.dataReceived) never gets parsed.
+"""
+
+import collections
+import json
+from urllib.parse import urlparse
+
+
+class NetworkStats(object):
+    """
+    Network counters for one page, fed with performance log entries
+    via add_log_entries().
+    """
+
+    # Events we look at
+    METHODS = (
+        'Network.requestWillBeSent',
+        'Network.loadingFinished',
+        'Network.loadingFailed',
+    )
+
+    # Quoted method names, to skip other log entries without decoding
+    # them. Unquoted, 'Network.requestWillBeSent' would also match
+    # 'Network.requestWillBeSentExtraInfo'.
+    _QUOTED_METHODS = tuple('"%s"' % method for method in METHODS)
+
+    def __init__(self, page_url):
+        hostname = urlparse(page_url).hostname or ''
+        if hostname.startswith('www.'):
+            hostname = hostname[4:]
+        self._site_hostname = hostname
+
+        self.requests = 0
+        self.bytes = 0
+        self.failed_requests = 0
+        self.third_party_hosts = set()
+        self.bytes_by_type = collections.Counter()
+
+        # resource type by request ID
+        self._types = {}
+
+    def add_log_entries(self, entries):
+        """Adds entries as returned by driver.get_log('performance')"""
+        for entry in entries:
+            message = entry['message']
+            if not any(method in message for method in self._QUOTED_METHODS):
+                continue
+
+            event = json.loads(message)['message']
+            self.add_event(event['method'], event.get('params', {}))
+
+    def add_event(self, method, params):
+        """Adds one DevTools protocol event"""
+        if method == 'Network.requestWillBeSent':
+            # Redirects trigger this event again for the same request ID,
+            # so they count as requests, too.
+            self.requests += 1
+            self._types[params['requestId']] = params.get('type', 'Other')
+
+            hostname = urlparse(params['request']['url']).hostname
+            if hostname is not None and self.is_third_party(hostname):
+                self.third_party_hosts.add(hostname)
+
+        elif method == 'Network.loadingFinished':
+            size = params.get('encodedDataLength', 0)
+            self.bytes += size
+            self.bytes_by_type[self._types.get(params['requestId'], 'Other')] += size
+
+        elif method == 'Network.loadingFailed':
+            self.failed_requests += 1
+
+    def is_third_party(self, hostname):
+        """
+        Returns True if hostname belongs to a different site than the page,
+        i.e. is neither the page's hostname (without www.) nor one of its
+        subdomains or parent domains.
+        """
+        site = self._site_hostname
+        return not (hostname == site or
+                    hostname.endswith('.' + site) or
+                    site.endswith('.' + hostname))
+
+    def to_dict(self):
+        """Returns the counters as a dict for our results"""
+        return {
+            'requests': self.requests,
+            'bytes': self.bytes,
+            'failed_requests': self.failed_requests,
+            'third_party_hosts': sorted(self.third_party_hosts),
+            'bytes_by_type': dict(self.bytes_by_type),
+        }
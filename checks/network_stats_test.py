@@ -0,0 +1,78 @@
+import json
+import unittest
+
+from checks.network_stats import NetworkStats
+
+
+def log_entry(method, params):
+    """Returns a performance log entry as returned by chromedriver"""
+    return {
+        'level': 'INFO',
+        'timestamp': 0,
+        'message': json.dumps({'message': {'method': method, 'params': params}, 'webview': 'x'}),
+    }
+
+
+class TestNetworkStats(unittest.TestCase):
+
+    def test_counters(self):
+        stats = NetworkStats('https://www.example.com/')
+        stats.add_log_entries([
+            log_entry('Network.requestWillBeSent',
+                      {'requestId': '1', 'type': 'Document', 'request': {'url': 'https://www.example.com/'}}),
+            log_entry('Network.responseReceived', {'requestId': '1'}),
+            log_entry('Network.dataReceived', {'requestId': '1', 'dataLength': 100}),
+            log_entry('Network.loadingFinished', {'requestId': '1', 'encodedDataLength': 1000}),
+            log_entry('Network.requestWillBeSent',
+                      {'requestId': '2', 'type': 'Image', 'request': {'url': 'https://cdn.example.com/a.png'}}),
+            log_entry('Network.loadingFinished', {'requestId': '2', 'encodedDataLength': 500}),
+            log_entry('Network.requestWillBeSent',
+                      {'requestId': '3', 'type': 'Script', 'request': {'url': 'https://tracker.example.net/t.js'}}),
+            log_entry('Network.loadingFailed', {'requestId': '3', 'errorText': 'net::ERR_FAILED'}),
+            log_entry('Network.requestWillBeSent',
+                      {'requestId': '4', 'type': 'Image', 'request': {'url': 'data:image/png;base64,AAAA'}}),
+            log_entry('Page.loadEventFired', {'timestamp': 1}),
+        ])
+
+        self.assertEqual(stats.to_dict(), {
+            'requests': 4,
+            'bytes': 1500,
+            'failed_requests': 1,
+            'third_party_hosts': ['tracker.example.net'],
+            'bytes_by_type': {'Document': 1000, 'Image': 500},
+        })
+
+    def test_prefilter(self):
+        stats = NetworkStats('https://www.example.com/')
+        decoded = []
+        stats.add_event = lambda method, params: decoded.append(method)
+        stats.add_log_entries([
+            log_entry('Network.requestWillBeSentExtraInfo', {'requestId': '1'}),
+            log_entry('Network.requestWillBeSent', {'requestId': '1'}),
+        ])
+
+        # the ExtraInfo entry isn't even decoded
+        self.assertEqual(decoded, ['Network.requestWillBeSent'])
+
+    def test_empty(self):
+        stats = NetworkStats('https://example.com/')
+        stats.add_log_entries([])
+        self.assertEqual(stats.to_dict(), {
+            'requests': 0,
+            'bytes': 0,
+            'failed_requests': 0,
+            'third_party_hosts': [],
+            'bytes_by_type': {},
+        })
+
+    def test_third_party(self):
+        stats = NetworkStats('https://www.example.com/')
+        self.assertFalse(stats.is_third_party('example.com'))
+        self.assertFalse(stats.is_third_party('www.example.com'))
+        self.assertFalse(stats.is_third_party('static.example.com'))
+        self.assertTrue(stats.is_third_party('fonts.googleapis.com'))
+        self.assertTrue(stats.is_third_party('notexample.com'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,22 +1,197 @@
 """
 This check downloads the HTML page for each URL
+
+Each page's content is hashed (see content_hash), so that identical
+pages can be recognized without comparing the content itself.
+
+Pages not downloaded within the time budget are removed from
+config.urls and left out of the results.
+
+Pages are requested conditionally if they are in config.http_cache
+(see checks/http_cache.py), so unchanged pages aren't downloaded again.
+
+If url_reachability has fetched a page with a GET request already
+(see config.reachability_method), that response is used instead of
+requesting the page again.
+
+Bodies are streamed and read up to MAX_CONTENT_BYTES only. Responses
+with a content type other than text or XHTML aren't read at all, their
+content is None. Bodies are decoded once, and the raw bytes are
+registered in config.documents along with the text.
 """
 
+import codecs
+import hashlib
 import logging
 
 import requests
+from requests.compat import chardet
 
+from checks import http_cache
 from checks.abstract_checker import AbstractChecker
 
 
+def content_hash(content):
+    """
+    Returns the SHA-256 hex digest of the content with whitespace
+    normalized, so that pages differing only in whitespace get the
+    same hash.
+    """
+    normalized = " ".join(content.split())
+    return hashlib.sha256(normalized.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def fetch_page(config, url, timeout, max_content_bytes, prefetch=False):
+    """
+    Downloads url with a GET request, following redirects, via the HTTP
+    session and cache of config. Returns the requests.Response (already
+    closed) and the page as a dict with these keys:
+
+    - url: the URL after redirects
+    - status_code
+    - headers: dict with lowercase keys
+    - content_type: without parameters, or None
+    - body: up to max_content_bytes of the body (bytes), or None
+      if the content type doesn't allow for an HTML page
+    - truncated: whether the body was cut at max_content_bytes
+    - encoding: from the headers, or None if unknown
+    - duration: time until the response arrived (ms)
+
+    With prefetch=True, the body is only read if the URL after redirects
+    hasn't been claimed for prefetching by another call yet (see
+    Config.claim_prefetch). Otherwise, the page is None.
+    """
+    cached = config.http_cache.get(url)
+    r = config.http_session.get(url,
+                                headers=http_cache.conditional_headers(cached),
+                                stream=True,
+                                timeout=timeout)
+
+    page = {
+        'url': r.url,
+        'status_code': r.status_code,
+        'headers': get_headers(r.headers),
+        'content_type': None,
+        'body': None,
+        'truncated': False,
+        'encoding': r.encoding,
+        'duration': round(r.elapsed.total_seconds() * 1000),
+    }
+
+    if r.status_code == 304 and cached is not None:
+        logging.debug("Page %s not modified, using cached content" % url)
+        r.close()
+        page['url'] = cached['url']
+        page['status_code'] = cached['status_code']
+        page['headers'] = cached['headers']
+        page['body'] = http_cache.entry_content(cached)
+        page['encoding'] = cached['encoding']
+
+    if page['headers'].get("content-type") is not None:
+        page['content_type'] = page['headers'].get("content-type").split(";")[0].strip()
+
+    if page['body'] is None:
+        if not is_text_content_type(page['content_type']):
+            logging.info("Not reading %s, content type is %s" % (url, page['content_type']))
+            r.close()
+        elif prefetch and not config.claim_prefetch(page['url']):
+            logging.debug("Not reading %s, %s is fetched already" % (url, page['url']))
+            r.close()
+            return r, None
+        else:
+            page['body'], page['truncated'] = read_body(r, max_content_bytes)
+            if not page['truncated']:
+                # the cache only holds complete pages
+                config.http_cache.put(url, http_cache.make_entry(r, page['body'], page['encoding']))
+
+    return r, page
+
+
+def read_body(response, max_content_bytes):
+    """
+    Reads the body of a streamed response, up to max_content_bytes.
+    Returns the body and whether it was cut there.
+    """
+    chunks = []
+    size = 0
+    truncated = False
+    try:
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > max_content_bytes:
+                logging.warning("Content of %s exceeds %s bytes, ignoring the rest" %
+                                (response.url, max_content_bytes))
+                truncated = True
+                break
+    finally:
+        response.close()
+
+    return b''.join(chunks)[:max_content_bytes], truncated
+
+
+def get_headers(headers):
+    """
+    Transforms CaseInsensitiveDict into dict with lowercase keys
+    """
+    out = {}
+    for key in headers:
+        out[key.lower()] = headers[key]
+    return out
+
+
+def is_text_content_type(content_type):
+    """
+    Returns True if a response with this content type (without
+    parameters, may be None) can be an HTML page.
+    """
+    if content_type is None:
+        return True
+    content_type = content_type.lower()
+    return content_type.startswith('text/') or content_type == 'application/xhtml+xml'
+
+
+def decode(body, encoding, truncated=False):
+    """
+    Decodes body (bytes) like requests.Response.text does. If encoding
+    is None, it is detected from the body. If the body is truncated,
+    a partial multi-byte character at its end is left out.
+
+    Returns the text and the encoding, which is None if the body didn't
+    decode without errors.
+    """
+    if encoding is None:
+        encoding = chardet.detect(body)['encoding'] or 'utf-8'
+
+    try:
+        if truncated:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            return decoder.decode(body, final=False), encoding
+        return str(body, encoding), encoding
+    except UnicodeDecodeError:
+        return str(body, encoding, errors='replace'), None
+    except LookupError:
+        # unknown encoding name
+        return str(body, 'utf-8', errors='replace'), None
+
+
 class Checker(AbstractChecker):
 
+    modifies_urls = True
+
+    # maximum duration of the check (seconds)
+    max_duration = 180
+
     # connection timeout (seconds)
     CONNECT_TIMEOUT = 10
 
     # response timeout (seconds)
     READ_TIMEOUT = 20
 
+    # maximum number of bytes read from a response body, the rest
+    # is ignored
+    MAX_CONTENT_BYTES = 10 * 1024 * 1024
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
 
@@ -24,21 +199,25 @@ class Checker(AbstractChecker):
     def run(self):
         results = {}
 
-        self.headers = {
-            "User-Agent": self.config.user_agent,
-        }
-
         # copy URLs, as we may be manipulating self.config.urls in the loop
-        url = list(self.config.urls)
+        urls = list(self.config.urls)
+
+        for url, result in zip(urls, self.map_urls(self.download_page, urls)):
+            if result is None:
+                # skipped, as the time budget is used up
+                self.config.remove_url(url)
+                continue
 
-        for url in self.config.urls:
-            result = self.download_page(url)
             results[url] = result
 
             # remove bad URLs from config, to avoid later checks using them
             if 'exception' in result and result['exception'] is not None:
                 self.config.remove_url(url)
-        
+
+        # Pages prefetched for URLs removed by other checks in the
+        # meantime (e.g. url_canonicalization) won't be used any more
+        self.config.clear_prefetched_pages()
+
         return results
 
 
@@ -48,6 +227,8 @@ class Checker(AbstractChecker):
             'content': None,
             'content_type': None,
             'content_length': None,
+            'content_hash': None,
+            'content_truncated': False,
             'status_code': None,
             'response_headers': None,
             'duration': None,
@@ -55,19 +236,26 @@ class Checker(AbstractChecker):
         }
 
         try:
-            r = requests.get(url,
-                             headers=self.headers,
-                             timeout=(self.CONNECT_TIMEOUT, self.READ_TIMEOUT))
-            
-            result['url'] = r.url
-            result['status_code'] = r.status_code
-            result['content'] = r.text
-            result['content_length'] = len(r.text)
-            result['response_headers'] = self.get_headers(r.headers)
-            result['duration'] = round(r.elapsed.total_seconds() * 1000)
-
-            if r.headers.get("content-type") is not None:
-                result['content_type'] = r.headers.get("content-type").split(";")[0].strip()
+            # url_reachability may have fetched the page already
+            page = self.config.pop_prefetched_page(url)
+            if page is None:
+                _, page = fetch_page(self.config, url,
+                                     self.budget.timeout((self.CONNECT_TIMEOUT, self.READ_TIMEOUT)),
+                                     self.MAX_CONTENT_BYTES)
+
+            result['url'] = page['url']
+            result['status_code'] = page['status_code']
+            result['response_headers'] = page['headers']
+            result['content_type'] = page['content_type']
+            result['duration'] = page['duration']
+
+            if page['body'] is not None:
+                text, valid_encoding = decode(page['body'], page['encoding'], page['truncated'])
+                result['content'] = text
+                result['content_truncated'] = page['truncated']
+                result['content_length'] = len(text)
+                result['content_hash'] = content_hash(text)
+                self.config.documents.add(url, text, raw=page['body'], encoding=valid_encoding)
 
         except requests.exceptions.ConnectionError as exc:
             logging.error(str(exc) + " " + url)
@@ -83,12 +271,3 @@ class Checker(AbstractChecker):
             result['exception'] = "%s %s" % (str(type(exc)), exc)
         
         return result
-    
-    def get_headers(self, headers):
-        """
-        Transforms CaseInsensitiveDict into dict with lowercase keys
-        """
-        out = {}
-        for key in headers:
-            out[key.lower()] = headers[key]
-        return out
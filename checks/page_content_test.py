@@ -0,0 +1,130 @@
+import httpretty
+from httpretty import httprettified
+import tempfile
+import unittest
+
+from checks import http_cache
+from checks import page_content
+from checks.config import Config
+
+
+@httprettified
+class TestPageContent(unittest.TestCase):
+
+    def test_content_hash(self):
+        url1 = 'http://example.com/'
+        httpretty.register_uri(httpretty.GET, url1,
+            body="<html>\n  <body><p>Hello</p></body>\n</html>\n")
+
+        url2 = 'http://www.example.com/'
+        httpretty.register_uri(httpretty.GET, url2,
+            body="<html> <body><p>Hello</p></body> </html>")
+
+        config = Config(urls=[url1, url2])
+        checker = page_content.Checker(config=config, previous_results={})
+        result = checker.run()
+
+        self.assertIsNotNone(result[url1]['content_hash'])
+        self.assertEqual(result[url1]['content_hash'], result[url2]['content_hash'])
+
+    def test_conditional_request(self):
+        url = 'http://example.com/'
+        body = "<html><body><p>Hello</p></body></html>"
+
+        def respond(request, uri, response_headers):
+            response_headers['ETag'] = '"v1"'
+            if request.headers.get('If-None-Match') == '"v1"':
+                return [304, response_headers, '']
+            return [200, response_headers, body]
+
+        httpretty.register_uri(httpretty.GET, url, body=respond)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            results = []
+            for _ in range(2):
+                config = Config(urls=[url], http_cache=http_cache.DiskCache(tmpdir))
+                checker = page_content.Checker(config=config, previous_results={})
+                results.append(checker.run()[url])
+
+        self.assertNotIn('If-None-Match', httpretty.latest_requests()[0].headers)
+        self.assertEqual(httpretty.last_request().headers['If-None-Match'], '"v1"')
+        self.assertEqual(results[1]['status_code'], 200)
+        self.assertEqual(results[1]['content'], body)
+        self.assertEqual(results[1]['content_hash'], results[0]['content_hash'])
+        self.assertEqual(results[1]['response_headers']['etag'], '"v1"')
+
+    def test_content_type(self):
+        url1 = 'http://example.com/'
+        httpretty.register_uri(httpretty.GET, url1, body=b'%PDF-1.4',
+                               adding_headers={'Content-Type': 'application/pdf'})
+        url2 = 'http://www.example.com/'
+        httpretty.register_uri(httpretty.GET, url2, body='<p>Hello</p>',
+                               adding_headers={'Content-Type': 'application/xhtml+xml; charset=utf-8'})
+
+        config = Config(urls=[url1, url2])
+        result = page_content.Checker(config=config, previous_results={}).run()
+
+        self.assertIsNone(result[url1]['content'])
+        self.assertEqual(result[url1]['content_type'], 'application/pdf')
+        self.assertIsNone(result[url1]['exception'])
+        self.assertIsNone(config.documents.get(url1))
+        self.assertEqual(result[url2]['content'], '<p>Hello</p>')
+
+    def test_max_content_bytes(self):
+        url = 'http://example.com/'
+        httpretty.register_uri(httpretty.GET, url, body='<p>' + 'x' * 1000 + '</p>')
+
+        config = Config(urls=[url])
+        checker = page_content.Checker(config=config, previous_results={})
+        checker.MAX_CONTENT_BYTES = 100
+        result = checker.run()
+
+        self.assertEqual(result[url]['content'], '<p>' + 'x' * 97)
+        self.assertEqual(result[url]['content_length'], 100)
+        self.assertTrue(result[url]['content_truncated'])
+
+    def test_truncated_multibyte(self):
+        url = 'http://example.com/'
+        httpretty.register_uri(httpretty.GET, url, body='<p>' + 'ü' * 100 + '</p>',
+                               adding_headers={'Content-Type': 'text/html; charset=utf-8',
+                                               'ETag': '"v1"'})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = Config(urls=[url], http_cache=http_cache.DiskCache(tmpdir))
+            checker = page_content.Checker(config=config, previous_results={})
+            checker.MAX_CONTENT_BYTES = 100
+            result = checker.run()
+
+            # truncated pages aren't cached
+            self.assertIsNone(config.http_cache.get(url))
+
+        # the partial character at the end is left out
+        self.assertEqual(result[url]['content'], '<p>' + 'ü' * 48)
+        self.assertTrue(result[url]['content_truncated'])
+        self.assertEqual(config.documents.get_source(url)[1], 'utf-8')
+
+    def test_decoding(self):
+        url = 'http://example.com/'
+        body = '<html><body><p>Grüße</p></body></html>'.encode('utf-8')
+        httpretty.register_uri(httpretty.GET, url, body=body,
+                               adding_headers={'Content-Type': 'text/html; charset=UTF-8'})
+
+        config = Config(urls=[url])
+        result = page_content.Checker(config=config, previous_results={}).run()
+
+        self.assertIn('Grüße', result[url]['content'])
+        self.assertEqual(config.documents.get_source(url), (body, 'UTF-8'))
+
+    def test_decode(self):
+        self.assertEqual(page_content.decode(b'Gr\xfcn', 'iso-8859-1'), ('Grün', 'iso-8859-1'))
+        self.assertEqual(page_content.decode(b'Gr\xfcn', 'utf-8'), ('Gr\ufffdn', None))
+        self.assertEqual(page_content.decode(b'Gr\xfcn', 'no-such-encoding'), ('Gr\ufffdn', None))
+        self.assertEqual(page_content.decode('Grün'.encode('utf-8')[:3], 'utf-8', truncated=True), ('Gr', 'utf-8'))
+
+    def test_content_hash_differs(self):
+        self.assertNotEqual(page_content.content_hash('<p>Hello</p>'),
+                            page_content.content_hash('<p>Hallo</p>'))
+
+
+if __name__ == '__main__':
+    unittest.main()
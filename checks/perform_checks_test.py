@@ -0,0 +1,58 @@
+import unittest
+from types import SimpleNamespace
+
+import checks
+from checks.abstract_checker import AbstractChecker
+
+
+def make_check(depends_on=None, modifies=False):
+    class Checker(AbstractChecker):
+        depends_on_checks = depends_on or []
+        modifies_urls = modifies
+
+    return SimpleNamespace(Checker=Checker)
+
+
+class TestCheckPrerequisites(unittest.TestCase):
+
+    def test_independent_checks_wait_for_url_modification_only(self):
+        check_modules = [
+            ('expand', make_check(modifies=True)),
+            ('download', make_check(modifies=True)),
+            ('a', make_check(depends_on=['download'])),
+            ('b', make_check(depends_on=['download'])),
+            ('c', make_check(depends_on=['a'])),
+        ]
+
+        prerequisites = checks.check_prerequisites(check_modules)
+
+        self.assertEqual(prerequisites['expand'], set())
+        self.assertEqual(prerequisites['download'], {'expand'})
+        self.assertEqual(prerequisites['a'], {'download'})
+        self.assertEqual(prerequisites['b'], {'download'})
+        self.assertEqual(prerequisites['c'], {'a', 'download'})
+
+    def test_modifying_check_waits_for_all_preceding(self):
+        check_modules = [
+            ('expand', make_check(modifies=True)),
+            ('a', make_check()),
+            ('b', make_check()),
+            ('reduce', make_check(modifies=True)),
+        ]
+
+        prerequisites = checks.check_prerequisites(check_modules)
+
+        self.assertEqual(prerequisites['reduce'], {'expand', 'a', 'b'})
+
+    def test_dependency_must_precede(self):
+        check_modules = [
+            ('a', make_check(depends_on=['b'])),
+            ('b', make_check()),
+        ]
+
+        with self.assertRaises(ValueError):
+            checks.check_prerequisites(check_modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
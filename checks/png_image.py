@@ -0,0 +1,193 @@
+"""
+Pure Python handling of PNG screenshots, so we don't depend on an
+image library.
+
+- optimize_png() recompresses an image losslessly at the highest
+  zlib level (browsers favour speed when encoding screenshots)
+- difference_hash() computes a perceptual hash, to tell whether a page
+  looks the same as on the previous run
+
+We use the difference hash (dHash): the image is scaled down to 9x8
+grayscale pixels, and each bit of the 64 bit hash tells whether a pixel
+is brighter than its right neighbour. Small rendering differences
+don't change the hash, visible changes to the page do.
+
+The decoder only handles the kind of PNG files Chromium produces
+(8 bit grayscale, RGB or RGBA, not interlaced). Images to hash should
+be small, e.g. captured at a reduced scale, as decoding is slow.
+"""
+
+import struct
+import zlib
+
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Number of channels by PNG color type
+CHANNELS = {
+    0: 1,  # grayscale
+    2: 3,  # RGB
+    4: 2,  # grayscale with alpha
+    6: 4,  # RGBA
+}
+
+HASH_WIDTH = 9
+HASH_HEIGHT = 8
+
+
+def read_chunks(data):
+    """Yields the (type, data) tuples of the chunks of a PNG image"""
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("Not a PNG image")
+
+    pos = len(PNG_SIGNATURE)
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        yield chunk_type, data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if chunk_type == b'IEND':
+            break
+
+
+def write_chunk(chunk_type, chunk):
+    checksum = zlib.crc32(chunk_type + chunk) & 0xffffffff
+    return struct.pack('>I', len(chunk)) + chunk_type + chunk + struct.pack('>I', checksum)
+
+
+def optimize_png(data):
+    """
+    Returns the PNG image data with its pixel data recompressed at the
+    highest zlib level, dropping ancillary chunks. Returns data unchanged
+    if that doesn't make it smaller.
+    """
+    chunks = []
+    compressed = []
+    for chunk_type, chunk in read_chunks(data):
+        if chunk_type == b'IDAT':
+            compressed.append(chunk)
+        elif chunk_type in (b'IHDR', b'PLTE', b'tRNS', b'IEND'):
+            chunks.append((chunk_type, chunk))
+
+    pixel_data = zlib.compress(zlib.decompress(b''.join(compressed)), 9)
+
+    result = [PNG_SIGNATURE]
+    for chunk_type, chunk in chunks:
+        if chunk_type == b'IEND':
+            result.append(write_chunk(b'IDAT', pixel_data))
+        result.append(write_chunk(chunk_type, chunk))
+    result = b''.join(result)
+
+    if len(result) >= len(data):
+        return data
+    return result
+
+
+def decode_png(data):
+    """
+    Decodes a PNG image. Returns width, height and the rows of
+    grayscale pixel values (0-255).
+    """
+    header = None
+    compressed = []
+    for chunk_type, chunk in read_chunks(data):
+        if chunk_type == b'IHDR':
+            header = struct.unpack('>IIBBBBB', chunk)
+        elif chunk_type == b'IDAT':
+            compressed.append(chunk)
+
+    if header is None:
+        raise ValueError("PNG image without header")
+
+    width, height, bit_depth, color_type, _, _, interlace = header
+    if bit_depth != 8 or color_type not in CHANNELS or interlace != 0:
+        raise ValueError("Unsupported PNG format (bit depth %s, color type %s, interlace %s)" %
+                         (bit_depth, color_type, interlace))
+
+    channels = CHANNELS[color_type]
+    raw = zlib.decompress(b''.join(compressed))
+    stride = width * channels
+
+    rows = []
+    previous = bytearray(stride)
+    for y in range(height):
+        offset = y * (stride + 1)
+        filter_type = raw[offset]
+        line = unfilter(filter_type, bytearray(raw[offset + 1:offset + 1 + stride]), previous, channels)
+        previous = line
+
+        if channels < 3:
+            rows.append(list(line[::channels]))
+        else:
+            # ITU-R 601 luma
+            rows.append([(299 * line[i] + 587 * line[i + 1] + 114 * line[i + 2]) // 1000
+                         for i in range(0, stride, channels)])
+
+    return width, height, rows
+
+
+def unfilter(filter_type, line, previous, bpp):
+    """Reverses the PNG filter of one line, given the previous (unfiltered) line"""
+    if filter_type == 0:
+        return line
+    if filter_type == 1:
+        for i in range(bpp, len(line)):
+            line[i] = (line[i] + line[i - bpp]) & 0xff
+    elif filter_type == 2:
+        for i in range(len(line)):
+            line[i] = (line[i] + previous[i]) & 0xff
+    elif filter_type == 3:
+        for i in range(len(line)):
+            left = line[i - bpp] if i >= bpp else 0
+            line[i] = (line[i] + ((left + previous[i]) >> 1)) & 0xff
+    elif filter_type == 4:
+        for i in range(len(line)):
+            left = line[i - bpp] if i >= bpp else 0
+            up = previous[i]
+            up_left = previous[i - bpp] if i >= bpp else 0
+            line[i] = (line[i] + paeth(left, up, up_left)) & 0xff
+    else:
+        raise ValueError("Unknown PNG filter type %s" % filter_type)
+    return line
+
+
+def paeth(a, b, c):
+    p = a + b - c
+    pa = abs(p - a)
+    pb = abs(p - b)
+    pc = abs(p - c)
+    if pa <= pb and pa <= pc:
+        return a
+    if pb <= pc:
+        return b
+    return c
+
+
+def resize(rows, width, height, new_width, new_height):
+    """Scales grayscale rows to new_width x new_height by averaging areas"""
+    result = []
+    for y in range(new_height):
+        y0 = y * height // new_height
+        y1 = max((y + 1) * height // new_height, y0 + 1)
+        line = []
+        for x in range(new_width):
+            x0 = x * width // new_width
+            x1 = max((x + 1) * width // new_width, x0 + 1)
+            total = 0
+            for row in rows[y0:y1]:
+                total += sum(row[x0:x1])
+            line.append(total / ((y1 - y0) * (x1 - x0)))
+        result.append(line)
+    return result
+
+
+def difference_hash(png_data):
+    """Returns the dHash of a PNG image as a hex string of 16 characters"""
+    width, height, rows = decode_png(png_data)
+    pixels = resize(rows, width, height, HASH_WIDTH, HASH_HEIGHT)
+
+    value = 0
+    for row in pixels:
+        for x in range(HASH_WIDTH - 1):
+            value = (value << 1) | (row[x] > row[x + 1])
+
+    return '%016x' % value
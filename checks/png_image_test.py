@@ -0,0 +1,113 @@
+import struct
+import unittest
+import zlib
+
+from checks import png_image
+
+
+def encode_png(rows, color_type=0, filter_type=0, level=1):
+    """
+    Encodes rows of byte values (one value per channel) as PNG,
+    applying the given filter to every line.
+    """
+    channels = png_image.CHANNELS[color_type]
+    height = len(rows)
+    width = len(rows[0]) // channels
+
+    raw = bytearray()
+    previous = bytes(len(rows[0]))
+    for row in rows:
+        line = bytes(row)
+        raw.append(filter_type)
+        if filter_type == 0:
+            raw.extend(line)
+        elif filter_type == 1:
+            raw.extend((line[i] - (line[i - channels] if i >= channels else 0)) & 0xff
+                       for i in range(len(line)))
+        elif filter_type == 2:
+            raw.extend((line[i] - previous[i]) & 0xff for i in range(len(line)))
+        elif filter_type == 3:
+            raw.extend((line[i] - (((line[i - channels] if i >= channels else 0) + previous[i]) >> 1)) & 0xff
+                       for i in range(len(line)))
+        elif filter_type == 4:
+            raw.extend((line[i] - png_image.paeth(line[i - channels] if i >= channels else 0,
+                                                  previous[i],
+                                                  previous[i - channels] if i >= channels else 0)) & 0xff
+                       for i in range(len(line)))
+        previous = line
+
+    header = struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)
+    return b''.join([
+        png_image.PNG_SIGNATURE,
+        png_image.write_chunk(b'IHDR', header),
+        png_image.write_chunk(b'tEXt', b'Comment\x00test'),
+        png_image.write_chunk(b'IDAT', zlib.compress(bytes(raw), level)),
+        png_image.write_chunk(b'IEND', b''),
+    ])
+
+
+def gradient(width, height):
+    """Grayscale rows getting brighter from left to right"""
+    return [[(x * 255 // (width - 1)) for x in range(width)] for _ in range(height)]
+
+
+class TestDecodePNG(unittest.TestCase):
+
+    def test_filters(self):
+        rows = [[(x * 7 + y * 13) % 256 for x in range(24)] for y in range(5)]
+        for filter_type in range(5):
+            with self.subTest(filter_type=filter_type):
+                width, height, decoded = png_image.decode_png(encode_png(rows, 0, filter_type))
+                self.assertEqual((width, height), (24, 5))
+                self.assertEqual(decoded, rows)
+
+    def test_rgba(self):
+        rows = [[255, 255, 255, 255, 0, 0, 0, 255, 255, 0, 0, 128]]
+        width, height, decoded = png_image.decode_png(encode_png(rows, 6, 4))
+        self.assertEqual((width, height), (3, 1))
+        self.assertEqual(decoded, [[255, 0, 76]])
+
+    def test_not_png(self):
+        with self.assertRaises(ValueError):
+            png_image.decode_png(b'RIFF\x00\x00\x00\x00WEBP')
+
+
+class TestOptimizePNG(unittest.TestCase):
+
+    def test_lossless(self):
+        rows = [[(x // 4 * 16) % 256 for x in range(300)] for _ in range(40)]
+        data = encode_png(rows, 0, 1, level=0)
+        optimized = png_image.optimize_png(data)
+
+        self.assertLess(len(optimized), len(data))
+        self.assertNotIn(b'tEXt', optimized)
+        self.assertEqual(png_image.decode_png(optimized), png_image.decode_png(data))
+
+    def test_no_gain(self):
+        data = encode_png([[0]], level=9)
+        data = png_image.optimize_png(data)
+        self.assertIs(png_image.optimize_png(data), data)
+
+
+class TestDifferenceHash(unittest.TestCase):
+
+    def test_hash(self):
+        # each pixel darker than its right neighbour
+        self.assertEqual(png_image.difference_hash(encode_png(gradient(36, 16))), '0000000000000000')
+
+        # each pixel brighter than its right neighbour
+        rows = [list(reversed(row)) for row in gradient(36, 16)]
+        self.assertEqual(png_image.difference_hash(encode_png(rows)), 'ffffffffffffffff')
+
+    def test_similar_images(self):
+        rows = [[(x * y) % 251 for x in range(45)] for y in range(40)]
+        brighter = [[min(value + 3, 255) for value in row] for row in rows]
+        other = [[(x + y * 17) % 251 for x in range(45)] for y in range(40)]
+
+        phash = png_image.difference_hash(encode_png(rows))
+        self.assertEqual(png_image.difference_hash(encode_png(brighter, filter_type=2)), phash)
+        self.assertNotEqual(png_image.difference_hash(encode_png(other)), phash)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,321 @@
+"""
+Storage for the screenshots taken by load_in_browser.
+
+A storage keeps image files and a metadata record per screenshot.
+There are two implementations:
+
+- CloudStorage: files in a Google Cloud Storage bucket, metadata in
+  Google Cloud Datastore (used in production)
+- LocalStorage: files and metadata in a local folder (for development
+  and tests)
+
+UploadQueue uploads screenshots in the background while the browser
+goes on rendering, and writes all metadata in one batch at the end.
+Screenshots whose perceptual hash ('phash' in the metadata) equals the
+one stored for the same screenshot_url are not uploaded again, only
+their 'created' time is updated. The stored metadata can be read in
+one batch beforehand (see UploadQueue.load_metadata()).
+"""
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+
+from google.cloud import datastore
+from google.cloud import storage
+
+
+class ScreenshotStorage(object):
+    """
+    Interface of screenshot storages.
+    """
+
+    def url(self, path):
+        """Returns the public URL of the file at path"""
+        raise NotImplementedError()
+
+    def upload(self, path, data, content_type):
+        """Stores data (bytes) as the file at path"""
+        raise NotImplementedError()
+
+    def put_metadata(self, records):
+        """Stores a list of metadata dicts, each keyed by its 'screenshot_url'"""
+        raise NotImplementedError()
+
+    def get_metadata(self, screenshot_url):
+        """Returns the metadata dict stored for screenshot_url, or None"""
+        raise NotImplementedError()
+
+    def get_metadata_multi(self, screenshot_urls):
+        """
+        Returns the metadata dicts stored for a list of screenshot URLs,
+        as a dict keyed by screenshot URL. URLs without metadata are
+        left out.
+        """
+        raise NotImplementedError()
+
+
+class CloudStorage(ScreenshotStorage):
+    """
+    Stores files in a Cloud Storage bucket and metadata in Datastore.
+    Clients are created on first use.
+    """
+
+    # Datastore allows at most this many entities per commit
+    # (and 1000 per lookup)
+    MAX_BATCH_SIZE = 500
+
+    exclude_from_indexes = ['size', 'screenshot_url', 'user_agent', 'phash']
+
+    def __init__(self, bucket_name, datastore_kind, storage_credentials_path,
+                 datastore_credentials_path):
+        self._bucket_name = bucket_name
+        self._datastore_kind = datastore_kind
+        self._storage_credentials_path = storage_credentials_path
+        self._datastore_credentials_path = datastore_credentials_path
+        self._bucket = None
+        self._datastore_client = None
+        self._lock = threading.Lock()
+
+    def _get_bucket(self):
+        with self._lock:
+            if self._bucket is None:
+                storage_client = storage.Client.from_service_account_json(self._storage_credentials_path)
+                self._bucket = storage_client.bucket(self._bucket_name)
+            return self._bucket
+
+    def _get_datastore_client(self):
+        with self._lock:
+            if self._datastore_client is None:
+                self._datastore_client = datastore.Client.from_service_account_json(self._datastore_credentials_path)
+            return self._datastore_client
+
+    def url(self, path):
+        return 'http://%s/%s' % (self._bucket_name, path)
+
+    def upload(self, path, data, content_type):
+        blob = self._get_bucket().blob(path)
+        # make the file public with the upload, saving a request
+        blob.upload_from_string(data, content_type=content_type, predefined_acl='publicRead')
+
+    def put_metadata(self, records):
+        client = self._get_datastore_client()
+        entities = []
+        for record in records:
+            key = client.key(self._datastore_kind, record['screenshot_url'])
+            entity = datastore.Entity(key=key, exclude_from_indexes=self.exclude_from_indexes)
+            entity.update(record)
+            entities.append(entity)
+
+        for start in range(0, len(entities), self.MAX_BATCH_SIZE):
+            client.put_multi(entities[start:start + self.MAX_BATCH_SIZE])
+
+    def get_metadata(self, screenshot_url):
+        client = self._get_datastore_client()
+        entity = client.get(client.key(self._datastore_kind, screenshot_url))
+        if entity is None:
+            return None
+        return dict(entity)
+
+    def get_metadata_multi(self, screenshot_urls):
+        client = self._get_datastore_client()
+        keys = [client.key(self._datastore_kind, screenshot_url) for screenshot_url in screenshot_urls]
+        metadata = {}
+        for start in range(0, len(keys), self.MAX_BATCH_SIZE):
+            for entity in client.get_multi(keys[start:start + self.MAX_BATCH_SIZE]):
+                metadata[entity.key.name] = dict(entity)
+        return metadata
+
+
+class LocalStorage(ScreenshotStorage):
+    """
+    Stores files in a local folder. Metadata records are appended to
+    the file metadata.jsonl in that folder, one JSON object per line.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._lock = threading.Lock()
+
+    @property
+    def metadata_path(self):
+        return os.path.join(self._path, 'metadata.jsonl')
+
+    def url(self, path):
+        return 'file://%s' % os.path.join(os.path.abspath(self._path), path)
+
+    def upload(self, path, data, content_type):
+        filename = os.path.join(self._path, path)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+    def put_metadata(self, records):
+        with self._lock:
+            os.makedirs(self._path, exist_ok=True)
+            with open(self.metadata_path, 'a', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record, default=str) + '\n')
+
+    def get_metadata(self, screenshot_url):
+        return self.get_metadata_multi([screenshot_url]).get(screenshot_url)
+
+    def get_metadata_multi(self, screenshot_urls):
+        # the last record for a screenshot_url is the current one
+        screenshot_urls = set(screenshot_urls)
+        metadata = {}
+        with self._lock:
+            if not os.path.exists(self.metadata_path):
+                return metadata
+            with open(self.metadata_path, encoding='utf-8') as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record['screenshot_url'] in screenshot_urls:
+                        metadata[record['screenshot_url']] = record
+        return metadata
+
+
+class UploadQueue(object):
+    """
+    Uploads files to a ScreenshotStorage concurrently. Metadata of
+    successful uploads is stored in one batch by finish().
+
+    Uploads are skipped if the metadata has a 'phash' that equals the
+    one stored for the screenshot_url, i.e. the page looks the same as
+    when the stored screenshot was taken. The stored metadata then
+    only gets the new 'created' time.
+    """
+
+    def __init__(self, screenshot_storage, max_workers=4):
+        self._storage = screenshot_storage
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._futures = []
+        self._metadata = []
+        # screenshot_urls of the successful uploads
+        self._uploaded = set()
+        self._skipped = 0
+        self._lock = threading.Lock()
+
+        # Stored metadata read by load_metadata(), by screenshot_url.
+        # None for URLs without metadata.
+        self._previous = {}
+
+    @property
+    def storage(self):
+        return self._storage
+
+    @property
+    def skipped(self):
+        """Number of screenshots not uploaded as they were unchanged"""
+        with self._lock:
+            return self._skipped
+
+    def submit(self, path, data, content_type, metadata, encode=None):
+        """
+        Starts uploading data as the file at path. metadata is stored
+        once the upload has succeeded.
+
+        encode is an optional function applied to data before the
+        upload, in the upload thread, e.g. to compress it.
+        """
+        future = self._executor.submit(self._upload, path, data, content_type, metadata, encode)
+        with self._lock:
+            self._futures.append(future)
+        return future
+
+    def load_metadata(self, screenshot_urls):
+        """
+        Reads the stored metadata for the given screenshot URLs in one
+        batch, for the screenshots to be submitted. Otherwise, it is
+        read for each screenshot separately.
+        """
+        try:
+            stored = self._storage.get_metadata_multi(screenshot_urls)
+        except Exception as e:
+            logging.warning("Error reading metadata of %s screenshots: %s" % (len(screenshot_urls), e))
+            return
+
+        with self._lock:
+            for screenshot_url in screenshot_urls:
+                self._previous[screenshot_url] = stored.get(screenshot_url)
+
+    def previous_metadata(self, screenshot_url):
+        """Returns the metadata stored for screenshot_url, or None"""
+        with self._lock:
+            if screenshot_url in self._previous:
+                return self._previous[screenshot_url]
+
+        try:
+            return self._storage.get_metadata(screenshot_url)
+        except Exception as e:
+            logging.warning("Error reading metadata of screenshot %s: %s" % (screenshot_url, e))
+            return None
+
+    def unchanged_metadata(self, metadata):
+        """
+        Returns the stored metadata for metadata['screenshot_url'] if
+        the stored screenshot has the same perceptual hash as metadata,
+        with the 'created' time of metadata. Returns None otherwise.
+        """
+        phash = metadata.get('phash')
+        if phash is None:
+            return None
+
+        previous = self.previous_metadata(metadata['screenshot_url'])
+        if previous is None or previous.get('phash') != phash:
+            return None
+
+        previous = dict(previous)
+        previous['created'] = metadata['created']
+        return previous
+
+    def _upload(self, path, data, content_type, metadata, encode):
+        unchanged = self.unchanged_metadata(metadata)
+        if unchanged is not None:
+            logging.debug("Screenshot %s is unchanged, not uploading" % path)
+            with self._lock:
+                self._skipped += 1
+                self._metadata.append(unchanged)
+            return False
+
+        try:
+            if encode is not None:
+                data = encode(data)
+            self._storage.upload(path, data, content_type)
+        except Exception as e:
+            logging.warning("Error uploading screenshot %s: %s" % (path, e))
+            return False
+
+        logging.debug("Uploaded screenshot %s" % path)
+        with self._lock:
+            self._uploaded.add(metadata['screenshot_url'])
+            self._metadata.append(metadata)
+        return True
+
+    def finish(self):
+        """
+        Waits for all uploads, then stores the metadata of the successful
+        and the skipped ones. Returns the number of successful uploads.
+        """
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures)
+        self._executor.shutdown()
+
+        # A screenshot may have been taken more than once (e.g. on
+        # retries), so keep one record per screenshot_url.
+        with self._lock:
+            metadata = list({record['screenshot_url']: record for record in self._metadata}.values())
+
+        if metadata:
+            try:
+                self._storage.put_metadata(metadata)
+                logging.debug("Stored metadata for %s screenshots" % len(metadata))
+            except Exception as e:
+                logging.warning("Error storing screenshot metadata: %s" % e)
+
+        with self._lock:
+            return len(self._uploaded)
@@ -0,0 +1,159 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime, UTC
+
+from checks.screenshot_storage import LocalStorage
+from checks.screenshot_storage import UploadQueue
+
+
+class FailingStorage(LocalStorage):
+    """Fails to upload files in the folder 'broken'"""
+
+    def upload(self, path, data, content_type):
+        if path.startswith('broken/'):
+            raise IOError("upload failed")
+        super().upload(path, data, content_type)
+
+
+class TestUploadQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def metadata(self, storage, path):
+        return {
+            'url': 'https://example.com/',
+            'size': [1024, 768],
+            'screenshot_url': storage.url(path),
+            'user_agent': 'Test/1.0',
+            'created': datetime(2024, 1, 1, tzinfo=UTC),
+        }
+
+    def read_metadata(self, storage):
+        with open(storage.metadata_path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_upload(self):
+        storage = LocalStorage(self.tmpdir.name)
+        queue = UploadQueue(storage)
+        paths = ['%sx768/abc.png' % width for width in (1024, 1500, 1920)]
+        for path in paths:
+            queue.submit(path, b'PNG ' + path.encode(), 'image/png', self.metadata(storage, path))
+
+        self.assertEqual(queue.finish(), 3)
+
+        for path in paths:
+            with open(os.path.join(self.tmpdir.name, path), 'rb') as f:
+                self.assertEqual(f.read(), b'PNG ' + path.encode())
+
+        records = self.read_metadata(storage)
+        self.assertEqual(sorted(r['screenshot_url'] for r in records),
+                         sorted(storage.url(path) for path in paths))
+        self.assertEqual(records[0]['created'], '2024-01-01 00:00:00+00:00')
+
+    def test_failed_upload(self):
+        storage = FailingStorage(self.tmpdir.name)
+        queue = UploadQueue(storage)
+        queue.submit('ok/a.png', b'a', 'image/png', self.metadata(storage, 'ok/a.png'))
+        queue.submit('broken/b.png', b'b', 'image/png', self.metadata(storage, 'broken/b.png'))
+
+        self.assertEqual(queue.finish(), 1)
+        records = self.read_metadata(storage)
+        self.assertEqual([r['screenshot_url'] for r in records], [storage.url('ok/a.png')])
+
+    def test_repeated_screenshot(self):
+        storage = LocalStorage(self.tmpdir.name)
+        queue = UploadQueue(storage)
+        for _ in range(2):
+            queue.submit('a/a.png', b'a', 'image/png', self.metadata(storage, 'a/a.png'))
+
+        self.assertEqual(queue.finish(), 1)
+        self.assertEqual(len(self.read_metadata(storage)), 1)
+
+    def test_unchanged_screenshot(self):
+        storage = LocalStorage(self.tmpdir.name)
+        previous = self.metadata(storage, 'a/a.png')
+        previous['phash'] = '0f0f0f0f0f0f0f0f'
+        storage.put_metadata([previous])
+
+        queue = UploadQueue(storage)
+        unchanged = self.metadata(storage, 'a/a.png')
+        unchanged['phash'] = '0f0f0f0f0f0f0f0f'
+        queue.submit('a/a.png', b'a', 'image/png', unchanged)
+        changed = self.metadata(storage, 'b/b.png')
+        changed['phash'] = '0f0f0f0f0f0f0f0f'
+        queue.submit('b/b.png', b'b', 'image/png', changed)
+
+        self.assertEqual(queue.finish(), 1)
+        self.assertEqual(queue.skipped, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.tmpdir.name, 'a/a.png')))
+        self.assertTrue(os.path.exists(os.path.join(self.tmpdir.name, 'b/b.png')))
+        self.assertEqual(storage.get_metadata(storage.url('b/b.png'))['phash'], '0f0f0f0f0f0f0f0f')
+
+    def test_unchanged_screenshot_created(self):
+        storage = LocalStorage(self.tmpdir.name)
+        previous = self.metadata(storage, 'a/a.png')
+        previous['phash'] = '0f0f0f0f0f0f0f0f'
+        storage.put_metadata([previous])
+
+        queue = UploadQueue(storage)
+        unchanged = self.metadata(storage, 'a/a.png')
+        unchanged['phash'] = '0f0f0f0f0f0f0f0f'
+        unchanged['created'] = datetime(2024, 2, 1, tzinfo=UTC)
+        queue.submit('a/a.png', b'a', 'image/png', unchanged)
+
+        self.assertEqual(queue.finish(), 0)
+        self.assertEqual(storage.get_metadata(storage.url('a/a.png'))['created'], '2024-02-01 00:00:00+00:00')
+
+    def test_load_metadata(self):
+        storage = LocalStorage(self.tmpdir.name)
+        previous = self.metadata(storage, 'a/a.png')
+        previous['phash'] = '0f0f0f0f0f0f0f0f'
+        storage.put_metadata([previous])
+
+        lookups = []
+        storage.get_metadata_multi = lambda urls, lookup=storage.get_metadata_multi: lookups.append(urls) or lookup(urls)
+        storage.get_metadata = lambda url: self.fail("metadata read separately")
+
+        queue = UploadQueue(storage)
+        queue.load_metadata([storage.url('a/a.png'), storage.url('b/b.png')])
+        for path in ('a/a.png', 'b/b.png'):
+            metadata = self.metadata(storage, path)
+            metadata['phash'] = '0f0f0f0f0f0f0f0f'
+            queue.submit(path, b'x', 'image/png', metadata)
+
+        self.assertEqual(queue.finish(), 1)
+        self.assertEqual(queue.skipped, 1)
+        self.assertEqual(len(lookups), 1)
+
+    def test_changed_screenshot(self):
+        storage = LocalStorage(self.tmpdir.name)
+        previous = self.metadata(storage, 'a/a.png')
+        previous['phash'] = '0f0f0f0f0f0f0f0f'
+        storage.put_metadata([previous])
+
+        queue = UploadQueue(storage)
+        metadata = self.metadata(storage, 'a/a.png')
+        metadata['phash'] = 'f0f0f0f0f0f0f0f0'
+        queue.submit('a/a.png', b'a', 'image/png', metadata, encode=lambda data: data.upper())
+
+        self.assertEqual(queue.finish(), 1)
+        self.assertEqual(queue.skipped, 0)
+        with open(os.path.join(self.tmpdir.name, 'a/a.png'), 'rb') as f:
+            self.assertEqual(f.read(), b'A')
+        self.assertEqual(storage.get_metadata(storage.url('a/a.png'))['phash'], 'f0f0f0f0f0f0f0f0')
+
+    def test_nothing_uploaded(self):
+        storage = LocalStorage(self.tmpdir.name)
+        self.assertEqual(UploadQueue(storage).finish(), 0)
+        self.assertFalse(os.path.exists(storage.metadata_path))
+        self.assertIsNone(storage.get_metadata(storage.url('a/a.png')))
+
+
+if __name__ == '__main__':
+    unittest.main()
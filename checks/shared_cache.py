@@ -0,0 +1,184 @@
+"""
+A key/value cache shared between site runs, e.g. by all workers
+processing a full directory run, to reuse results of lookups that
+don't depend on the site, like DNS answers and TLS certificates of
+shared hosting servers.
+
+Values must be JSON serializable. Each entry expires after the
+TTL (in seconds) given when it was set.
+
+Use from_url() to create a cache:
+
+- None or '' gives a cache that doesn't store anything
+- 'redis://...' or 'rediss://...' gives a cache in Redis
+- 'file:///some/path' or '/some/path' gives a cache in a local folder
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import redis
+
+from checks import cache_files
+
+
+def from_url(url):
+    """Creates a cache from a URL, as described in the module docstring"""
+    if not url:
+        return SharedCache()
+
+    parsed = urlparse(url)
+    if parsed.scheme in ('redis', 'rediss'):
+        return RedisCache(url)
+    if parsed.scheme == 'file':
+        return FileCache(parsed.path)
+    if parsed.scheme == '':
+        return FileCache(url)
+
+    raise ValueError("Unsupported shared cache URL: %s" % url)
+
+
+class SharedCache(object):
+    """
+    Base class for caches. Doesn't store anything by itself.
+    """
+
+    def get(self, key):
+        """Returns the value for key, or None if there is none"""
+        return None
+
+    def set(self, key, value, ttl):
+        """Stores value for key, to expire after ttl seconds"""
+        pass
+
+
+class FileCache(SharedCache):
+    """
+    Stores each entry as a JSON file in a local folder. The files'
+    modification times are set to their expiry, so that expired
+    entries can be removed (see prune()) without reading them.
+
+    The time of the last pruning is kept in a marker file in the folder,
+    so that set() prunes once per PRUNE_INTERVAL, not once per process.
+    """
+
+    # Seconds between removals of expired entries by set()
+    PRUNE_INTERVAL = 60 * 60
+
+    # Marker file whose modification time is the time of the last pruning
+    PRUNE_MARKER = '.last-prune'
+
+    def __init__(self, path):
+        self._path = path
+        os.makedirs(path, exist_ok=True)
+
+        # when set() is to look at the marker file next
+        self._next_prune = 0
+        self._lock = threading.Lock()
+
+    def _filename(self, key):
+        return cache_files.entry_filename(self._path, key)
+
+    def get(self, key):
+        filename = self._filename(key)
+        try:
+            with open(filename, 'r', encoding='utf-8') as cache_file:
+                entry = json.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning("Could not read cache entry %s: %s" % (filename, e))
+            return None
+
+        if entry['expires'] <= time.time():
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+            return None
+
+        return entry['value']
+
+    def set(self, key, value, ttl):
+        entry = {
+            'key': key,
+            'expires': time.time() + ttl,
+            'value': value,
+        }
+
+        try:
+            cache_files.write_json(self._filename(key), entry, mtime=entry['expires'])
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning("Could not write cache entry for %s: %s" % (key, e))
+
+        with self._lock:
+            now = time.time()
+            if now < self._next_prune:
+                return
+            last_prune, _ = cache_files.read_marker(os.path.join(self._path, self.PRUNE_MARKER))
+            if last_prune is not None and now < last_prune + self.PRUNE_INTERVAL:
+                # pruned by another process recently
+                self._next_prune = last_prune + self.PRUNE_INTERVAL
+                return
+            self._next_prune = now + self.PRUNE_INTERVAL
+        self.prune()
+
+    def prune(self):
+        """Removes all expired entries"""
+        now = time.time()
+        try:
+            cache_files.write_json(os.path.join(self._path, self.PRUNE_MARKER), {}, mtime=now)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning("Could not write cache marker: %s" % e)
+
+        removed = 0
+        with os.scandir(self._path) as entries:
+            for dir_entry in entries:
+                if not dir_entry.name.endswith('.json'):
+                    continue
+                try:
+                    if dir_entry.stat().st_mtime > now:
+                        continue
+                    os.remove(dir_entry.path)
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logging.warning("Could not remove cache entry %s: %s" % (dir_entry.path, e))
+                    continue
+                removed += 1
+
+        logging.debug("Removed %s expired cache entries" % removed)
+
+
+class RedisCache(SharedCache):
+    """
+    Stores entries in Redis, using Redis' own key expiry.
+    """
+
+    key_prefix = 'green-spider:cache:'
+
+    def __init__(self, url):
+        self._redis = redis.from_url(url)
+
+    def get(self, key):
+        try:
+            value = self._redis.get(self.key_prefix + key)
+        except redis.RedisError as e:
+            logging.warning("Could not read cache entry %s: %s" % (key, e))
+            return None
+
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        try:
+            self._redis.set(self.key_prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+        except redis.RedisError as e:
+            logging.warning("Could not write cache entry %s: %s" % (key, e))
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import time
+import unittest
+
+from checks import shared_cache
+
+
+class TestFileCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def entries(self):
+        return [name for name in os.listdir(self.tmpdir.name) if name.endswith('.json')]
+
+    def test_set_get(self):
+        cache = shared_cache.FileCache(self.tmpdir.name)
+        cache.set('dns:example.com:A', ['192.0.2.1'], 60)
+        self.assertEqual(cache.get('dns:example.com:A'), ['192.0.2.1'])
+        self.assertIsNone(cache.get('dns:example.com:AAAA'))
+
+    def test_shared_between_instances(self):
+        shared_cache.FileCache(self.tmpdir.name).set('key', {'a': 1}, 60)
+        self.assertEqual(shared_cache.FileCache(self.tmpdir.name).get('key'), {'a': 1})
+
+    def test_expiry(self):
+        cache = shared_cache.FileCache(self.tmpdir.name)
+        cache.set('key', 'value', 0)
+        self.assertIsNone(cache.get('key'))
+
+    def test_prune(self):
+        cache = shared_cache.FileCache(self.tmpdir.name)
+        cache.set('key', 'value', 60)
+        cache.set('expired', 'value', 0)
+        self.assertEqual(len(self.entries()), 2)
+
+        cache.prune()
+        self.assertEqual(len(self.entries()), 1)
+        self.assertEqual(cache.get('key'), 'value')
+
+    def test_prune_on_set(self):
+        # the first set() prunes
+        shared_cache.FileCache(self.tmpdir.name).set('key', 'value', 60)
+        shared_cache.FileCache(self.tmpdir.name).set('expired', 'value', 0)
+
+        # other processes don't prune again within the interval
+        shared_cache.FileCache(self.tmpdir.name).set('other', 'value', 60)
+        self.assertEqual(len(self.entries()), 3)
+
+        # but once it's over
+        marker = os.path.join(self.tmpdir.name, shared_cache.FileCache.PRUNE_MARKER)
+        last_prune = time.time() - shared_cache.FileCache.PRUNE_INTERVAL
+        os.utime(marker, (last_prune, last_prune))
+        shared_cache.FileCache(self.tmpdir.name).set('other', 'value', 60)
+        self.assertEqual(len(self.entries()), 2)
+
+
+class TestFromURL(unittest.TestCase):
+
+    def test_none(self):
+        cache = shared_cache.from_url(None)
+        cache.set('key', 'value', 60)
+        self.assertIsNone(cache.get('key'))
+
+    def test_file(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.assertIsInstance(shared_cache.from_url('file://' + tmpdir), shared_cache.FileCache)
+            self.assertIsInstance(shared_cache.from_url(tmpdir), shared_cache.FileCache)
+
+    def test_redis(self):
+        self.assertIsInstance(shared_cache.from_url('redis://localhost:6379/0'), shared_cache.RedisCache)
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            shared_cache.from_url('ftp://example.com/')
+
+
+if __name__ == '__main__':
+    unittest.main()
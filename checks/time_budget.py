@@ -0,0 +1,70 @@
+"""
+Time budgets limit how long the checks for one site may take.
+
+The site's budget is set in Config.time_budget. Each checker gets a
+slice of it (see AbstractChecker.budget), which ends with the site's
+budget or after the checker's max_duration, whichever comes first.
+Checkers use it to cap network timeouts and to skip remaining work
+once it is used up, returning partial results.
+"""
+
+import time
+
+
+class TimeBudget(object):
+    """
+    A deadline, given as a number of seconds from now.
+    None means the budget is unlimited.
+    """
+
+    # Smallest timeout handed out, as zero would mean "no timeout"
+    # or "non-blocking" for most network APIs.
+    MIN_TIMEOUT = 0.1
+
+    def __init__(self, seconds=None, clock=time.monotonic):
+        self._clock = clock
+        self._deadline = None
+        if seconds is not None:
+            self._deadline = clock() + seconds
+
+    def __repr__(self):
+        return "TimeBudget(remaining=%r)" % self.remaining()
+
+    def remaining(self):
+        """Returns the remaining seconds (at least 0), or None if unlimited"""
+        if self._deadline is None:
+            return None
+        return max(self._deadline - self._clock(), 0.0)
+
+    def expired(self):
+        """Returns True if the budget is used up"""
+        return self._deadline is not None and self._clock() >= self._deadline
+
+    def timeout(self, default):
+        """
+        Returns the timeout to use for an operation that would otherwise
+        use default, i.e. default capped to the remaining time. default
+        may also be a tuple of timeouts, like requests' (connect, read).
+        """
+        if isinstance(default, tuple):
+            return tuple(self.timeout(d) for d in default)
+
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if default is None:
+            return max(remaining, self.MIN_TIMEOUT)
+        return max(min(default, remaining), self.MIN_TIMEOUT)
+
+    def slice(self, seconds):
+        """
+        Returns a new budget ending after seconds, but not later than this
+        one. seconds=None gives a budget ending with this one.
+        """
+        budget = TimeBudget(clock=self._clock)
+        budget._deadline = self._deadline
+        if seconds is not None:
+            deadline = self._clock() + seconds
+            if budget._deadline is None or deadline < budget._deadline:
+                budget._deadline = deadline
+        return budget
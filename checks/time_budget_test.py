@@ -0,0 +1,56 @@
+import unittest
+
+from checks.time_budget import TimeBudget
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTimeBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_unlimited(self):
+        budget = TimeBudget(clock=self.clock)
+        self.clock.now += 10000
+        self.assertIsNone(budget.remaining())
+        self.assertFalse(budget.expired())
+        self.assertEqual(budget.timeout(10), 10)
+        self.assertEqual(budget.timeout((10, 20)), (10, 20))
+
+    def test_expiry(self):
+        budget = TimeBudget(30, clock=self.clock)
+        self.assertEqual(budget.remaining(), 30)
+        self.clock.now += 25
+        self.assertEqual(budget.remaining(), 5)
+        self.assertFalse(budget.expired())
+        self.clock.now += 5
+        self.assertEqual(budget.remaining(), 0)
+        self.assertTrue(budget.expired())
+
+    def test_timeout(self):
+        budget = TimeBudget(15, clock=self.clock)
+        self.assertEqual(budget.timeout(10), 10)
+        self.assertEqual(budget.timeout((10, 20)), (10, 15))
+        self.assertEqual(budget.timeout(None), 15)
+        self.clock.now += 20
+        self.assertEqual(budget.timeout(10), TimeBudget.MIN_TIMEOUT)
+
+    def test_slice(self):
+        budget = TimeBudget(30, clock=self.clock)
+        self.assertEqual(budget.slice(10).remaining(), 10)
+        self.assertEqual(budget.slice(60).remaining(), 30)
+        self.assertEqual(budget.slice(None).remaining(), 30)
+        self.assertEqual(TimeBudget(clock=self.clock).slice(10).remaining(), 10)
+        self.assertIsNone(TimeBudget(clock=self.clock).slice(None).remaining())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -8,92 +8,154 @@ Non-accessible URLs are removed from config.urls.
 A redirect to facebook.com is not considered reachable, as that
 leads to a different website in the sense of this system.
 
-TODO: Parallelize the work done in this test
+URLs are checked concurrently. Changes to config.urls are applied
+afterwards, in the order of the URLs, so the outcome doesn't depend
+on which request finishes first.
+
+URLs not checked within the time budget are removed from config.urls
+and left out of the results.
+
+With config.reachability_method 'GET' (the default), URLs are checked
+with a GET request, and the pages are handed to page_content, which
+saves a second round of requests. Pages that several URLs redirect
+to are only downloaded once. With 'HEAD', only HEAD requests are sent,
+and page_content fetches the pages itself.
 """
 
 import logging
 
 from urllib.parse import urlparse
-import requests
 
+from checks import page_content
 from checks.abstract_checker import AbstractChecker
 
 
 class Checker(AbstractChecker):
+    depends_on_checks = ['dns_resolution']
+    modifies_urls = True
+
+    # maximum duration of the check (seconds)
+    max_duration = 120
+
+    # connection timeout (seconds)
+    CONNECT_TIMEOUT = 10
+
+    # response timeout (seconds)
+    READ_TIMEOUT = 20
+
+    # maximum number of bytes read from a page in GET mode
+    MAX_CONTENT_BYTES = page_content.Checker.MAX_CONTENT_BYTES
+
     def __init__(self, config, previous_results=None):
         super().__init__(config, previous_results)
-    
-    def depends_on_results(self):
-        return ['dns_resolution']
 
     def run(self):
-        headers = {
-            "User-Agent": self.config.user_agent
-        }
-
         results = {}
         urls = list(self.config.urls)
 
-        for url in urls:
-            logging.debug("Checking URL reachability for %s", url)
+        for url, outcome in zip(urls, self.map_urls(self.check_url, urls)):
+            if outcome is None:
+                # skipped, as the time budget is used up
+                self.config.remove_url(url)
+                continue
 
-            result = {
-                "url": url,
-                "redirect_history": [],
-                "status": None,
-                "exception": None,
-                "duration": None,
-            }
-            
-            # Perform HEAD requests, recording redirect log
-            try:
-                r = requests.head(url, headers=headers, allow_redirects=True)
-                result['status'] = r.status_code
-                result['duration'] = round(r.elapsed.total_seconds() * 1000)
+            result, final_url = outcome
+            self.update_config(url, result, final_url)
+            results[url] = result
 
-                if len(r.history):
-                    result['redirect_history'] = self.expand_history(r.history)
-                    logging.debug("Redirects: %r", result['redirect_history'])
+            # forget pages page_content won't need
+            if final_url is not None and final_url not in self.config.urls:
+                self.config.pop_prefetched_page(final_url)
 
-                if r.url == url:
-                    logging.debug("URL: %s - status %s", url, r.status_code)
+        return results
+
+    def check_url(self, url):
+        """
+        Checks one URL. Returns the result dict and the URL the
+        request ended at after following redirects.
+        """
+        logging.debug("Checking URL reachability for %s", url)
+
+        result = {
+            "url": url,
+            "redirect_history": [],
+            "status": None,
+            "exception": None,
+            "duration": None,
+        }
+        final_url = None
+
+        # Perform request, recording redirect log
+        try:
+            timeout = self.budget.timeout((self.CONNECT_TIMEOUT, self.READ_TIMEOUT))
+            if self.config.reachability_method == 'GET':
+                r, page = page_content.fetch_page(self.config, url, timeout, self.MAX_CONTENT_BYTES,
+                                                  prefetch=True)
+                if page is None:
+                    # the page is fetched for another URL already
+                    result['status'] = r.status_code
                 else:
-                    logging.debug("URL: %s - status %s - redirects to %s", url,
-                        r.status_code, r.url)
-                    # remove source URL, add target URL to config.urls
-                    self.config.remove_url(url)
-                    self.config.add_url(r.url)
-                
-                # remove 404 etc
-                if r.status_code > 400:
-                    self.config.remove_url(url)
-
-            except Exception as exc:
-                logging.info("Exception for URL %s: %s %s", url, str(type(exc)), exc)
+                    # a cached page revalidated with 304 counts as its original status
+                    result['status'] = page['status_code']
+                    self.config.add_prefetched_page(r.url, page)
+            else:
+                r = self.config.http_session.head(url, allow_redirects=True, timeout=timeout)
+                result['status'] = r.status_code
+            result['duration'] = round(r.elapsed.total_seconds() * 1000)
+            final_url = r.url
+
+            if len(r.history):
+                result['redirect_history'] = self.expand_history(r.history)
+                logging.debug("Redirects: %r", result['redirect_history'])
+
+            if r.url == url:
+                logging.debug("URL: %s - status %s", url, r.status_code)
+            else:
+                logging.debug("URL: %s - status %s - redirects to %s", url,
+                    r.status_code, r.url)
+
+        except Exception as exc:
+            logging.info("Exception for URL %s: %s %s", url, str(type(exc)), exc)
+            result['exception'] = {
+                'type': str(type(exc)),
+                'message': str(exc),
+            }
+
+        # if redirects end in www.facebook.com or www.denic.de, mark this URL as bad
+        if result['exception'] is None and result['redirect_history'] is not None and len(result['redirect_history']) > 0:
+            target_url = result['redirect_history'][-1]['redirect_to']
+            parsed = urlparse(target_url)
+            if parsed.netloc in ('www.facebook.com', 'www.denic.de', 'sedo.com'):
                 result['exception'] = {
-                    'type': str(type(exc)),
-                    'message': str(exc),
+                    'type': 'Bad target domain',
+                    'message': 'The URL redirects to %s, which is unsupported by green-spider as it doesn\'t qualify as an owned website' % parsed.netloc,
                 }
-                
-                # remove URL to prevent further checks on unreachable URL
-                self.config.remove_url(url)
-            
-            # if redirects end in www.facebook.com or www.denic.de, remove this URL again
-            # remove if redirect target is facebook
-            if result['exception'] is None and result['redirect_history'] is not None and len(result['redirect_history']) > 0:
-                target_url = result['redirect_history'][-1]['redirect_to']
-                parsed = urlparse(target_url)
-                if parsed.netloc in ('www.facebook.com', 'www.denic.de', 'sedo.com'):
-                    result['exception'] = {
-                        'type': 'Bad target domain',
-                        'message': 'The URL redirects to %s, which is unsupported by green-spider as it doesn\'t qualify as an owned website' % parsed.netloc,
-                    }
-                    self.config.remove_url(target_url)
-                    print("Removing URL %s" % target_url)
 
-            results[url] = result
-
-        return results
+        return result, final_url
+
+    def update_config(self, url, result, final_url):
+        """
+        Applies the outcome of check_url() for url to config.urls
+        """
+        if final_url is None:
+            # remove URL to prevent further checks on unreachable URL
+            self.config.remove_url(url)
+            return
+
+        if final_url != url:
+            # remove source URL, add target URL to config.urls
+            self.config.remove_url(url)
+            self.config.add_url(final_url)
+
+        # remove 404 etc
+        if result['status'] > 400:
+            self.config.remove_url(url)
+
+        # remove if redirect target is facebook etc.
+        if result['exception'] is not None:
+            target_url = result['redirect_history'][-1]['redirect_to']
+            self.config.remove_url(target_url)
+            print("Removing URL %s" % target_url)
 
     def expand_history(self, history):
         """Extracts primitives from a list of requests.Response objects"""
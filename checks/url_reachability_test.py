@@ -2,6 +2,7 @@ import httpretty
 from httpretty import httprettified
 import unittest
 
+from checks import page_content
 from checks import url_reachability
 from checks.config import Config
 
@@ -13,7 +14,7 @@ class TestCharsetChecker(unittest.TestCase):
         httpretty.register_uri(httpretty.HEAD, url,
             status=200, body="<html></html>")
 
-        config = Config(urls=[url])
+        config = Config(urls=[url], reachability_method='HEAD')
         checker = url_reachability.Checker(config=config, previous_results={})
         result = checker.run()
 
@@ -33,7 +34,7 @@ class TestCharsetChecker(unittest.TestCase):
         httpretty.register_uri(httpretty.HEAD, url2,
             status=200, body="<html></html>")
 
-        config = Config(urls=[url])
+        config = Config(urls=[url], reachability_method='HEAD')
         checker = url_reachability.Checker(config=config, previous_results={})
         result = checker.run()
 
@@ -52,7 +53,7 @@ class TestCharsetChecker(unittest.TestCase):
         httpretty.register_uri(httpretty.HEAD, url,
             status=404, body="<html><body>Not found</body></html>")
 
-        config = Config(urls=[url])
+        config = Config(urls=[url], reachability_method='HEAD')
         checker = url_reachability.Checker(config=config, previous_results={})
         result = checker.run()
 
@@ -65,6 +66,80 @@ class TestCharsetChecker(unittest.TestCase):
 
         self.assertEqual(len(newconfig.urls), 0)
 
+    def test_get_redirect(self):
+        url = 'http://www.example.com/'
+        url2 = 'http://www2.example.com/'
+        httpretty.register_uri(httpretty.GET, url,
+            status=301, body="",
+            adding_headers={"Location": url2})
+        httpretty.register_uri(httpretty.GET, url2,
+            status=200, body="<html><body>Hello</body></html>")
+
+        config = Config(urls=[url])
+        checker = url_reachability.Checker(config=config, previous_results={})
+        result = checker.run()
+
+        self.assertEqual(result[url]['status'], 200)
+        self.assertIsNone(result[url]['exception'])
+        self.assertEqual(result[url]['redirect_history'][0]['status'], 301)
+        self.assertEqual(result[url]['redirect_history'][0]['redirect_to'], url2)
+        self.assertEqual(config.urls, [url2])
+
+        # page_content uses the page fetched already
+        requests_sent = len(httpretty.latest_requests())
+        content = page_content.Checker(config=config, previous_results={}).run()
+        self.assertEqual(len(httpretty.latest_requests()), requests_sent)
+        self.assertEqual(content[url2]['content'], "<html><body>Hello</body></html>")
+        self.assertEqual(content[url2]['status_code'], 200)
+        self.assertIsNone(config.pop_prefetched_page(url2))
+
+    def test_get_same_target(self):
+        url = 'http://example.com/'
+        url2 = 'http://www.example.com/'
+        httpretty.register_uri(httpretty.GET, url,
+            status=301, body="",
+            adding_headers={"Location": url2})
+        httpretty.register_uri(httpretty.GET, url2,
+            status=200, body="<html><body>Hello</body></html>")
+
+        config = Config(urls=[url, url2])
+        result = url_reachability.Checker(config=config, previous_results={}).run()
+
+        self.assertEqual(result[url]['status'], 200)
+        self.assertEqual(result[url2]['status'], 200)
+        self.assertEqual(config.urls, [url2])
+        self.assertFalse(config.claim_prefetch(url2))
+        self.assertEqual(config.pop_prefetched_page(url2)['body'], b"<html><body>Hello</body></html>")
+
+    def test_get_removed_later(self):
+        url = 'http://example.com/'
+        url2 = 'http://www.example.com/'
+        for u in (url, url2):
+            httpretty.register_uri(httpretty.GET, u,
+                status=200, body="<html><body>Hello</body></html>")
+
+        config = Config(urls=[url, url2])
+        url_reachability.Checker(config=config, previous_results={}).run()
+
+        # e.g. by url_canonicalization
+        config.remove_url(url2)
+
+        page_content.Checker(config=config, previous_results={}).run()
+        self.assertIsNone(config.pop_prefetched_page(url2))
+
+    def test_get_notfound(self):
+        url = 'http://www.example.com/'
+        httpretty.register_uri(httpretty.GET, url,
+            status=404, body="<html><body>Not found</body></html>")
+
+        config = Config(urls=[url])
+        checker = url_reachability.Checker(config=config, previous_results={})
+        result = checker.run()
+
+        self.assertEqual(result[url]['status'], 404)
+        self.assertEqual(config.urls, [])
+        self.assertIsNone(config.pop_prefetched_page(url))
+
 
 
 if __name__ == '__main__':
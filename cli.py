@@ -38,10 +38,14 @@ if __name__ == "__main__":
     # 'spider' subcommand to execute a job from the queue and store the result.
     spider_parser = subparsers.add_parser('spider', help='Execute a spider job from the queue and store the result.')
     spider_parser.add_argument('--job', help='JSON job data')
+    spider_parser.add_argument('--time-budget', dest='time_budget', type=float,
+                               help='Maximum number of seconds for the checks of the site')
 
     # 'dryrun' subcommand to spider one URL without writing results back.
     dryrun_parser = subparsers.add_parser('dryrun', help='Spider an arbitrary URL without storing results. ')
     dryrun_parser.add_argument('url', help='Spider a URL instead of using jobs from the queue. For testing/debugging only.')
+    dryrun_parser.add_argument('--time-budget', dest='time_budget', type=float,
+                               help='Maximum number of seconds for the checks of the site')
     
     # manager subcommand
     manager_parser = subparsers.add_parser('manager', help='Adds spider jobs to the queue. By default, all green-directory URLs are added.')
@@ -84,7 +88,8 @@ if __name__ == "__main__":
         from spider import spider
         from export.datetimeencoder import DateTimeEncoder
 
-        result = spider.check_and_rate_site({"url": args.url, "type": "REGIONAL_CHAPTER", "level": "DE:KREISVERBAND", "state": "Unnamed", "district": "Unnamed"})        
+        result = spider.check_and_rate_site({"url": args.url, "type": "REGIONAL_CHAPTER", "level": "DE:KREISVERBAND", "state": "Unnamed", "district": "Unnamed"},
+                                           time_budget=args.time_budget)
         print(json.dumps(result, indent=2, sort_keys=True, ensure_ascii=False, cls=DateTimeEncoder))
 
     elif args.command == 'spider':
@@ -93,7 +98,8 @@ if __name__ == "__main__":
         datastore_client = datastore.Client.from_service_account_json(args.credentials_path)
         job = json.loads(args.job)
         from spider import spider
-        spider.execute_single_job(datastore_client, job, "spider-results")
+        spider.execute_single_job(datastore_client, job, "spider-results",
+                                  time_budget=args.time_budget)
 
     else:
         parser.print_help()
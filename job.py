@@ -17,6 +17,11 @@ from google.cloud import datastore
 # via the environment JOB_TIMEOUT variable.
 TIMEOUT = int(os.environ.get("JOB_TIMEOUT", "50"))
 
+# Seconds of TIMEOUT reserved for starting the container and writing
+# results. The checks get the rest as their time budget, so that they
+# finish with partial results before the container gets killed.
+TIME_BUDGET_MARGIN = 15
+
 # Container image to use for the spider
 DOCKER_IMAGE = 'ghcr.io/netzbegruenung/green-spider:latest'
 
@@ -25,6 +30,17 @@ DOCKER_IMAGE = 'ghcr.io/netzbegruenung/green-spider:latest'
 # spider results and screenshots
 CREDENTIALS_PATH_CONTAINER = '/secrets/datastore-writer.json'
 
+# Cache shared by all spider containers on this host, e.g. for DNS answers
+# and TLS certificates. See checks/shared_cache.py for supported URLs.
+SHARED_CACHE_URL = os.environ.get("SHARED_CACHE_URL", "file:///shared-cache")
+
+# Folder for cached page responses, used for conditional requests on the
+# next run. See checks/http_cache.py.
+HTTP_CACHE_PATH = os.environ.get("HTTP_CACHE_PATH", "/shared-cache/http")
+
+# Number of entries to look at per feed. See checks/load_feeds.py.
+FEED_MAX_ENTRIES = os.environ.get("FEED_MAX_ENTRIES", "100")
+
 # Path to the Google Cloud Datastore credentials file,
 # as used right here in this script for logging the spider run
 CREDENTIALS_PATH_LOCAL = './secrets/datastore-writer.json'
@@ -56,12 +72,8 @@ def run(job):
             "bind": "/secrets",
             "mode": "ro",
         },
-        pwd + "/volumes/chrome-userdir": {
-            "bind": "/opt/chrome-userdir",
-            "mode": "rw",
-        },
-        pwd + "/screenshots": {
-            "bind": "/screenshots",
+        pwd + "/volumes/shared-cache": {
+            "bind": "/shared-cache",
             "mode": "rw",
         },
     }
@@ -69,9 +81,11 @@ def run(job):
     cmd_template = ("python cli.py --credentials-path={path} "
                     " --loglevel=debug "
                     " spider "
+                    " --time-budget={time_budget} "
                     " --job='{job_json}'")
     
     cmd = cmd_template.format(path=CREDENTIALS_PATH_CONTAINER,
+                              time_budget=max(TIMEOUT - TIME_BUDGET_MARGIN, 1),
                               job_json=json.dumps(job))
     
     # Run spider container
@@ -83,6 +97,11 @@ def run(job):
                           stdout=True,
                           stderr=True,
                           tty=False,
+                          environment={
+                              "SHARED_CACHE_URL": SHARED_CACHE_URL,
+                              "HTTP_CACHE_PATH": HTTP_CACHE_PATH,
+                              "FEED_MAX_ENTRIES": FEED_MAX_ENTRIES,
+                          },
                           volumes=volumes)
 
     id = container.id
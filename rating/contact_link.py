@@ -25,11 +25,9 @@ class Rater(AbstractRater):
 
             urls += 1
 
-            for link in self.check_results['hyperlinks'][url]['links']:
-                if link['text'].lower() == 'kontakt':
-                    urls_with_contact_link += 1
-                    # make sure we only count 1 for this url
-                    break
+            links = self.check_results['hyperlinks'][url]
+            if links is not None and links['contact']:
+                urls_with_contact_link += 1
 
         if urls > 0 and urls_with_contact_link == urls:
             score = self.max_score
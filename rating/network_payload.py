@@ -4,8 +4,8 @@ This rater evaluates the amount of data transferred for a page load.
 Currently no score is given. The plan is however to reward site that
 cause smaller transfers.
 
-The rater uses Chrome performance log messages of type
-'Network.loadingFinished'.
+The rater uses the number of bytes transferred, as summed up from
+'Network.loadingFinished' events by load_in_browser.
 """
 
 from rating.abstract_rater import AbstractRater
@@ -27,17 +27,11 @@ class Rater(AbstractRater):
         payloads_for_urls = []
 
         for url in self.check_results['load_in_browser']:
-            payload = 0
-
-            if (self.check_results['load_in_browser'][url]['performance_log'] == [] or
-                self.check_results['load_in_browser'][url]['performance_log'] is None):
+            network = self.check_results['load_in_browser'][url].get('network')
+            if network is None:
                 continue
-            
-            for lentry in self.check_results['load_in_browser'][url]['performance_log']:
-                if lentry['message']['method'] == 'Network.loadingFinished':
-                    payload += lentry['message']['params']['encodedDataLength']
-            
-            payloads_for_urls.append(payload)
+
+            payloads_for_urls.append(network['bytes'])
         
         # Calculate score based on the largest value found for a URL.
         # See https://github.com/netzbegruenung/green-spider/issues/11#issuecomment-600307544
@@ -4,8 +4,8 @@ This rater evaluates the number of network requests made.
 Currently no score is given. The plan is however to reward site that
 use only few requests.
 
-The rater uses Chrome performance log messages of type
-'Network.requestWillBeSent'.
+The rater uses the number of requests, as counted from
+'Network.requestWillBeSent' events by load_in_browser.
 """
 
 from rating.abstract_rater import AbstractRater
@@ -27,17 +27,11 @@ class Rater(AbstractRater):
         num_requests_for_urls = []
 
         for url in self.check_results['load_in_browser']:
-            num_requests = 0
-
-            if (self.check_results['load_in_browser'][url]['performance_log'] == [] or
-                self.check_results['load_in_browser'][url]['performance_log'] is None):
+            network = self.check_results['load_in_browser'][url].get('network')
+            if network is None:
                 continue
-            
-            for lentry in self.check_results['load_in_browser'][url]['performance_log']:
-                if lentry['message']['method'] == 'Network.requestWillBeSent':
-                    num_requests += 1
-            
-            num_requests_for_urls.append(num_requests)
+
+            num_requests_for_urls.append(network['requests'])
         
         # Calculate score based on the largest value found for a URL.
         # See https://github.com/netzbegruenung/green-spider/issues/11#issuecomment-600307544
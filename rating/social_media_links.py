@@ -3,7 +3,6 @@ Checks whether the pages have a link to social media profiles.
 """
 
 from rating.abstract_rater import AbstractRater
-from urllib.parse import urlparse
 import logging
 
 class Rater(AbstractRater):
@@ -27,30 +26,10 @@ class Rater(AbstractRater):
 
             urls += 1
 
-            for link in self.check_results['hyperlinks'][url]['links']:
-                
-                if link['href'] is None:
-                    continue
-
-                # only process absolute links
-                if not (link['href'].startswith('http:') or link['href'].startswith('https:')):
-                    continue
-                
-                parsed = urlparse(link['href'])
-                if parsed is None:
-                    continue
-                if parsed.hostname is None:
-                    continue
-
-                if ("facebook.com" in parsed.hostname or
-                    "twitter.com" in parsed.hostname or
-                    "instagram.com" in parsed.hostname or
-                    "gruene.social" in parsed.hostname):
-                    logging.debug("Found social media link on %s: %s" % (url, link['href']))
-                    urls_with_social_media_links += 1
-                    
-                    # make sure we only count 1 for this url
-                    break
+            links = self.check_results['hyperlinks'][url]
+            if links is not None and links['social']:
+                logging.debug("Found social media link on %s: %s" % (url, links['social'][0]))
+                urls_with_social_media_links += 1
 
         if urls > 0 and urls_with_social_media_links == urls:
             score = self.max_score
@@ -19,10 +19,12 @@ import config
 import manager
 import rating
 
-def check_and_rate_site(entry):
+def check_and_rate_site(entry, time_budget=None):
     """
     Performs our site checks, calculates the score
     and returns results as a dict.
+
+    time_budget optionally limits the duration of the checks (seconds).
     """
 
     # all the info we'll return for the site
@@ -46,7 +48,7 @@ def check_and_rate_site(entry):
     }
 
     # Results from our next generation checkers
-    result['checks'] = checks.perform_checks(entry['url'])
+    result['checks'] = checks.perform_checks(entry['url'], time_budget=time_budget)
 
     result['rating'] = rating.calculate_rating(result['checks'])
 
@@ -57,14 +59,10 @@ def check_and_rate_site(entry):
     # Remove bigger result portions to safe some storage:
     # - HTML page content
     # - Hyperlinks
-    # - Performnance log
     try:
         for url in result['checks']['page_content']:
             del result['checks']['page_content'][url]['content']
 
-        for url in result['checks']['load_in_browser']:
-            del result['checks']['load_in_browser'][url]['performance_log']
-
         del result['checks']['hyperlinks']
     except:
         pass
@@ -72,14 +70,14 @@ def check_and_rate_site(entry):
     return result
 
 
-def execute_single_job(datastore_client, job, entity_kind):
+def execute_single_job(datastore_client, job, entity_kind, time_budget=None):
     """
     Executes spider for one single job
     """
     validate_job(job)
 
     logging.info("Starting job %s", job["url"])
-    result = check_and_rate_site(entry=job)
+    result = check_and_rate_site(entry=job, time_budget=time_budget)
 
     logging.info("Job %s finished checks", job["url"])
     logging.info("Job %s writing to DB", job["url"])